@@ -0,0 +1,368 @@
+"""
+本機的 Gemini 與 Notion 假伺服器（壓力測試用，不消耗真實 API 額度）
+
+用法（在 backend 目錄下）：
+    python -m benchmarks.fake_apis [--gemini-latency-ms 1500] [--error-rate 0.01] [--rate-limit-rate 0.02]
+
+啟動後印出讓後端改連假伺服器的環境變數：
+    GEMINI_BACKEND=rest GEMINI_API_BASE=http://127.0.0.1:<port> NOTION_API_BASE=http://127.0.0.1:<port>
+
+- Gemini：resumable 文件上傳、generateContent（依 responseSchema 回傳完整筆記或 patch 操作）、cachedContents
+- Notion：建立 / 更新頁面，append / list / update / delete block（頁面內容存在記憶體中）
+- 每個請求依 FaultProfile 加上延遲，並以指定機率回傳 500 或附 Retry-After 的 429
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from services import jsonio
+
+
+class FaultProfile:
+    """延遲與錯誤注入設定"""
+
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0,
+        rate_limit_rate: float = 0,
+        retry_after: float = 1
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+
+    def delay(self) -> None:
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def fault(self) -> Optional[int]:
+        """返回要注入的狀態碼（429 / 500），不注入時為 None"""
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """共用的 JSON 請求處理；子類別實作 route"""
+
+    protocol_version = "HTTP/1.1"
+    profile = FaultProfile()
+    counters: Dict[str, int] = {}
+    counters_lock = threading.Lock()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _count(self, name: str) -> None:
+        with self.counters_lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+        data = jsonio.dumps(body if body is not None else {})
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int) -> None:
+        raise NotImplementedError
+
+    def _handle(self, method: str) -> None:
+        raw = self._read_body()
+        self.profile.delay()
+        status = self.profile.fault()
+        if status is not None:
+            self._count(f"injected_{status}")
+            self._send_error(status)
+            return
+        body = jsonio.loads(raw) if raw and self.headers.get("Content-Type", "").startswith("application/json") else raw
+        self.route(method, urlparse(self.path).path, body)
+
+    def route(self, method: str, path: str, body: Any) -> None:
+        raise NotImplementedError
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_PATCH(self) -> None:
+        self._handle("PATCH")
+
+    def do_DELETE(self) -> None:
+        self._handle("DELETE")
+
+
+# ---------- Gemini ----------
+
+def fake_notes(block_count: int, seed: str = "") -> Dict[str, Any]:
+    """符合 NOTION_BLOCKS_SCHEMA 的筆記"""
+    blocks = []
+    for i in range(block_count):
+        if i % 5 == 0:
+            kind, text = "heading_2", f"第 {i // 5 + 1} 節 {seed}"
+        else:
+            kind, text = "bulleted_list_item", f"重點 {i}：注意力機制將查詢與鍵值配對，並以權重加總。"
+        blocks.append({"object": "block", "type": kind, kind: {"rich_text": [{"type": "text", "text": {"content": text}}]}})
+    return {"title": "壓力測試筆記", "blocks": blocks}
+
+
+class FakeGeminiHandler(_Handler):
+    block_count = 40
+    files: Dict[str, Dict[str, Any]] = {}
+    caches: Dict[str, float] = {}
+    lock = threading.Lock()
+    ids = itertools.count(1)
+
+    def _send_error(self, status: int) -> None:
+        statuses = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL"}
+        headers = {"Retry-After": str(self.profile.retry_after)} if status == 429 else None
+        self._send(status, {"error": {"code": status, "message": "injected fault", "status": statuses[status]}}, headers)
+
+    def route(self, method: str, path: str, body: Any) -> None:
+        if method == "POST" and path == "/upload/v1beta/files":
+            upload_id = uuid.uuid4().hex
+            self._count("upload_start")
+            host = self.headers.get("Host")
+            self._send(200, {}, {"X-Goog-Upload-URL": f"http://{host}/upload/v1beta/files/session/{upload_id}"})
+        elif method == "POST" and path.startswith("/upload/v1beta/files/session/"):
+            name = f"files/fake-{next(self.ids)}"
+            with self.lock:
+                self.files[name] = {"size": len(body)}
+            self._count("upload")
+            self._send(200, {"file": {
+                "name": name,
+                "uri": f"http://fake/{name}",
+                "mimeType": self.headers.get("Content-Type") or "application/pdf",
+                "state": "ACTIVE",
+            }})
+        elif method == "POST" and path == "/v1beta/cachedContents":
+            name = f"cachedContents/fake-{next(self.ids)}"
+            ttl = float(str(body.get("ttl", "3600s")).rstrip("s"))
+            with self.lock:
+                self.caches[name] = time.time() + ttl
+            self._count("create_cache")
+            self._send(200, {"name": name, "model": body.get("model")})
+        elif method == "POST" and path.endswith(":generateContent"):
+            cached = body.get("cachedContent")
+            if cached:
+                with self.lock:
+                    expires = self.caches.get(cached)
+                if expires is None or expires < time.time():
+                    self._send(404, {"error": {"code": 404, "message": f"{cached} not found", "status": "NOT_FOUND"}})
+                    return
+            schema = body.get("generationConfig", {}).get("responseSchema", {})
+            seed = str(next(self.ids))
+            if "operations" in schema.get("properties", {}):
+                # refine 的 patch 模式：補充第一個 block、改寫第二個 block
+                self._count("generate_patch")
+                blocks = fake_notes(4, seed)["blocks"]
+                output = {"operations": [
+                    {"op": "insert_after", "index": 0, "blocks": blocks[1:]},
+                    {"op": "replace", "index": 1, "blocks": blocks[:1]},
+                ]}
+            else:
+                self._count("generate")
+                output = fake_notes(self.block_count, seed)
+            text = jsonio.dumps_str(output)
+            self._send(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}]})
+        else:
+            self._send(404, {"error": {"code": 404, "message": f"unknown route {method} {path}", "status": "NOT_FOUND"}})
+
+
+# ---------- Notion ----------
+
+class FakeNotionHandler(_Handler):
+    # block / page id -> 子 block id 列表；block id -> 所屬的 page / block id
+    children: Dict[str, List[str]] = {}
+    parents: Dict[str, str] = {}
+    # 已移到垃圾桶的 page id
+    archived: Set[str] = set()
+    lock = threading.Lock()
+
+    def _send_error(self, status: int) -> None:
+        codes = {429: "rate_limited", 500: "internal_server_error"}
+        headers = {"Retry-After": str(self.profile.retry_after)} if status == 429 else None
+        self._send(status, {"object": "error", "status": status, "code": codes[status], "message": "injected fault"}, headers)
+
+    def _not_found(self, object_id: str) -> None:
+        self._send(404, {"object": "error", "status": 404, "code": "object_not_found", "message": f"{object_id} not found"})
+
+    def _block(self, block_id: str) -> Dict[str, Any]:
+        return {"object": "block", "id": block_id, "type": "paragraph", "paragraph": {"rich_text": []}}
+
+    def route(self, method: str, path: str, body: Any) -> None:
+        parts = path.strip("/").split("/")
+        self._count(f"{method} /{'/'.join(parts[:2])}")
+        if parts[:2] == ["v1", "pages"]:
+            if method == "POST":
+                page_id = str(uuid.uuid4())
+                with self.lock:
+                    self.children[page_id] = []
+                self._send(200, {"object": "page", "id": page_id})
+            elif method in ("GET", "PATCH") and len(parts) == 3:
+                page_id = parts[2]
+                if page_id not in self.children:
+                    self._not_found(page_id)
+                    return
+                with self.lock:
+                    if method == "PATCH" and body.get("archived") is not None:
+                        (self.archived.add if body["archived"] else self.archived.discard)(page_id)
+                    archived = page_id in self.archived
+                self._send(200, {"object": "page", "id": page_id, "archived": archived, "in_trash": archived})
+            else:
+                self._not_found(path)
+            return
+
+        if parts[:2] != ["v1", "blocks"] or len(parts) < 3:
+            self._not_found(path)
+            return
+        block_id = parts[2]
+
+        if len(parts) == 4 and parts[3] == "children":
+            with self.lock:
+                siblings = self.children.get(block_id)
+                if siblings is None:
+                    self._not_found(block_id)
+                    return
+                if method == "GET":
+                    self._send(200, {"object": "list", "results": [self._block(i) for i in siblings], "has_more": False, "next_cursor": None})
+                    return
+                new_ids = [str(uuid.uuid4()) for _ in body.get("children", [])]
+                after = body.get("after")
+                position = siblings.index(after) + 1 if after in siblings else len(siblings)
+                siblings[position:position] = new_ids
+                for new_id in new_ids:
+                    self.children[new_id] = []
+                    self.parents[new_id] = block_id
+            self._send(200, {"object": "list", "results": [self._block(i) for i in new_ids], "has_more": False})
+        elif method == "PATCH":
+            if block_id not in self.children:
+                self._not_found(block_id)
+                return
+            self._send(200, self._block(block_id))
+        elif method == "DELETE":
+            with self.lock:
+                if self.children.pop(block_id, None) is None:
+                    self._not_found(block_id)
+                    return
+                parent = self.children.get(self.parents.pop(block_id, None))
+                if parent is not None:
+                    parent.remove(block_id)
+            self._send(200, {**self._block(block_id), "archived": True})
+        else:
+            self._not_found(path)
+
+
+def _handler_class(base: type, profile: FaultProfile, **attrs: Any) -> type:
+    """每個伺服器各自的狀態（避免共用類別屬性）"""
+    state = {"profile": profile, "counters": {}, "counters_lock": threading.Lock()}
+    if base is FakeGeminiHandler:
+        state.update(files={}, caches={}, lock=threading.Lock(), ids=itertools.count(1))
+    else:
+        state.update(children={}, parents={}, archived=set(), lock=threading.Lock())
+    state.update(attrs)
+    return type(base.__name__, (base,), state)
+
+
+class FakeServer:
+    """在背景 thread 執行的假伺服器"""
+
+    def __init__(self, handler: type, host: str = "127.0.0.1", port: int = 0):
+        self.handler = handler
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        with self.handler.counters_lock:
+            return dict(self.handler.counters)
+
+    def start(self) -> "FakeServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_fake_gemini(profile: FaultProfile, block_count: int = 40, port: int = 0) -> FakeServer:
+    return FakeServer(_handler_class(FakeGeminiHandler, profile, block_count=block_count), port=port).start()
+
+
+def start_fake_notion(profile: FaultProfile, port: int = 0) -> FakeServer:
+    return FakeServer(_handler_class(FakeNotionHandler, profile), port=port).start()
+
+
+def add_fault_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    """假伺服器的命令列參數（load_test 共用）"""
+    group = arg_parser.add_argument_group("fake APIs")
+    group.add_argument("--gemini-latency-ms", type=float, default=1500)
+    group.add_argument("--notion-latency-ms", type=float, default=150)
+    group.add_argument("--jitter", type=float, default=0.3, help="延遲的隨機浮動比例")
+    group.add_argument("--error-rate", type=float, default=0.0)
+    group.add_argument("--rate-limit-rate", type=float, default=0.0, help="回傳 429 的機率")
+    group.add_argument("--retry-after", type=float, default=1)
+    group.add_argument("--gemini-blocks", type=int, default=40, help="假 Gemini 每次生成的 block 數")
+
+
+def start_from_args(args: argparse.Namespace, gemini_port: int = 0, notion_port: int = 0) -> Tuple[FakeServer, FakeServer]:
+    def profile(latency_ms: float) -> FaultProfile:
+        return FaultProfile(latency_ms, latency_ms * args.jitter, args.error_rate, args.rate_limit_rate, args.retry_after)
+
+    fake_gemini = start_fake_gemini(profile(args.gemini_latency_ms), args.gemini_blocks, gemini_port)
+    fake_notion = start_fake_notion(profile(args.notion_latency_ms), notion_port)
+    return fake_gemini, fake_notion
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--gemini-port", type=int, default=0)
+    arg_parser.add_argument("--notion-port", type=int, default=0)
+    add_fault_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    fake_gemini, fake_notion = start_from_args(args, args.gemini_port, args.notion_port)
+    print(f"GEMINI_BACKEND=rest GEMINI_API_BASE={fake_gemini.url} NOTION_API_BASE={fake_notion.url}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"gemini {fake_gemini.counters} | notion {fake_notion.counters}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake_gemini.stop()
+        fake_notion.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+JSON 編解碼效能比較（1000 個 block 的筆記）
+
+用法（在 backend 目錄下）：
+    python -m benchmarks.json_codec [--blocks 1000] [--rounds 200]
+
+比較：
+- FastAPI 預設路徑：jsonable_encoder + 標準庫 json.dumps
+- services.jsonio（orjson，未安裝時為標準庫）
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+from services import jsonio
+
+try:
+    from fastapi.encoders import jsonable_encoder
+except ImportError:
+    jsonable_encoder = None
+
+
+def make_note(block_count: int) -> Dict[str, Any]:
+    """產生與 refine 輸出結構相同的筆記"""
+    kinds = ["heading_2", "heading_3", "bulleted_list_item", "callout", "quote"]
+    blocks: List[Dict[str, Any]] = []
+    for i in range(block_count):
+        kind = kinds[i % len(kinds)]
+        rich_text = [
+            {
+                "type": "text",
+                "text": {"content": f"第 {i} 段：注意力機制（attention）將查詢與鍵值配對 {j}"},
+                "annotations": {"bold": j == 0, "italic": False, "code": j == 2, "color": "default"},
+            }
+            for j in range(3)
+        ]
+        block = {"object": "block", "type": kind, kind: {"rich_text": rich_text}}
+        if kind == "callout":
+            block[kind]["icon"] = {"emoji": "💡"}
+        blocks.append(block)
+    return {"title": "論文筆記", "blocks": blocks, "files": ["paper.pdf"], "temp_paths": ["/tmp/x.pdf"]}
+
+
+def measure(fn: Callable[[], Any], rounds: int) -> float:
+    """返回每次呼叫的平均毫秒數"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--blocks", type=int, default=1000)
+    arg_parser.add_argument("--rounds", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    note = make_note(args.blocks)
+    std_encoded = json.dumps(note, ensure_ascii=False).encode("utf-8")
+    fast_encoded = jsonio.dumps(note)
+
+    cases = {
+        "encode  json.dumps": lambda: json.dumps(note, ensure_ascii=False).encode("utf-8"),
+        "encode  jsonio.dumps": lambda: jsonio.dumps(note),
+        "decode  json.loads": lambda: json.loads(std_encoded),
+        "decode  jsonio.loads": lambda: jsonio.loads(fast_encoded),
+        "prompt  json.dumps(indent=2)": lambda: json.dumps(note, ensure_ascii=False, indent=2),
+        "prompt  jsonio.dumps_str(indent)": lambda: jsonio.dumps_str(note, indent=True),
+    }
+    if jsonable_encoder is not None:
+        cases["response jsonable_encoder + json"] = (
+            lambda: json.dumps(jsonable_encoder(note), ensure_ascii=False).encode("utf-8")
+        )
+        cases["response FastJSONResponse"] = lambda: jsonio.dumps(note)
+
+    backend = "orjson" if jsonio.HAS_ORJSON else "json (fallback)"
+    print(f"{args.blocks} blocks, {len(fast_encoded) / 1024:.0f} KiB, jsonio backend: {backend}")
+    for name, fn in cases.items():
+        print(f"  {name:<36} {measure(fn, args.rounds):8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
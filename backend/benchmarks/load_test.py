@@ -0,0 +1,306 @@
+"""
+端到端壓力測試（搭配本機的 Gemini / Notion 假伺服器，不消耗真實 API 額度）
+
+用法（在 backend 目錄下）：
+    # 固定同時使用者數（closed loop），每位使用者完成流程後立即開始下一輪
+    python -m benchmarks.load_test --concurrency 8 --duration 60
+
+    # 固定抵達率（open loop）：每秒開始 2 個新的使用者流程
+    python -m benchmarks.load_test --rate 2 --duration 60
+
+    # 依序測試多個同時使用者數，找出 p95 與錯誤率仍在目標內的最大值
+    python -m benchmarks.load_test --sweep 1,2,4,8,16,32 --think-time 5 --slo-p95-ms 15000
+
+每位使用者的流程：/api/upload → /api/refine × N → /api/generate-pdf → /api/save-to-notion
+（refine 帶上一輪的結果，save-to-notion 帶 note_id，走增量同步）
+
+預設會啟動假伺服器與一個 uvicorn 後端（GEMINI_BACKEND=rest，資料庫與快取放在暫存目錄）；
+指定 --base-url 時改為測試已啟動的後端（需自行讓它連到假伺服器）
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.fake_apis import add_fault_arguments, start_from_args
+from services import jsonio
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ("upload", "refine", "generate-pdf", "save-to-notion")
+
+
+class Stats:
+    """各 endpoint 的延遲與錯誤統計（thread-safe）"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+        self.errors: Dict[str, Counter] = {name: Counter() for name in ENDPOINTS}
+        self.sessions = 0
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, error: Optional[str]) -> None:
+        with self._lock:
+            if error is None:
+                self.latencies[endpoint].append(seconds)
+            else:
+                self.errors[endpoint][error] += 1
+
+    def session_done(self) -> None:
+        with self._lock:
+            self.sessions += 1
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def make_pdf(size_kb: int) -> bytes:
+    """內容唯一的合成 PDF（避免後端的快取讓每位使用者共用結果）"""
+    pages = max(1, size_kb // 50)
+    body = b"".join(b"1 0 obj << /Type /Page >> endobj\n" for _ in range(pages))
+    padding = os.urandom(max(1, size_kb * 1024 - len(body)) // 2).hex().encode()
+    return b"%PDF-1.4\n" + body + b"%" + padding + b"\n%%EOF\n"
+
+
+def _multipart(filename: str, data: bytes, content_type: str) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    return head + data + f"\r\n--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    """一位虛擬使用者"""
+
+    def __init__(self, base_url: str, stats: Stats, args: argparse.Namespace):
+        self.base_url = base_url.rstrip("/")
+        self.stats = stats
+        self.args = args
+        self.headers = {
+            "X-Gemini-API-Key": "load-test",
+            "X-Notion-API-Key": "load-test",
+            "X-Notion-Database-ID": "load-test-db",
+        }
+
+    def _call(self, endpoint: str, path: str, body: bytes, content_type: str) -> Optional[Any]:
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=body,
+            headers={**self.headers, "Content-Type": content_type},
+            method="POST",
+        )
+        start = time.perf_counter()
+        error = None
+        payload = None
+        try:
+            with urllib.request.urlopen(request, timeout=self.args.timeout) as response:
+                data = response.read()
+                payload = jsonio.loads(data) if response.headers.get_content_type() == "application/json" else data
+        except urllib.error.HTTPError as e:
+            error = f"HTTP {e.code}"
+            e.close()
+        except Exception as e:
+            error = type(e).__name__
+        self.stats.record(endpoint, time.perf_counter() - start, error)
+        return payload if error is None else None
+
+    def _post_json(self, endpoint: str, body: Dict[str, Any]) -> Optional[Any]:
+        return self._call(endpoint, f"/api/{endpoint}", jsonio.dumps(body), "application/json")
+
+    def _think(self) -> None:
+        if self.args.think_time > 0:
+            time.sleep(random.expovariate(1 / self.args.think_time))
+
+    def run_session(self) -> None:
+        body, content_type = _multipart(f"paper-{uuid.uuid4().hex[:8]}.pdf", make_pdf(self.args.pdf_kb), "application/pdf")
+        note = self._call("upload", "/api/upload", body, content_type)
+        if not note:
+            return
+
+        for round_index in range(self.args.refines):
+            self._think()
+            feedback = "選項 A" if round_index == 0 else f"請補充第 {round_index} 節的細節"
+            refined = self._post_json("refine", {"original_summary": note, "user_feedback": feedback})
+            if not refined:
+                return
+            note = {**note, **refined}
+
+        self._think()
+        self._post_json("generate-pdf", {"title": note["title"], "blocks": note["blocks"]})
+        self._think()
+        self._post_json("save-to-notion", {"title": note["title"], "blocks": note["blocks"], "note_id": note.get("note_id")})
+        self.stats.session_done()
+
+
+def run_closed_loop(base_url: str, args: argparse.Namespace, concurrency: int) -> Tuple[Stats, float]:
+    """concurrency 位使用者各自不斷重複流程，直到 duration 結束"""
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+
+    def user() -> None:
+        client = Client(base_url, stats, args)
+        while time.monotonic() < deadline:
+            client.run_session()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - start
+
+
+def run_open_loop(base_url: str, args: argparse.Namespace) -> Tuple[Stats, float]:
+    """以 Poisson 抵達率開始新的使用者流程（後端變慢時不會降低送出速度）"""
+    stats = Stats()
+    start = time.perf_counter()
+    deadline = time.monotonic() + args.duration
+    with ThreadPoolExecutor(max_workers=args.max_inflight) as pool:
+        while time.monotonic() < deadline:
+            pool.submit(Client(base_url, stats, args).run_session)
+            time.sleep(random.expovariate(args.rate))
+    return stats, time.perf_counter() - start
+
+
+def report(stats: Stats, elapsed: float, label: str) -> Dict[str, Dict[str, float]]:
+    """印出各 endpoint 的延遲百分位數、吞吐量與錯誤分類"""
+    print(f"\n=== {label}：{elapsed:.1f}s，完成 {stats.sessions} 個使用者流程（{stats.sessions / elapsed * 60:.1f} / 分鐘）===")
+    print(f"{'endpoint':<16}{'ok':>7}{'err':>6}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  errors")
+    summary = {}
+    for name in ENDPOINTS:
+        latencies = stats.latencies[name]
+        errors = stats.errors[name]
+        error_count = sum(errors.values())
+        total = len(latencies) + error_count
+        p50, p95, p99 = (percentile(latencies, pct) * 1000 for pct in (50, 95, 99))
+        detail = ", ".join(f"{kind} × {count}" for kind, count in errors.most_common()) or "-"
+        print(f"{name:<16}{len(latencies):>7}{error_count:>6}{len(latencies) / elapsed:>8.2f}{p50:>10.0f}{p95:>10.0f}{p99:>10.0f}  {detail}")
+        summary[name] = {"p95_ms": p95, "error_rate": error_count / total if total else 0.0}
+    return summary
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_backend(args: argparse.Namespace, gemini_url: str, notion_url: str, workdir: str) -> Tuple[subprocess.Popen, str]:
+    """以 uvicorn 啟動連到假伺服器的後端，等待可以接受請求"""
+    port = _free_port()
+    env = {
+        **os.environ,
+        "GEMINI_BACKEND": "rest",
+        "GEMINI_API_BASE": gemini_url,
+        "NOTION_API_BASE": notion_url,
+        "NOTE_STORE_PATH": os.path.join(workdir, "notes.sqlite3"),
+        "CACHE_SQLITE_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "PREWARM_IMPORTS": "true",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"backend exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/openapi.json", timeout=2):
+                return process, base_url
+        except OSError:
+            time.sleep(0.3)
+    process.terminate()
+    raise RuntimeError("backend did not start within 60s")
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = arg_parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, default=4, help="同時使用者數（closed loop）")
+    mode.add_argument("--rate", type=float, help="每秒開始的使用者流程數（open loop）")
+    mode.add_argument("--sweep", help="依序測試的同時使用者數，例如 1,2,4,8")
+    arg_parser.add_argument("--duration", type=float, default=60, help="每一輪的秒數")
+    arg_parser.add_argument("--refines", type=int, default=2, help="每位使用者的 refine 次數")
+    arg_parser.add_argument("--think-time", type=float, default=0, help="步驟之間的平均停頓秒數（指數分布）")
+    arg_parser.add_argument("--pdf-kb", type=int, default=200)
+    arg_parser.add_argument("--timeout", type=float, default=300)
+    arg_parser.add_argument("--max-inflight", type=int, default=512, help="open loop 同時進行的流程上限")
+    arg_parser.add_argument("--slo-p95-ms", type=float, default=15000, help="sweep 的 p95 目標（所有 endpoint）")
+    arg_parser.add_argument("--max-error-rate", type=float, default=0.01)
+    arg_parser.add_argument("--base-url", help="測試已啟動的後端，不啟動假伺服器與 uvicorn")
+    arg_parser.add_argument("--workers", type=int, default=1, help="uvicorn worker 數")
+    add_fault_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    servers = []
+    backend = None
+    workdir = tempfile.TemporaryDirectory(prefix="load-test-")
+    try:
+        if args.base_url:
+            base_url = args.base_url
+        else:
+            servers = list(start_from_args(args))
+            backend, base_url = start_backend(args, servers[0].url, servers[1].url, workdir.name)
+            print(f"backend {base_url}（{args.workers} worker）| fake Gemini {servers[0].url} | fake Notion {servers[1].url}")
+
+        if args.rate:
+            stats, elapsed = run_open_loop(base_url, args)
+            report(stats, elapsed, f"rate {args.rate}/s")
+        elif args.sweep:
+            capacity = 0
+            for level in (int(x) for x in args.sweep.split(",")):
+                stats, elapsed = run_closed_loop(base_url, args, level)
+                summary = report(stats, elapsed, f"{level} 位使用者")
+                within = all(
+                    s["error_rate"] <= args.max_error_rate and not s["p95_ms"] > args.slo_p95_ms
+                    for s in summary.values()
+                )
+                if not within:
+                    break
+                capacity = level
+            print(f"\n在 p95 ≤ {args.slo_p95_ms:.0f} ms、錯誤率 ≤ {args.max_error_rate:.1%} 下可服務 {capacity} 位同時使用者")
+        else:
+            stats, elapsed = run_closed_loop(base_url, args, args.concurrency)
+            report(stats, elapsed, f"{args.concurrency} 位使用者")
+
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/status/admission", timeout=5) as response:
+                print(f"admission: {jsonio.loads(response.read())['classes']}")
+        except OSError:
+            pass
+        for server, name in zip(servers, ("Gemini", "Notion")):
+            print(f"fake {name}: {server.counters}")
+    finally:
+        if backend is not None:
+            backend.terminate()
+            backend.wait(timeout=30)
+        for server in servers:
+            server.stop()
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
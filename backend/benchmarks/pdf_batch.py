@@ -0,0 +1,58 @@
+"""
+批次 PDF 匯出：逐份生成 vs process pool 串流 ZIP
+
+用法（在 backend 目錄下，需安裝 reportlab）：
+    python -m benchmarks.pdf_batch [--notes 100] [--blocks 60] [--workers 8] [--merged]
+
+逐份生成模擬在前端逐一點選匯出；pool 匯出量測第一個 ZIP 片段的時間與總時間
+"""
+import argparse
+import asyncio
+import io
+import time
+import zipfile
+
+from benchmarks.fake_apis import fake_notes
+from config import settings
+from services import pdf, pdf_export
+
+
+async def _export(notes, merged: bool):
+    start = time.perf_counter()
+    first_chunk = None
+    size = 0
+    buffer = io.BytesIO()
+    async for chunk in pdf_export.stream_zip(notes, merged=merged):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        size += len(chunk)
+        buffer.write(chunk)
+    entries = len(zipfile.ZipFile(buffer).namelist())
+    return first_chunk, time.perf_counter() - start, size, entries
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--notes", type=int, default=100)
+    arg_parser.add_argument("--blocks", type=int, default=60)
+    arg_parser.add_argument("--workers", type=int, default=settings.PDF_EXPORT_WORKERS)
+    arg_parser.add_argument("--merged", action="store_true", help="另外產生合併的 PDF")
+    args = arg_parser.parse_args()
+
+    settings.PDF_EXPORT_WORKERS = args.workers
+    notes = [{"title": f"第 {i + 1} 週筆記", "blocks": fake_notes(args.blocks, str(i))["blocks"]} for i in range(args.notes)]
+
+    start = time.perf_counter()
+    for note in notes:
+        pdf.generate_pdf(note["title"], note["blocks"])
+    serial = time.perf_counter() - start
+    print(f"serial:      {serial:8.2f}s for {args.notes} note(s)")
+
+    # 第一次匯出包含 worker 啟動與字體載入，第二次為穩定狀態
+    for label in ("pool (cold)", "pool (warm)"):
+        first_chunk, total, size, entries = asyncio.run(_export(notes, args.merged))
+        print(f"{label}: {total:8.2f}s, first chunk {first_chunk:.2f}s, {entries} entries, {size / 1024 / 1024:.1f} MiB ({serial / total:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+refine 輸出大小：完整模式 vs patch 模式
+
+用法（在 backend 目錄下）：
+    python -m benchmarks.refine_patch [--blocks 20,60,120] [--edits 3]
+
+模擬一次典型的後期調整（在幾個段落後補充內容、改寫一個 block），
+比較 Gemini 需要輸出的 JSON 大小；並確認 apply_patch 的結果與完整輸出相同
+"""
+import argparse
+import time
+
+from benchmarks.fake_apis import fake_notes
+from services import block_patch, jsonio
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--blocks", default="20,60,120")
+    arg_parser.add_argument("--edits", type=int, default=3, help="插入補充內容的位置數")
+    args = arg_parser.parse_args()
+
+    print(f"{'blocks':>8}{'full chars':>12}{'patch chars':>13}{'ratio':>8}{'apply ms':>10}")
+    for count in (int(x) for x in args.blocks.split(",")):
+        blocks = fake_notes(count, "原始")["blocks"]
+        additions = fake_notes(3, "補充")["blocks"]
+        anchors = [count * (i + 1) // (args.edits + 1) for i in range(args.edits)]
+
+        operations = [{"op": "insert_after", "index": i, "blocks": additions} for i in anchors]
+        operations.append({"op": "replace", "index": 1, "blocks": additions[:1]})
+        patch = {"operations": operations}
+
+        expected = []
+        for i, block in enumerate(blocks):
+            expected.append(additions[0] if i == 1 else block)
+            if i in anchors:
+                expected.extend(additions)
+        full = {"title": "壓力測試筆記", "blocks": expected}
+
+        start = time.perf_counter()
+        applied = block_patch.apply_patch(blocks, patch)
+        apply_ms = (time.perf_counter() - start) * 1000
+        assert applied["blocks"] == expected, "apply_patch result differs from the full output"
+
+        full_chars = len(jsonio.dumps_str(full))
+        patch_chars = len(jsonio.dumps_str(patch))
+        print(f"{count:>8}{full_chars:>12}{patch_chars:>13}{patch_chars / full_chars:>8.1%}{apply_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+啟動時間預算檢查
+
+用法（在 backend 目錄下）：
+    python -m benchmarks.startup [--budget-ms 800] [--top 15]
+
+以 `python -X importtime -c "import main"` 啟動一個新的直譯器，列出最慢的 import，
+並確認延遲載入的大型套件（Gemini、reportlab、Notion、emoji）沒有在啟動時被載入。
+超過預算或大型套件被提早載入時以非零狀態結束，可用於 CI。
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 應該延遲到第一次使用才載入的套件
+HEAVY_MODULES = ("google.generativeai", "reportlab", "notion_client", "emoji")
+
+
+def run_importtime(module: str) -> Tuple[float, Dict[str, int], str]:
+    """
+    在新的直譯器中 import module
+
+    Returns:
+        (總耗時毫秒, {模組名稱: 累計微秒}, stderr 中 importtime 以外的內容)
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PREWARM_IMPORTS": "false"},
+    )
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    cumulative: Dict[str, int] = {}
+    other: List[str] = []
+    for line in result.stderr.splitlines():
+        # import time:  self [us] | cumulative | imported package
+        if not line.startswith("import time:"):
+            other.append(line)
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        cumulative[parts[2].strip()] = int(parts[1])
+
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n" + "\n".join(other))
+    return elapsed_ms, cumulative, "\n".join(other)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--module", default="main")
+    arg_parser.add_argument("--budget-ms", type=float, default=800)
+    arg_parser.add_argument("--top", type=int, default=15)
+    args = arg_parser.parse_args()
+
+    elapsed_ms, cumulative, _ = run_importtime(args.module)
+    print(f"import {args.module}: {elapsed_ms:.0f} ms (含直譯器啟動)，預算 {args.budget_ms:.0f} ms")
+
+    # 依累計時間列出最慢的模組
+    slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    print(f"\n{'累計 ms':>10}  模組")
+    for name, micros in slowest:
+        print(f"{micros / 1000:>10.1f}  {name}")
+
+    eager = [
+        name for name in cumulative
+        if any(name == heavy or name.startswith(heavy + ".") for heavy in HEAVY_MODULES)
+    ]
+    failed = False
+    if eager:
+        roots = sorted({heavy for heavy in HEAVY_MODULES for name in eager if name == heavy or name.startswith(heavy + ".")})
+        print(f"\n[FAIL] 啟動時載入了應延遲的套件：{', '.join(roots)}")
+        failed = True
+    else:
+        print("\n[OK] 大型套件皆未在啟動時載入")
+
+    if elapsed_ms > args.budget_ms:
+        print(f"[FAIL] 啟動時間 {elapsed_ms:.0f} ms 超過預算 {args.budget_ms:.0f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
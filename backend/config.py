@@ -5,7 +5,131 @@ from dotenv import load_dotenv
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 load_dotenv(os.path.join(base_dir, ".env"))
 
+
+def _admission_limits(name: str, concurrency: int, queue: int, max_wait: float) -> dict:
+    """准入控制的單一類別設定（可用 ADMISSION_<NAME>_CONCURRENCY / _QUEUE / _MAX_WAIT 覆寫）"""
+    prefix = f"ADMISSION_{name.upper()}"
+    return {
+        "concurrency": int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+        "queue": int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+        "max_wait": float(os.getenv(f"{prefix}_MAX_WAIT", str(max_wait))),
+    }
+
+
 class Config:
     GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
 
+    # refine 的模型分級：latency_budget 為預期延遲（超過時記錄），timeout 後改用 fallback 等級重試一次
+    MODEL_ROUTING = os.getenv("MODEL_ROUTING", "true").lower() == "true"
+    MODEL_TIERS = {
+        "fast": {
+            "model": os.getenv("GEMINI_FAST_MODEL", "gemini-2.5-flash-lite"),
+            "latency_budget": float(os.getenv("GEMINI_FAST_LATENCY_BUDGET", "8")),
+            "timeout": float(os.getenv("GEMINI_FAST_TIMEOUT", "30")),
+            "fallback": "standard",
+        },
+        "standard": {
+            "model": GEMINI_MODEL_NAME,
+            "latency_budget": float(os.getenv("GEMINI_STANDARD_LATENCY_BUDGET", "30")),
+            "timeout": float(os.getenv("GEMINI_STANDARD_TIMEOUT", "180")),
+            "fallback": None,
+        },
+        "deep": {
+            "model": os.getenv("GEMINI_DEEP_MODEL", "gemini-2.5-pro"),
+            "latency_budget": float(os.getenv("GEMINI_DEEP_LATENCY_BUDGET", "90")),
+            "timeout": float(os.getenv("GEMINI_DEEP_TIMEOUT", "300")),
+            "fallback": None,
+        },
+    }
+    # 路由條件：選項指令中屬於重度分析的選項；小幅修改的反饋長度、筆記 block 數與附件大小上限
+    ROUTING_DEEP_OPTIONS = os.getenv("ROUTING_DEEP_OPTIONS", "CD").upper()
+    ROUTING_FAST_MAX_FEEDBACK_CHARS = int(os.getenv("ROUTING_FAST_MAX_FEEDBACK_CHARS", "80"))
+    ROUTING_FAST_MAX_BLOCKS = int(os.getenv("ROUTING_FAST_MAX_BLOCKS", "80"))
+    ROUTING_FAST_MAX_ATTACHMENT_MB = float(os.getenv("ROUTING_FAST_MAX_ATTACHMENT_MB", "20"))
+
+    # Gemini 客戶端："google"（google.generativeai）、"rest"（REST API，可指定位址）或 "stub"（本機替身，不連網）
+    GEMINI_BACKEND = os.getenv("GEMINI_BACKEND", "google").lower()
+    GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+
+    # 多輪 refine 的 context cache（文件 + 固定指示）與其存活秒數
+    GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "true").lower() == "true"
+    GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+    # 同時保留的 Gemini 客戶端數（每個 API Key 一個，超過時關閉最久未使用的）
+    GEMINI_CLIENT_CACHE_SIZE = int(os.getenv("GEMINI_CLIENT_CACHE_SIZE", "32"))
+
+    # 上傳管線：單一請求內同時處理的檔案數，以及串流寫入的區塊大小
+    UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+    # 快取後端："memory"（行程內 LRU）或 "sqlite"（多個 worker 共享）
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+    CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join("uploads", "cache", "cache.sqlite3"))
+    # 每個 namespace 的容量上限（memory 後端為每個 worker 各自計算；項目數只限制 memory 後端）
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+    CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+    # 筆記版本庫（SQLite）
+    NOTE_STORE_PATH = os.getenv("NOTE_STORE_PATH", os.path.join("data", "notes.sqlite3"))
+
+    # 上傳後在背景預先上傳文件；推測性 refine 以最常用的選項預先生成（會消耗 Gemini 額度，預設關閉）
+    WARMUP_ON_UPLOAD = os.getenv("WARMUP_ON_UPLOAD", "true").lower() == "true"
+    SPECULATIVE_REFINE = os.getenv("SPECULATIVE_REFINE", "false").lower() == "true"
+    # 與前端「選項 A - 快速摘要指令」送出的內容相同，才能沿用推測的結果
+    SPECULATIVE_FEEDBACK = os.getenv(
+        "SPECULATIVE_FEEDBACK",
+        "請閱讀這篇論文，生成一個不超過 500 字 的摘要，包含以下內容：\n1. 研究目的\n2. 研究方法\n3. 主要結果\n4. 結論\n附上 關鍵字列表。"
+    )
+    SPECULATIVE_MAX_MB = float(os.getenv("SPECULATIVE_MAX_MB", "20"))
+    SPECULATIVE_MAX_CONCURRENT = int(os.getenv("SPECULATIVE_MAX_CONCURRENT", "2"))
+
+    # 上傳文件的 memory map handle（雜湊、頁數與上傳共用）保留數量上限
+    DOCUMENT_HANDLE_CACHE = int(os.getenv("DOCUMENT_HANDLE_CACHE", "32"))
+
+    # 長錄音：每段長度（秒）與同時摘要的段數
+    AUDIO_SEGMENT_SECONDS = int(os.getenv("AUDIO_SEGMENT_SECONDS", "600"))
+    AUDIO_SUMMARY_CONCURRENCY = int(os.getenv("AUDIO_SUMMARY_CONCURRENCY", "4"))
+
+    # 投影片文字抽取的 worker process 數
+    SLIDE_WORKERS = int(os.getenv("SLIDE_WORKERS", "2"))
+
+    # PDF 匯出：快取的 block 編譯結果數量上限
+    PDF_BLOCK_CACHE_SIZE = int(os.getenv("PDF_BLOCK_CACHE_SIZE", "4096"))
+
+    # 批次 PDF 匯出：process pool 的 worker 數與單次匯出的筆記數上限
+    PDF_EXPORT_WORKERS = int(os.getenv("PDF_EXPORT_WORKERS", str(os.cpu_count() or 2)))
+    PDF_EXPORT_MAX_NOTES = int(os.getenv("PDF_EXPORT_MAX_NOTES", "500"))
+
+    # refine 的 patch 模式：筆記至少有此數量的 block 時，Gemini 只輸出修改操作
+    REFINE_PATCH_MODE = os.getenv("REFINE_PATCH_MODE", "true").lower() == "true"
+    REFINE_PATCH_MIN_BLOCKS = int(os.getenv("REFINE_PATCH_MIN_BLOCKS", "8"))
+
+    # Notion API 位址（壓力測試時指向本機假伺服器）與每秒請求數上限
+    NOTION_API_BASE = os.getenv("NOTION_API_BASE", "https://api.notion.com")
+    NOTION_REQUESTS_PER_SECOND = float(os.getenv("NOTION_REQUESTS_PER_SECOND", "3"))
+
+    # 准入控制：各 endpoint 類別的同時處理數、等待佇列長度與最長等待秒數（每個 worker 行程）
+    ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+    ADMISSION_LIMITS = {
+        "llm": _admission_limits("llm", 16, 32, 15),
+        "pdf": _admission_limits("pdf", 4, 16, 10),
+        "notion": _admission_limits("notion", 8, 32, 20),
+        "upload": _admission_limits("upload", 8, 16, 10),
+    }
+    ADMISSION_MIN_RETRY_AFTER = int(os.getenv("ADMISSION_MIN_RETRY_AFTER", "1"))
+
+    # /api/* 的回應壓縮（zstd / br / gzip）門檻，以及 gzip 請求 body 解壓後的大小上限
+    COMPRESSION = os.getenv("COMPRESSION", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_MAX_REQUEST_BYTES = int(os.getenv("COMPRESSION_MAX_REQUEST_BYTES", str(32 * 1024 * 1024)))
+
+    # 按需剖析：管理者以 X-Profile: <token> 觸發，或依比例抽樣 /api/ 請求；兩者皆未設定時不掛載
+    PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+    PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("data", "profiles"))
+    PROFILE_MAX_COUNT = int(os.getenv("PROFILE_MAX_COUNT", "50"))
+
+    # 啟動後於背景預先載入 Gemini / reportlab / Notion 等大型套件
+    PREWARM_IMPORTS = os.getenv("PREWARM_IMPORTS", "true").lower() == "true"
+
 settings = Config()
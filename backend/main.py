@@ -10,57 +10,107 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 import os
 
-from routers import upload, summary
+from config import settings
+from middlewares import AdmissionControlMiddleware, CompressionMiddleware, ProfilingMiddleware
+from middlewares.profiling import profiling_enabled
+from routers import upload, summary, preview, notes, status
+from services import loader
 
 app = FastAPI(title="Personal AI Note", version="1.0.0")
 
+# /api/* 的請求解壓與回應壓縮（最內層，准入控制拒絕的小回應不經過壓縮）
+app.add_middleware(CompressionMiddleware)
+
+# 准入控制：超過各類別的並行與佇列上限時快速回傳 503
+app.add_middleware(AdmissionControlMiddleware)
+
+# 按需剖析（位於准入控制外層，被拒絕的請求也能剖析；未啟用時不掛載）
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
+
+@app.on_event("startup")
+async def prewarm_imports():
+    """大型套件改為延遲載入；啟動完成後在背景載入，第一個請求不必等待"""
+    if settings.PREWARM_IMPORTS:
+        loader.prewarm_in_background()
+
 # 確保 uploads 目錄存在
 os.makedirs("uploads", exist_ok=True)
 
-# 掛載靜態檔案（用於 PDF 預覽）
+# 掛載靜態檔案（舊版 PDF 預覽路徑，新的預覽走 /api/preview）
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # 註冊路由
 app.include_router(upload.router)
 app.include_router(summary.router)
 app.include_router(summary.router)
+app.include_router(preview.router)
+app.include_router(notes.router)
+app.include_router(status.router)
 
 # ==========================================
 # Serve Frontend (SPA)
 # ==========================================
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import Request, HTTPException
+from fastapi.responses import HTMLResponse, Response
+
+from services.preview import etag_matches
+from services.static_bundle import StaticBundle, StaticAsset
 
 # In Docker: /app/backend is WORKDIR
 # Frontend dist is at /app/frontend/dist (so ../frontend/dist)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 FRONTEND_DIST = os.path.join(BASE_DIR, "frontend", "dist")
-ASSETS_DIR = os.path.join(FRONTEND_DIST, "assets")
 
-# Mount assets (JS, CSS, Images) ONLY if they exist to prevent startup errors
-if os.path.exists(ASSETS_DIR):
-    app.mount("/assets", StaticFiles(directory=ASSETS_DIR), name="assets")
+# 啟動時一次性載入 dist（含 index.html 與預先壓縮的 assets），之後不再讀取磁碟
+frontend = StaticBundle(FRONTEND_DIST)
+
+
+def asset_response(asset: StaticAsset, request: Request) -> Response:
+    """依 ETag 與 Accept-Encoding 回傳靜態檔案"""
+    encoding, body = asset.select(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": asset.etags[encoding],
+        "Cache-Control": asset.cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), asset.etags[encoding]):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=asset.media_type, headers=headers)
+
+
+@app.get("/assets/{asset_path:path}")
+async def serve_assets(asset_path: str, request: Request):
+    """JS、CSS、圖片等 build 產物"""
+    asset = frontend.get(f"assets/{asset_path}")
+    if asset is None:
+        raise HTTPException(status_code=404)
+    return asset_response(asset, request)
+
 
 # Catch-all route for SPA (Vue Router) - Always defined
 @app.get("/{full_path:path}")
-async def serve_spa(full_path: str):
+async def serve_spa(full_path: str, request: Request):
     # Skip API and Uploads (handled above)
     if full_path.startswith("api/") or full_path.startswith("uploads/"):
-            from fastapi import HTTPException
-            raise HTTPException(status_code=404)
+        raise HTTPException(status_code=404)
 
     # 1. 檢查 Frontend dist 是否存在
-    if not os.path.exists(FRONTEND_DIST):
+    if not frontend.available:
         return HTMLResponse(content="Frontend build not found. Please check deployment.", status_code=404)
 
     # 2. Check if requesting a static file (e.g., /folder.svg, /favicon.ico)
-    static_file = os.path.join(FRONTEND_DIST, full_path)
-    if os.path.isfile(static_file):
-        return FileResponse(static_file)
+    asset = frontend.get(full_path) if full_path else None
+    if asset is not None:
+        return asset_response(asset, request)
 
     # 3. Otherwise, serve index.html for SPA routing
-    index_file = os.path.join(FRONTEND_DIST, "index.html")
-    if os.path.exists(index_file):
-        with open(index_file, "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-            
+    index = frontend.get("index.html")
+    if index is not None:
+        return asset_response(index, request)
+
     return HTMLResponse(content="Index.html not found", status_code=404)
@@ -1,4 +1,5 @@
 from .upload_manager import UploadManager
 from .summary_manager import SummaryManager
+from .note_manager import NoteManager
 
-__all__ = ["UploadManager", "SummaryManager"]
+__all__ = ["UploadManager", "SummaryManager", "NoteManager"]
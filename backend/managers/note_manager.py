@@ -0,0 +1,93 @@
+"""
+筆記版本庫業務邏輯
+
+職責：
+1. 協調 note_store 的調用（在 thread 中執行 SQLite 操作，不阻塞 event loop）
+2. 保存 refine 結果為新版本
+
+錯誤處理：筆記不存在時拋出 NoteNotFound，由 Router 層轉為 404
+"""
+import asyncio
+import time
+from typing import Dict, Any, List, Optional
+
+from services import note_store
+
+
+class NoteManager:
+    """筆記版本的查詢、保存與還原"""
+
+    async def save_refine_result(
+        self,
+        original_summary: Dict[str, Any],
+        result: Dict[str, Any],
+        user_feedback: str
+    ) -> Dict[str, Any]:
+        """
+        將 refine 結果保存為 original_summary 所屬筆記的新版本
+
+        Returns:
+            {"note_id": ..., "version": ...}
+        """
+        return await asyncio.to_thread(
+            note_store.save_version,
+            original_summary.get("note_id"),
+            result["title"],
+            result["blocks"],
+            files=original_summary.get("files", []),
+            file_hashes=original_summary.get("file_hashes", []),
+            feedback=user_feedback,
+        )
+
+    async def list_notes(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        source: Optional[str] = None,
+        file_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return await asyncio.to_thread(note_store.list_notes, limit, cursor, source, file_hash)
+
+    async def search(self, query: str, limit: int = 20) -> Dict[str, Any]:
+        """全文檢索筆記，返回結果與查詢耗時"""
+        start = time.perf_counter()
+        results = await asyncio.to_thread(note_store.search_notes, query, limit)
+        took_ms = (time.perf_counter() - start) * 1000
+        return {"query": query, "results": results, "took_ms": round(took_ms, 2)}
+
+    async def get_note(self, note_id: str, version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Raises:
+            NoteNotFound: 筆記或版本不存在
+        """
+        return await asyncio.to_thread(note_store.get_note, note_id, version)
+
+    async def list_versions(self, note_id: str) -> List[Dict[str, Any]]:
+        """
+        Raises:
+            NoteNotFound: 筆記不存在
+        """
+        return await asyncio.to_thread(note_store.list_versions, note_id)
+
+    async def restore_version(self, note_id: str, version: int) -> Dict[str, Any]:
+        """
+        將舊版本還原為新的最新版本，返回還原後的完整筆記
+
+        Raises:
+            NoteNotFound: 筆記或版本不存在
+        """
+        restored = await asyncio.to_thread(note_store.restore_version, note_id, version)
+        return await self.get_note(restored["note_id"], restored["version"])
+
+    async def get_notion_sync(self, note_id: str, database_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(note_store.get_notion_sync, note_id, database_id)
+
+    async def save_notion_sync(
+        self,
+        note_id: str,
+        database_id: str,
+        page_id: str,
+        title: str,
+        blocks: Optional[List[List[str]]]
+    ) -> None:
+        await asyncio.to_thread(note_store.save_notion_sync, note_id, database_id, page_id, title, blocks)
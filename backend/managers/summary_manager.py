@@ -6,9 +6,17 @@
 2. 處理業務邏輯
 3. 錯誤處理和數據轉換
 """
-from typing import Dict, Any, List
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Any, List, Optional
 
-from services import llm, notion, pdf
+from config import settings
+from services import block_ir, block_validator, jsonio, llm, model_router, notion, pdf, pdf_export, warmup
+from services.cache import get_cache, make_key
+from .note_manager import NoteManager
+
+# 相同標題與內容的 PDF 直接重用（使用共享快取時跨 worker 共用）
+_pdf_cache = get_cache("pdf", default_ttl=3600)
 
 
 class SummaryManager:
@@ -21,37 +29,75 @@ class SummaryManager:
         gemini_api_key: str = None
     ) -> Dict[str, Any]:
         """
-        根據用戶反饋調整摘要
+        根據用戶反饋調整摘要，並將結果保存為筆記的新版本
+
+        Returns:
+            調整後的筆記，附帶 note_id 與 version
         
         Raises:
             Exception: 當 LLM 調用失敗時
         """
-        return await llm.refine_summary(original_summary, user_feedback, api_key=gemini_api_key)
+        # 上傳後的推測性 refine：相同反饋時沿用（推測失敗時重新生成），否則取消
+        speculation = warmup.claim(original_summary, user_feedback, gemini_api_key)
+        result = await speculation if speculation is not None else None
+        if result is None:
+            result = await llm.refine_summary(original_summary, user_feedback, api_key=gemini_api_key)
+        saved = await NoteManager().save_refine_result(original_summary, result, user_feedback)
+        return {**result, **saved}
 
-    def save_to_notion(
+    async def save_to_notion(
         self, 
         title: str, 
         blocks: List[Any],
         notion_api_key: str = None,
-        notion_database_id: str = None
+        notion_database_id: str = None,
+        note_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         儲存到 Notion
+
+        有 note_id 時記住頁面與 block id，之後只同步變動的 block；
+        否則每次建立新頁面
         
         Returns:
-            {"success": True, "message": ...} 或 {"success": False, "error": ...}
+            {"success": True, "message": ..., "page_id": ..., "stats": ...} 或 {"success": False, "error": ...}
         """
-        result = notion.create_notion_page(
-            title, 
-            blocks, 
-            api_key=notion_api_key, 
-            database_id=notion_database_id
+        if not notion_api_key or not notion_database_id:
+            return {"success": False, "error": "Error: Notion API Key and Database ID are required."}
+
+        # 前端可能編輯過 blocks，送出前先在本地修復，避免被 Notion API 拒絕
+        blocks = block_validator.normalize_notes({"blocks": blocks})["blocks"]
+
+        notes = NoteManager()
+        state = await notes.get_notion_sync(note_id, notion_database_id) if note_id else None
+
+        try:
+            result = await asyncio.to_thread(
+                notion.sync_notion_page,
+                title,
+                block_ir.from_notion(blocks),
+                api_key=notion_api_key,
+                database_id=notion_database_id,
+                state=state
+            )
+        except Exception as e:
+            logging.error(f"Notion Error: {e}")
+            if state:
+                # 同步中途失敗時頁面內容未知，下次整頁重寫
+                await notes.save_notion_sync(note_id, notion_database_id, state["page_id"], state["title"], None)
+            return {"success": False, "error": f"Error saving to Notion: {e}"}
+
+        if note_id:
+            await notes.save_notion_sync(
+                note_id, notion_database_id, result["page_id"], result["title"], result["blocks"]
+            )
+
+        stats = result["stats"]
+        message = (
+            "Success: Page created in Notion!" if not state or state["page_id"] != result["page_id"]
+            else f"Success: Synced to Notion ({stats['appended']} added, {stats['updated']} updated, {stats['deleted']} deleted)."
         )
-        
-        if "Error" in result:
-            return {"success": False, "error": result}
-        
-        return {"success": True, "message": result}
+        return {"success": True, "message": message, "page_id": result["page_id"], "stats": stats}
 
     def generate_pdf(self, title: str, blocks: List[Any]) -> bytes:
         """
@@ -63,4 +109,44 @@ class SummaryManager:
         Raises:
             Exception: 當 PDF 生成失敗時
         """
-        return pdf.generate_pdf(title, blocks)
+        cache_key = make_key(title, jsonio.dumps(blocks, sort_keys=True))
+        return _pdf_cache.get_or_compute(
+            cache_key, lambda: pdf.generate_pdf(title, block_ir.from_notion(blocks))
+        )
+
+    async def export_pdfs(self, notes: List[Dict[str, Any]], merged: bool = False) -> AsyncIterator[bytes]:
+        """
+        批次匯出 PDF，返回 ZIP 串流
+
+        notes 中帶 note_id 的項目從筆記版本庫讀取；所有筆記在開始串流前先解析完成，
+        讓找不到筆記等錯誤仍能以一般的錯誤回應返回
+
+        Raises:
+            ValueError: 沒有筆記、超過數量上限或缺少內容
+            NoteNotFound: 筆記或版本不存在
+        """
+        if not notes:
+            raise ValueError("No notes to export.")
+        if len(notes) > settings.PDF_EXPORT_MAX_NOTES:
+            raise ValueError(f"Too many notes: at most {settings.PDF_EXPORT_MAX_NOTES} per export.")
+
+        store = NoteManager()
+        resolved = []
+        for index, note in enumerate(notes):
+            if note.get("note_id"):
+                stored = await store.get_note(note["note_id"], note.get("version"))
+                resolved.append({"title": note.get("title") or stored["title"], "blocks": stored["blocks"]})
+            elif note.get("blocks") is not None:
+                resolved.append({"title": note.get("title") or f"Note {index + 1}", "blocks": note["blocks"]})
+            else:
+                raise ValueError(f"Note {index + 1} needs either note_id or blocks.")
+
+        return pdf_export.stream_zip(resolved, merged=merged)
+
+    def pdf_cache_stats(self) -> Dict[str, Any]:
+        """PDF 匯出時 block 編譯快取的命中率"""
+        return pdf.block_cache_stats()
+
+    def routing_stats(self) -> Dict[str, Any]:
+        """refine 的模型路由決策與各等級延遲"""
+        return model_router.stats()
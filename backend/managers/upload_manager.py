@@ -6,63 +6,220 @@
 2. 編排業務流程
 3. 構建響應數據
 
-錯誤處理：拋出異常，由 Router 層統一處理
+錯誤處理：單一文件失敗只記錄在 failed 中，不影響其他文件；
+其餘異常拋出，由 Router 層統一處理
 """
+import asyncio
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator
 from fastapi import UploadFile
 
-from services import upload, llm, parser
+from config import settings
+from services import upload, llm, parser, warmup
+
+# 進度事件回呼：(事件名稱, 事件資料)
+EmitFn = Callable[[str, Dict[str, Any]], None]
 
 
 class UploadManager:
     """應用層 - 協調文件上傳的完整業務流程"""
 
+    def upload_formats(self) -> Dict[str, Any]:
+        """目前開放上傳的副檔名（前端依此設定檔案選擇器）"""
+        return {"extensions": list(upload.ALLOWED_UPLOAD_EXTENSIONS)}
+
     async def process_upload(
-        self, 
-        files: List[UploadFile], 
+        self,
+        files: List[UploadFile],
         gemini_api_key: str = None
     ) -> Dict[str, Any]:
         """
         處理多個文件上傳的完整流程
 
-        流程：保存文件 → 生成摘要 → 返回預覽數據
-        
+        流程：保存文件 → 抽取資訊 → 生成摘要 → 返回預覽數據
+
         Raises:
-            Exception: 當任何步驟失敗時，會清理已保存的臨時文件後再拋出
+            Exception: 當生成預覽失敗時，會清理已保存的臨時文件後再拋出
+        """
+        results = await self._run_pipeline(files, gemini_api_key, emit=None, preupload=False)
+        response = await self._build_response(results, gemini_api_key)
+        # 回應送出後在背景預先上傳文件（與推測性生成），第一次 refine 不必從頭開始
+        warmup.start(response, gemini_api_key)
+        return response
+
+    async def stream_upload(
+        self,
+        files: List[UploadFile],
+        gemini_api_key: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        與 process_upload 相同的流程，但逐一產出每個文件的進度事件
+
+        事件依序為 received → saved → extracted → preuploaded（或 failed），
+        最後產出 done，其資料與 process_upload 的回傳值相同
+
+        Yields:
+            {"event": 事件名稱, "data": 事件資料}
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def emit(event: str, data: Dict[str, Any]) -> None:
+            queue.put_nowait({"event": event, "data": data})
+
+        async def run() -> List[Dict[str, Any]]:
+            try:
+                return await self._run_pipeline(files, gemini_api_key, emit=emit, preupload=True)
+            finally:
+                queue.put_nowait(None)
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+
+            results = task.result()
+            response = await self._build_response(results, gemini_api_key)
+            warmup.start(response, gemini_api_key, preuploaded=True)
+            yield {"event": "done", "data": response}
+        finally:
+            # 用戶端中途斷線時停止仍在進行的處理（已保存的文件由 pipeline 清理）
+            if not task.done():
+                task.cancel()
+
+    async def _run_pipeline(
+        self,
+        files: List[UploadFile],
+        gemini_api_key: Optional[str],
+        emit: Optional[EmitFn],
+        preupload: bool
+    ) -> List[Dict[str, Any]]:
+        """以 UPLOAD_CONCURRENCY 為上限並行處理所有文件，結果順序與輸入一致"""
+        semaphore = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY)
+
+        async def run_one(index: int, file: UploadFile) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._process_file(index, file, gemini_api_key, emit, preupload)
+
+        tasks = [asyncio.create_task(run_one(i, f)) for i, f in enumerate(files)]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except asyncio.CancelledError:
+            for t in tasks:
+                t.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for r in results:
+                if isinstance(r, dict) and r.get("path"):
+                    parser.cleanup_temp_file(r["path"])
+            raise
+
+    async def _process_file(
+        self,
+        index: int,
+        file: UploadFile,
+        gemini_api_key: Optional[str],
+        emit: Optional[EmitFn],
+        preupload: bool
+    ) -> Dict[str, Any]:
+        """
+        單一文件的處理階段：保存 → 抽取 →（可選）預先上傳到 Gemini
+
+        Returns:
+            成功：{"ok": True, "filename", "path", "sha256", "size", "metadata"}
+            失敗：{"ok": False, "filename", "error"}
         """
-        tmp_paths = []
+        filename = file.filename
 
+        def notify(event: str, **data: Any) -> None:
+            if emit:
+                emit(event, {"index": index, "filename": filename, **data})
+
+        path = None
         try:
-            # 1. 保存所有文件
-            tmp_paths = await upload.save_files_to_temp(files)
-            filenames = [file.filename for file in files]
+            saved = await upload.save_file(
+                file,
+                on_progress=lambda received: notify("received", bytes=received)
+            )
+            path = saved["path"]
+            notify("saved", bytes=saved["size"], sha256=saved["sha256"])
+
+            try:
+                metadata = await upload.extract_metadata(path, saved["sha256"])
+            except ValueError as e:
+                # 抽取階段的訊息不含臨時文件名，附上使用者上傳的檔名
+                raise ValueError(f"{e}: {filename}") from e
+            notify("extracted", **metadata)
+        except asyncio.CancelledError:
+            if path:
+                parser.cleanup_temp_file(path)
+            raise
+        except Exception as e:
+            if path:
+                parser.cleanup_temp_file(path)
+            notify("failed", error=str(e))
+            return {"ok": False, "filename": filename, "error": str(e)}
+
+        result = {"ok": True, "filename": filename, "path": path, "metadata": metadata, **saved}
+
+        # 投影片只以抽取的文字送出、錄音上傳其分段（與 refine 使用的內容相同）
+        if preupload and gemini_api_key:
+            # 預先上傳只是加速，失敗時 refine 會重新上傳
+            try:
+                await llm.prewarm_files([(path, saved["sha256"])], gemini_api_key)
+                notify("preuploaded")
+            except asyncio.CancelledError:
+                parser.cleanup_temp_file(path)
+                raise
+            except Exception as e:
+                notify("preupload_failed", error=str(e))
+
+        return result
+
+    async def _build_response(
+        self,
+        results: List[Dict[str, Any]],
+        gemini_api_key: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        由各文件的處理結果構建預覽數據（部分成功時 failed 列出失敗的文件）
 
-            # 2. 生成標題和 Notion blocks (靜態選單，不調用 LLM)
+        Raises:
+            Exception: 生成預覽失敗時，清理已保存的臨時文件後重新拋出
+        """
+        succeeded = [r for r in results if r["ok"]]
+        failed = [{"filename": r["filename"], "error": r["error"]} for r in results if not r["ok"]]
+
+        tmp_paths = [r["path"] for r in succeeded]
+        filenames = [r["filename"] for r in succeeded]
+
+        if not succeeded:
+            return {"files": [], "failed": failed}
+
+        try:
+            # 生成標題和 Notion blocks (靜態選單，不調用 LLM)
             result = await llm.get_static_options_menu(
-                tmp_paths, 
+                tmp_paths,
                 filenames,
                 api_key=gemini_api_key
             )
-
-            # 3. 構建 PDF URL
-            pdf_urls = []
-            for path in tmp_paths:
-                basename = os.path.basename(path)
-                pdf_urls.append(f"/uploads/temp/{basename}")
-
-            # 4. 返回成功響應
-            return {
-                "title": result["title"],
-                "blocks": result["blocks"],
-                "files": filenames,
-                "pdf_urls": pdf_urls,
-                "temp_paths": tmp_paths,
-                "is_initial_menu": result.get("is_initial_menu", False)
-            }
-
         except Exception:
             # 失敗時清理臨時文件，然後重新拋出異常
             for path in tmp_paths:
                 parser.cleanup_temp_file(path)
             raise  # 讓 Router 處理
+
+        # 構建 PDF 預覽 URL（支援 Range 與 immutable 快取）
+        pdf_urls = [f"/api/preview/{os.path.basename(path)}" for path in tmp_paths]
+
+        return {
+            "title": result["title"],
+            "blocks": result["blocks"],
+            "files": filenames,
+            "pdf_urls": pdf_urls,
+            "temp_paths": tmp_paths,
+            "file_hashes": [r["sha256"] for r in succeeded],
+            "failed": failed,
+            "is_initial_menu": result.get("is_initial_menu", False)
+        }
@@ -0,0 +1,5 @@
+from .admission import AdmissionControlMiddleware
+from .compression import CompressionMiddleware
+from .profiling import ProfilingMiddleware
+
+__all__ = ["AdmissionControlMiddleware", "CompressionMiddleware", "ProfilingMiddleware"]
@@ -0,0 +1,162 @@
+"""
+准入控制（admission control）與負載卸除
+
+依 endpoint 類別（LLM、PDF、Notion、上傳）分別限制同時處理的請求數：
+- 未達上限時直接處理
+- 達到上限時排入有上限的等待佇列，最多等待 max_wait 秒
+- 佇列已滿或等待逾時時立即回傳 503 與 Retry-After，而不是讓所有使用者一起變慢到逾時
+
+限制以單一 worker 行程計算；多個 uvicorn worker 時總容量為 worker 數乘以各類別上限。
+目前各類別的處理中 / 等待數可由 admission_stats() 取得（/api/status/admission）
+"""
+import asyncio
+import math
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import settings
+from services import jsonio
+
+# (HTTP method, path) → endpoint 類別
+ENDPOINT_CLASSES: Dict[Tuple[str, str], str] = {
+    ("POST", "/api/refine"): "llm",
+    ("POST", "/api/generate-pdf"): "pdf",
+    ("POST", "/api/generate-pdf/batch"): "pdf",
+    ("POST", "/api/save-to-notion"): "notion",
+    ("POST", "/api/upload"): "upload",
+    ("POST", "/api/upload/stream"): "upload",
+}
+
+# 處理時間的指數移動平均權重（用於估計 Retry-After）
+_EWMA_ALPHA = 0.2
+
+
+class AdmissionGate:
+    """單一 endpoint 類別的並行上限與等待佇列"""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, max_wait: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.avg_service_seconds = 0.0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # 在第一次使用時建立，確保屬於 worker 的 event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def acquire(self) -> bool:
+        """取得處理名額；佇列已滿或等待逾時返回 False"""
+        semaphore = self.semaphore
+        if self.waiting == 0 and not semaphore.locked():
+            await semaphore.acquire()
+        else:
+            if self.waiting >= self.queue_size:
+                self.rejected_full += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                return False
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self, service_seconds: float) -> None:
+        self.active -= 1
+        if self.avg_service_seconds:
+            self.avg_service_seconds += _EWMA_ALPHA * (service_seconds - self.avg_service_seconds)
+        else:
+            self.avg_service_seconds = service_seconds
+        self.semaphore.release()
+
+    def retry_after(self) -> int:
+        """依目前排隊量與平均處理時間估計多久後再試（秒）"""
+        estimate = self.avg_service_seconds * (self.waiting + 1) / max(self.concurrency, 1)
+        return int(min(max(math.ceil(estimate), settings.ADMISSION_MIN_RETRY_AFTER), 60))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "max_wait_seconds": self.max_wait,
+            "admitted": self.admitted,
+            "rejected_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_service_ms": round(self.avg_service_seconds * 1000, 1),
+        }
+
+
+_gates: Dict[str, AdmissionGate] = {
+    name: AdmissionGate(name, limits["concurrency"], limits["queue"], limits["max_wait"])
+    for name, limits in settings.ADMISSION_LIMITS.items()
+}
+
+
+def admission_stats() -> Dict[str, Any]:
+    """各 endpoint 類別的處理中、等待中與拒絕次數"""
+    return {
+        "enabled": settings.ADMISSION_CONTROL,
+        "classes": {name: gate.stats() for name, gate in _gates.items()},
+    }
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware：依 ENDPOINT_CLASSES 對請求做准入控制（名額在回應完整送出後才釋放）"""
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not settings.ADMISSION_CONTROL:
+            await self.app(scope, receive, send)
+            return
+
+        gate = _gates.get(ENDPOINT_CLASSES.get((scope["method"], scope["path"].rstrip("/")), ""))
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await gate.acquire():
+            await self._reject(gate, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - start)
+
+    @staticmethod
+    async def _reject(gate: AdmissionGate, send: Callable) -> None:
+        retry_after = gate.retry_after()
+        body = jsonio.dumps({
+            "error": "Server is busy, please retry later.",
+            "class": gate.name,
+            "retry_after": retry_after,
+        })
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,259 @@
+"""
+/api/* 的請求與回應壓縮
+
+回應：
+- 依 Accept-Encoding 選擇 zstd / br / gzip（zstd 需安裝 `zstandard`，brotli 需安裝 `brotli`）
+- 只壓縮 JSON、文字與 event-stream，且大小達 COMPRESSION_MIN_SIZE；PDF、ZIP、Range 回應與
+  已壓縮的回應原樣送出
+- 串流回應逐段壓縮並 flush，每個片段仍會立即送達用戶端
+- 較大的一次性回應在 thread 中壓縮，不阻塞 event loop
+
+請求：
+- 接受 Content-Encoding: gzip 的 body，解壓後的大小超過 COMPRESSION_MAX_REQUEST_BYTES 時回傳 413，
+  格式錯誤時回傳 400；其他編碼回傳 415
+"""
+import asyncio
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from services import jsonio
+from services.static_bundle import parse_accept_encoding
+
+try:
+    import brotli
+except ImportError:  # brotli 為選用套件
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard 為選用套件
+    zstandard = None
+
+_COMPRESSIBLE_TYPES = (b"application/json", b"application/x-ndjson", b"text/")
+
+# 動態內容以速度優先的壓縮等級
+_GZIP_LEVEL = 6
+_BROTLI_QUALITY = 5
+_ZSTD_LEVEL = 3
+
+# 超過此大小的一次性回應在 thread 中壓縮
+_THREAD_THRESHOLD = 256 * 1024
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """依偏好順序排列、目前可用的回應編碼"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+_ENCODINGS = available_encodings()
+
+
+class _Compressor:
+    """單一回應的串流壓縮器：compress() 回傳可立即送出的 bytes"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._zstd = zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compressobj()
+        elif encoding == "br":
+            self._brotli = brotli.Compressor(quality=_BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "zstd":
+            out = self._zstd.compress(data)
+            flush_mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            return out + self._zstd.flush(flush_mode)
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _select_encoding(scope: Dict[str, Any]) -> Optional[str]:
+    accept = _header(scope["headers"], b"accept-encoding")
+    if not accept:
+        return None
+    accepted = parse_accept_encoding(accept.decode("latin-1"))
+    for encoding in _ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware：解壓 gzip 請求 body，並依 Accept-Encoding 壓縮回應"""
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not settings.COMPRESSION or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        content_encoding = _header(scope["headers"], b"content-encoding")
+        if content_encoding is not None and content_encoding.strip().lower() not in (b"", b"identity"):
+            if content_encoding.strip().lower() != b"gzip":
+                await _send_error(send, 415, "Unsupported Content-Encoding; only gzip is accepted.")
+                return
+            decoded = await _read_gzip_body(receive)
+            if isinstance(decoded, tuple):
+                await _send_error(send, *decoded)
+                return
+            scope, receive = _with_body(scope, receive, decoded)
+
+        encoding = _select_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressedResponder(self.app, encoding)(scope, receive, send)
+
+
+class _CompressedResponder:
+    """延後送出 http.response.start，直到知道回應是否值得壓縮"""
+
+    def __init__(self, app: Callable, encoding: str):
+        self.app = app
+        self.encoding = encoding
+        self.send: Callable = None
+        self.start_message: Optional[Dict[str, Any]] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        self.send = send
+        await self.app(scope, receive, self._send)
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = message.get("headers", [])
+            content_type = _header(headers, b"content-type") or b""
+            self.passthrough = (
+                message["status"] in (204, 206, 304)
+                or _header(headers, b"content-encoding") is not None
+                or _header(headers, b"content-range") is not None
+                or not content_type.startswith(_COMPRESSIBLE_TYPES)
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            # 第一個 body 片段：一次性的小回應不壓縮
+            if not more_body and len(body) < settings.COMPRESSION_MIN_SIZE:
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            self.compressor = _Compressor(self.encoding)
+            await self.send(self._compressed_start())
+
+        if not more_body and len(body) >= _THREAD_THRESHOLD:
+            data = await asyncio.to_thread(self.compressor.compress, body, True)
+        else:
+            data = self.compressor.compress(body, final=not more_body)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _compressed_start(self) -> Dict[str, Any]:
+        # 壓縮後長度未知（串流）或已改變，移除 Content-Length 改用 chunked
+        original = self.start_message.get("headers", [])
+        headers = [(key, value) for key, value in original if key.lower() not in (b"content-length", b"vary")]
+        vary = _header(original, b"vary")
+        if not vary:
+            vary = b"Accept-Encoding"
+        elif b"accept-encoding" not in vary.lower():
+            vary += b", Accept-Encoding"
+        headers.append((b"vary", vary))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        return {**self.start_message, "headers": headers}
+
+
+async def _read_gzip_body(receive: Callable):
+    """
+    讀取並解壓 gzip 請求 body
+
+    Returns:
+        解壓後的 bytes；失敗時返回 (status_code, error message)
+    """
+    limit = settings.COMPRESSION_MAX_REQUEST_BYTES
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    body = bytearray()
+    received = 0
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return 400, "Client disconnected."
+            chunk = message.get("body", b"")
+            received += len(chunk)
+            if received > limit:
+                return 413, f"Request body exceeds {limit} bytes."
+            # max_length 讓解壓縮炸彈最多只展開到上限 + 1 byte
+            body += decompressor.decompress(chunk, limit + 1 - len(body))
+            while decompressor.unconsumed_tail and len(body) <= limit:
+                body += decompressor.decompress(decompressor.unconsumed_tail, limit + 1 - len(body))
+            if len(body) > limit:
+                return 413, f"Decompressed request body exceeds {limit} bytes."
+            if not message.get("more_body", False):
+                break
+    except zlib.error:
+        return 400, "Malformed gzip request body."
+    if not decompressor.eof:
+        return 400, "Truncated gzip request body."
+    return bytes(body)
+
+
+def _with_body(scope: Dict[str, Any], receive: Callable, body: bytes):
+    """以解壓後的 body 取代原本的請求（移除 Content-Encoding、更新 Content-Length）"""
+    headers = [
+        (key, value) for key, value in scope["headers"]
+        if key not in (b"content-encoding", b"content-length")
+    ]
+    headers.append((b"content-length", str(len(body)).encode()))
+    sent = False
+
+    async def replay() -> Dict[str, Any]:
+        nonlocal sent
+        if sent:
+            # body 已讀完，之後的 receive 只會是斷線通知
+            return await receive()
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return {**scope, "headers": headers}, replay
+
+
+async def _send_error(send: Callable, status_code: int, message: str) -> None:
+    body = jsonio.dumps({"error": message})
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,83 @@
+"""
+按需的請求剖析
+
+觸發方式（只有設定了 PROFILE_ADMIN_TOKEN 或 PROFILE_SAMPLE_RATE > 0 時才會掛載此 middleware，
+否則完全沒有額外成本）：
+- 請求帶有 X-Profile: <PROFILE_ADMIN_TOKEN>，可用 X-Profile-Mode: sample | cprofile 選擇模式
+- 依 PROFILE_SAMPLE_RATE 隨機抽樣 /api/ 請求（sample 模式）
+
+同一時間只剖析一個請求，其他請求照常處理。被剖析的回應帶有 X-Profile-Id，
+結果可由 /api/status/profiles 查詢（見 services/profiler.py）
+"""
+import asyncio
+import hmac
+import random
+from typing import Any, Callable, Dict, Optional
+
+from config import settings
+from services import profiler
+
+
+def profiling_enabled() -> bool:
+    return bool(settings.PROFILE_ADMIN_TOKEN) or settings.PROFILE_SAMPLE_RATE > 0
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """X-Profile 是否為管理者 token"""
+    return bool(settings.PROFILE_ADMIN_TOKEN and token) and hmac.compare_digest(
+        token.encode(), settings.PROFILE_ADMIN_TOKEN.encode()
+    )
+
+
+def _header(scope: Dict[str, Any], name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware：對管理者指定或抽樣到的請求做剖析"""
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        session = self._select(scope) if scope["type"] == "http" else None
+        if session is None or not session.start():
+            await self.app(scope, receive, send)
+            return
+
+        status_code = None
+        profile_header = (b"x-profile-id", session.id.encode())
+
+        async def send_with_id(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), profile_header]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            session.stop()
+            try:
+                await asyncio.to_thread(session.save, status_code)
+            except Exception as e:
+                print(f"[PROFILE] Failed to save profile {session.id}: {e}")
+
+    @staticmethod
+    def _select(scope: Dict[str, Any]) -> Optional[profiler.ProfileSession]:
+        token = _header(scope, b"x-profile")
+        if token is not None and is_admin(token):
+            mode = _header(scope, b"x-profile-mode") or "sample"
+            return profiler.ProfileSession(mode, scope["method"], scope["path"], "admin")
+        if (
+            settings.PROFILE_SAMPLE_RATE > 0
+            and scope["path"].startswith("/api/")
+            and not scope["path"].startswith("/api/status/")
+            and random.random() < settings.PROFILE_SAMPLE_RATE
+        ):
+            return profiler.ProfileSession("sample", scope["method"], scope["path"], "sampled")
+        return None
@@ -1,3 +1,3 @@
-from .schemas import RefineRequest, SaveToNotionRequest, GeneratePdfRequest
+from .schemas import RefineRequest, SaveToNotionRequest, GeneratePdfRequest, ExportNote, BatchPdfRequest
 
-__all__ = ["RefineRequest", "SaveToNotionRequest", "GeneratePdfRequest"]
+__all__ = ["RefineRequest", "SaveToNotionRequest", "GeneratePdfRequest", "ExportNote", "BatchPdfRequest"]
@@ -2,7 +2,7 @@
 API 請求/回應模型定義
 """
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 
 class RefineRequest(BaseModel):
@@ -12,12 +12,27 @@ class RefineRequest(BaseModel):
 
 
 class SaveToNotionRequest(BaseModel):
-    """儲存到 Notion 請求"""
+    """儲存到 Notion 請求（帶 note_id 時增量同步到同一個頁面）"""
     title: str
     blocks: List[Any]
+    note_id: Optional[str] = None
 
 
 class GeneratePdfRequest(BaseModel):
     """生成 PDF 請求"""
     title: str
     blocks: List[Any]
+
+
+class ExportNote(BaseModel):
+    """批次匯出中的一份筆記：直接提供內容，或以 note_id（與 version）從筆記版本庫讀取"""
+    title: Optional[str] = None
+    blocks: Optional[List[Any]] = None
+    note_id: Optional[str] = None
+    version: Optional[int] = None
+
+
+class BatchPdfRequest(BaseModel):
+    """批次匯出 PDF 請求（merged 為 True 時另外產生一份合併、帶書籤的 PDF）"""
+    notes: List[ExportNote]
+    merged: bool = False
@@ -1,3 +1,3 @@
-from .schemas import NOTION_BLOCKS_SCHEMA
+from .schemas import NOTION_BLOCKS_SCHEMA, NOTION_PATCH_SCHEMA
 
-__all__ = ["NOTION_BLOCKS_SCHEMA"]
+__all__ = ["NOTION_BLOCKS_SCHEMA", "NOTION_PATCH_SCHEMA"]
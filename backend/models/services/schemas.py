@@ -256,3 +256,39 @@ NOTION_BLOCKS_SCHEMA = {
     },
     "required": ["title", "blocks"]
 }
+
+
+# refine 的 patch 模式：只輸出對原始筆記（依編號）的修改操作
+NOTION_PATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {
+            "type": "string",
+            "description": "新的標題（不需修改時省略）"
+        },
+        "operations": {
+            "type": "array",
+            "description": "依序套用到原始筆記的操作；index 為原始筆記中 block 的編號",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "op": {
+                        "type": "string",
+                        "enum": ["insert_after", "replace", "delete"]
+                    },
+                    "index": {
+                        "type": "integer",
+                        "description": "原始 block 的編號；insert_after 使用 -1 表示插入到最前面"
+                    },
+                    "blocks": {
+                        "type": "array",
+                        "description": "insert_after / replace 的新 blocks（delete 不需要）",
+                        "items": NOTION_BLOCKS_SCHEMA["properties"]["blocks"]["items"]
+                    }
+                },
+                "required": ["op", "index"]
+            }
+        }
+    },
+    "required": ["operations"]
+}
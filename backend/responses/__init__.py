@@ -0,0 +1,4 @@
+from .file_response import RangeFileResponse
+from .json_response import FastJSONRequest, FastJSONResponse, FastJSONRoute
+
+__all__ = ["RangeFileResponse", "FastJSONRequest", "FastJSONResponse", "FastJSONRoute"]
@@ -0,0 +1,88 @@
+"""
+支援 Range 與零拷貝傳送的檔案回應
+"""
+import os
+from typing import Mapping, Optional
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+class RangeFileResponse(Response):
+    """
+    傳送檔案的 [start, end] 區段（含 end）
+
+    ASGI server 支援 zerocopysend / pathsend 擴充時交由 server 以 sendfile 傳送，
+    否則以固定大小的區塊讀取，不會將整個檔案載入記憶體
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        start: int,
+        end: int,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+        send_body: bool = True,
+    ) -> None:
+        self.path = path
+        self.start = start
+        self.end = end
+        self.status_code = status_code
+        self.media_type = media_type
+        self.send_body = send_body
+        self.background = None
+        self.init_headers(headers)
+
+    @property
+    def length(self) -> int:
+        return max(self.end - self.start + 1, 0)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+
+        if "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            return
+
+        if "http.response.pathsend" in extensions and self._is_whole_file():
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+
+        remaining = self.length
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.start)
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+        if remaining > 0:
+            # 檔案在傳送途中變短，結束回應
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    def _is_whole_file(self) -> bool:
+        return self.start == 0 and self.end == os.path.getsize(self.path) - 1
@@ -0,0 +1,38 @@
+"""
+以 services.jsonio 編解碼的 JSON 回應與請求
+
+- FastJSONResponse：直接將 dict / list 序列化為 bytes；endpoint 直接返回它時，
+  FastAPI 不會再以 jsonable_encoder 逐一複製整個結構
+- FastJSONRoute：讓 request body 以同一個 codec 解析（用於 APIRouter 的 route_class）
+"""
+from typing import Any, Callable, Coroutine
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.responses import JSONResponse
+
+from services import jsonio
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return jsonio.dumps(content)
+
+
+class FastJSONRequest(Request):
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = jsonio.loads(await self.body())
+        return self._json
+
+
+class FastJSONRoute(APIRoute):
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await handler(FastJSONRequest(request.scope, request.receive))
+
+        return route_handler
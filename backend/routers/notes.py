@@ -0,0 +1,80 @@
+"""
+筆記版本庫路由
+
+職責：僅處理 HTTP 請求/響應，業務邏輯委託給 Manager
+"""
+from fastapi import APIRouter, Query
+from typing import Optional
+
+from managers import NoteManager
+from responses import FastJSONResponse, FastJSONRoute
+from services.note_store import NoteNotFound
+
+router = APIRouter(
+    prefix="/api",
+    tags=["notes"],
+    route_class=FastJSONRoute,
+    default_response_class=FastJSONResponse,
+)
+
+
+@router.get("/notes")
+async def list_notes(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    source_hash: Optional[str] = None,
+    file_hash: Optional[str] = None
+):
+    """依最近更新時間列出筆記（可依來源組合雜湊或單一文件的 SHA-256 過濾）"""
+    manager = NoteManager()
+    try:
+        return FastJSONResponse(await manager.list_notes(
+            limit=limit, cursor=cursor, source=source_hash, file_hash=file_hash
+        ))
+    except ValueError:
+        return FastJSONResponse(status_code=400, content={"error": "Invalid cursor"})
+
+
+@router.get("/search")
+async def search_notes(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """全文檢索筆記標題與內容（支援中文）"""
+    return FastJSONResponse(await NoteManager().search(q, limit=limit))
+
+
+@router.get("/notes/{note_id}")
+async def get_note(note_id: str, version: Optional[int] = None):
+    """取得筆記（預設最新版本）"""
+    try:
+        return FastJSONResponse(await NoteManager().get_note(note_id, version))
+    except NoteNotFound as e:
+        return FastJSONResponse(status_code=404, content={"error": str(e)})
+
+
+@router.get("/notes/{note_id}/versions")
+async def list_versions(note_id: str):
+    """列出筆記的版本歷史"""
+    try:
+        return FastJSONResponse({"note_id": note_id, "versions": await NoteManager().list_versions(note_id)})
+    except NoteNotFound as e:
+        return FastJSONResponse(status_code=404, content={"error": str(e)})
+
+
+@router.get("/notes/{note_id}/versions/{version}")
+async def get_version(note_id: str, version: int):
+    """取得筆記的指定版本"""
+    try:
+        return FastJSONResponse(await NoteManager().get_note(note_id, version))
+    except NoteNotFound as e:
+        return FastJSONResponse(status_code=404, content={"error": str(e)})
+
+
+@router.post("/notes/{note_id}/versions/{version}/restore")
+async def restore_version(note_id: str, version: int):
+    """將指定版本還原為最新版本"""
+    try:
+        return FastJSONResponse(await NoteManager().restore_version(note_id, version))
+    except NoteNotFound as e:
+        return FastJSONResponse(status_code=404, content={"error": str(e)})
@@ -0,0 +1,65 @@
+"""
+上傳文件預覽路由
+
+職責：以強 ETag、immutable 快取與 Range / 206 回應提供 uploads/temp 下的文件，
+讓 PDF 檢視器可以邊下載邊渲染
+"""
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response
+import os
+
+from responses import RangeFileResponse
+from services import preview
+
+router = APIRouter(prefix="/api", tags=["preview"])
+
+
+@router.api_route("/preview/{filename}", methods=["GET", "HEAD"])
+async def preview_file(filename: str, request: Request):
+    """預覽上傳的文件"""
+    path = preview.resolve_temp_file(filename)
+    if path is None:
+        return JSONResponse(status_code=404, content={"error": "File not found"})
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = preview.build_etag(filename, stat)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": preview.IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if preview.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # If-Range 不相符時忽略 Range，回傳完整內容
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        byte_range = preview.parse_range(range_header, size)
+    except preview.RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        status_code = 206
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+    headers["Content-Disposition"] = f'inline; filename="{filename}"'
+
+    return RangeFileResponse(
+        path,
+        start,
+        end,
+        status_code=status_code,
+        headers=headers,
+        media_type=preview.guess_media_type(filename),
+        send_body=request.method != "HEAD",
+    )
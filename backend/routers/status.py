@@ -0,0 +1,63 @@
+"""
+服務狀態路由
+
+職責：
+1. 提供負載相關的即時狀態（准入控制的佇列深度等），供監控與壓力測試觀察
+2. 查詢按需剖析的結果（需 X-Profile 管理者 token）
+"""
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Header
+from fastapi.responses import FileResponse
+
+from middlewares.admission import admission_stats
+from middlewares.profiling import is_admin
+from responses import FastJSONResponse
+from services import profiler, warmup
+
+router = APIRouter(prefix="/api/status", tags=["status"], default_response_class=FastJSONResponse)
+
+_FORBIDDEN = {"error": "A valid X-Profile admin token is required."}
+
+
+@router.get("/admission")
+async def admission_status():
+    """各 endpoint 類別目前的處理中 / 等待中請求數與拒絕次數"""
+    return FastJSONResponse(admission_stats())
+
+
+@router.get("/warmup")
+async def warmup_status():
+    """上傳後預熱與推測性 refine 的次數（重用、取消、略過）"""
+    return FastJSONResponse(warmup.stats())
+
+
+@router.get("/profiles")
+async def list_profiles(x_profile: Optional[str] = Header(None, alias="X-Profile")):
+    """已保存的剖析（新到舊）"""
+    if not is_admin(x_profile):
+        return FastJSONResponse(status_code=403, content=_FORBIDDEN)
+    return FastJSONResponse({"profiles": profiler.list_profiles()})
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_profile: Optional[str] = Header(None, alias="X-Profile")):
+    """單一剖析的摘要（最耗時的函式）"""
+    if not is_admin(x_profile):
+        return FastJSONResponse(status_code=403, content=_FORBIDDEN)
+    summary = profiler.get_profile(profile_id)
+    if summary is None:
+        return FastJSONResponse(status_code=404, content={"error": "Profile not found"})
+    return FastJSONResponse(summary)
+
+
+@router.get("/profiles/{profile_id}/raw")
+async def download_profile(profile_id: str, x_profile: Optional[str] = Header(None, alias="X-Profile")):
+    """剖析原始檔：collapsed stacks（flamegraph）或 pstats"""
+    if not is_admin(x_profile):
+        return FastJSONResponse(status_code=403, content=_FORBIDDEN)
+    path = profiler.profile_file_path(profile_id)
+    if path is None:
+        return FastJSONResponse(status_code=404, content={"error": "Profile not found"})
+    return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
@@ -4,14 +4,22 @@
 職責：僅處理 HTTP 請求/響應，業務邏輯委託給 Manager
 """
 from fastapi import APIRouter, Header
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import Response, StreamingResponse
+import asyncio
 import time
 from typing import Optional
 
-from models.routers import RefineRequest, SaveToNotionRequest, GeneratePdfRequest
+from models.routers import RefineRequest, SaveToNotionRequest, GeneratePdfRequest, BatchPdfRequest
 from managers import SummaryManager
+from responses import FastJSONResponse, FastJSONRoute
+from services.note_store import NoteNotFound
 
-router = APIRouter(prefix="/api", tags=["summary"])
+router = APIRouter(
+    prefix="/api",
+    tags=["summary"],
+    route_class=FastJSONRoute,
+    default_response_class=FastJSONResponse,
+)
 
 
 @router.post("/refine")
@@ -27,14 +35,20 @@ async def refine_summary(
             request.user_feedback,
             gemini_api_key=x_gemini_api_key
         )
-        return result
+        return FastJSONResponse(result)
     except ValueError as e:
-        return JSONResponse(status_code=401, content={"error": str(e)})
+        return FastJSONResponse(status_code=401, content={"error": str(e)})
     except Exception as e:
         msg = str(e)
         if "403" in msg or "429" in msg or "Quota" in msg or "API key" in msg:
-             return JSONResponse(status_code=403, content={"error": msg})
-        return JSONResponse(status_code=500, content={"error": msg})
+             return FastJSONResponse(status_code=403, content={"error": msg})
+        return FastJSONResponse(status_code=500, content={"error": msg})
+
+
+@router.get("/refine/routing-stats")
+async def routing_stats():
+    """refine 的模型分級路由統計"""
+    return FastJSONResponse(SummaryManager().routing_stats())
 
 
 @router.post("/save-to-notion")
@@ -45,21 +59,33 @@ async def save_to_notion(
 ):
     """確認後儲存到 Notion"""
     manager = SummaryManager()
-    result = manager.save_to_notion(
+    result = await manager.save_to_notion(
         request.title, 
         request.blocks,
         notion_api_key=x_notion_api_key,
-        notion_database_id=x_notion_database_id
+        notion_database_id=x_notion_database_id,
+        note_id=request.note_id
     )
     
     if not result["success"]:
         # Check if error message implies auth failure
         error_msg = str(result["error"])
         if "API Key" in error_msg or "401" in error_msg or "403" in error_msg:
-             return JSONResponse(status_code=403, content={"error": error_msg})
-        return JSONResponse(status_code=500, content={"error": error_msg})
+             return FastJSONResponse(status_code=403, content={"error": error_msg})
+        return FastJSONResponse(status_code=500, content={"error": error_msg})
     
-    return {"status": "success", "message": result["message"]}
+    return {
+        "status": "success",
+        "message": result["message"],
+        "page_id": result["page_id"],
+        "stats": result["stats"],
+    }
+
+
+@router.get("/generate-pdf/cache-stats")
+async def pdf_cache_stats():
+    """PDF 匯出的 block 快取命中率"""
+    return FastJSONResponse(SummaryManager().pdf_cache_stats())
 
 
 @router.post("/generate-pdf")
@@ -67,7 +93,8 @@ async def generate_pdf_endpoint(request: GeneratePdfRequest):
     """生成 PDF 檔案"""
     try:
         manager = SummaryManager()
-        pdf_bytes = manager.generate_pdf(request.title, request.blocks)
+        # 在 thread 中生成，避免阻塞 event loop（並行數由准入控制的 pdf 類別限制）
+        pdf_bytes = await asyncio.to_thread(manager.generate_pdf, request.title, request.blocks)
 
         safe_filename = f"summary_{int(time.time())}.pdf"
 
@@ -77,4 +104,24 @@ async def generate_pdf_endpoint(request: GeneratePdfRequest):
             headers={"Content-Disposition": f'attachment; filename="{safe_filename}"'},
         )
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return FastJSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.post("/generate-pdf/batch")
+async def generate_pdf_batch(request: BatchPdfRequest):
+    """批次匯出多份筆記的 PDF（串流 ZIP，可附合併的 PDF）"""
+    try:
+        stream = await SummaryManager().export_pdfs(
+            [note.model_dump() for note in request.notes], merged=request.merged
+        )
+    except NoteNotFound as e:
+        return FastJSONResponse(status_code=404, content={"error": str(e)})
+    except ValueError as e:
+        return FastJSONResponse(status_code=400, content={"error": str(e)})
+
+    safe_filename = f"notes_{int(time.time())}.zip"
+    return StreamingResponse(
+        stream,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{safe_filename}"'},
+    )
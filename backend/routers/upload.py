@@ -3,13 +3,26 @@
 
 職責：處理 HTTP 請求/響應，統一錯誤處理
 """
-from fastapi import APIRouter, UploadFile, File, Header
-from fastapi.responses import JSONResponse
-from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Header, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Dict, Any
 
 from managers import UploadManager
+from responses import FastJSONResponse, FastJSONRoute
+from services import jsonio
 
-router = APIRouter(prefix="/api", tags=["upload"])
+router = APIRouter(
+    prefix="/api",
+    tags=["upload"],
+    route_class=FastJSONRoute,
+    default_response_class=FastJSONResponse,
+)
+
+
+@router.get("/upload/formats")
+async def upload_formats():
+    """目前開放上傳的檔案格式"""
+    return FastJSONResponse(UploadManager().upload_formats())
 
 
 @router.post("/upload")
@@ -18,29 +31,70 @@ async def upload_document(
     x_gemini_api_key: Optional[str] = Header(None, alias="X-Gemini-API-Key")
 ):
     """
-    文件上傳 API
+    文件上傳 API（支援 PDF、投影片與 .mp3 / .wav 錄音；.m4a / .ogg 需要後端安裝 ffmpeg）
     返回預覽用的 PDF URL 和初始筆記 JSON
     """
     try:
-        # 嚴格限制僅支援 PDF
-        for file in files:
-            if not file.filename.lower().endswith(".pdf"):
-                return JSONResponse(
-                    status_code=400, 
-                    content={"error": f"不支援的檔案格式: {file.filename}。僅支援 .pdf 檔案。"}
-                )
-
         manager = UploadManager()
         result = await manager.process_upload(files, gemini_api_key=x_gemini_api_key)
-        return result
+
+        # 所有文件都失敗（例如格式不支援）時回傳 400，部分失敗則列在 failed 中
+        if not result["files"]:
+            return FastJSONResponse(
+                status_code=400,
+                content={"error": result["failed"][0]["error"], "failed": result["failed"]}
+            )
+        return FastJSONResponse(result)
     except ValueError as e:
-        return JSONResponse(status_code=401, content={"error": str(e)})
+        return FastJSONResponse(status_code=401, content={"error": str(e)})
     except Exception as e:
         msg = str(e)
         # Simple heuristic to map downstream API errors to 403/429
         if "403" in msg or "429" in msg or "Quota" in msg or "API key" in msg or "permission" in msg.lower():
-             return JSONResponse(status_code=403, content={"error": msg})
-        return JSONResponse(status_code=500, content={"error": msg})
+             return FastJSONResponse(status_code=403, content={"error": msg})
+        return FastJSONResponse(status_code=500, content={"error": msg})
+
+
+def _format_sse(event: Dict[str, Any]) -> str:
+    """將事件轉為 Server-Sent Events 格式"""
+    data = jsonio.dumps_str(event["data"])
+    return f"event: {event['event']}\ndata: {data}\n\n"
+
+
+@router.post("/upload/stream")
+async def upload_document_stream(
+    request: Request,
+    x_gemini_api_key: Optional[str] = Header(None, alias="X-Gemini-API-Key")
+):
+    """
+    文件上傳 API（SSE 進度串流）
+    逐一回報每個文件的 received / saved / extracted / preuploaded / failed 事件，
+    最後以 done 事件返回與 /api/upload 相同的預覽數據
+    """
+    # 自行解析表單：FastAPI 會在 endpoint 返回後關閉 File(...) 參數，
+    # 而串流回應的處理發生在那之後
+    form = await request.form()
+    files = [f for f in form.getlist("files") if not isinstance(f, str)]
+    if not files:
+        await form.close()
+        return FastJSONResponse(status_code=400, content={"error": "No files uploaded"})
+
+    manager = UploadManager()
+
+    async def event_stream():
+        try:
+            async for event in manager.stream_upload(files, gemini_api_key=x_gemini_api_key):
+                yield _format_sse(event)
+        except Exception as e:
+            yield _format_sse({"event": "error", "data": {"error": str(e)}})
+        finally:
+            await form.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.delete("/delete-temp")
@@ -49,11 +103,11 @@ async def delete_temp_file(filename: str):
     刪除臨時檔案 API
     """
     if not filename:
-        return JSONResponse(status_code=400, content={"error": "Filename is required"})
+        return FastJSONResponse(status_code=400, content={"error": "Filename is required"})
     
     # Security check: basic path traversal prevention
     if ".." in filename or "/" in filename or "\\" in filename:
-         return JSONResponse(status_code=400, content={"error": "Invalid filename"})
+         return FastJSONResponse(status_code=400, content={"error": "Invalid filename"})
 
     try:
         from services.parser import cleanup_temp_file
@@ -66,4 +120,4 @@ async def delete_temp_file(filename: str):
         cleanup_temp_file(file_path)
         return {"status": "success", "message": f"Deleted {filename}"}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return FastJSONResponse(status_code=500, content={"error": str(e)})
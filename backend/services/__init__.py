@@ -1,3 +1,10 @@
-from . import llm, notion, parser, pdf, upload
+import importlib
 
-__all__ = ["llm", "notion", "parser", "pdf", "upload"]
+__all__ = ["audio", "block_ir", "block_patch", "block_validator", "cache", "document", "gemini", "jsonio", "llm", "loader", "model_router", "notion", "note_store", "parser", "pdf", "pdf_export", "preview", "profiler", "search", "slides", "upload", "warmup"]
+
+
+def __getattr__(name):
+    # 子模組在第一次存取時才 import（`from services import llm` 也會自動載入）
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
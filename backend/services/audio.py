@@ -0,0 +1,275 @@
+"""
+長錄音分段服務
+
+將錄音切成固定長度的片段，全程串流處理、不解碼整個檔案：
+- .wav：以 wave 模組逐段複製 PCM frames
+- .mp3：解析 MPEG frame header，依 frame 邊界切分（不重新編碼）
+- .m4a / .ogg：使用 ffmpeg 的 segment muxer 以 stream copy 切分（需安裝 ffmpeg；未安裝時不開放上傳，見 upload_extensions）
+
+分段結果寫在原檔旁的 `<檔名>_segments/` 目錄，並以 manifest.json 記錄，
+之後對同一個檔案再次分段會直接重用
+"""
+import csv
+import json
+import os
+import shutil
+import subprocess
+import wave
+from typing import Any, Dict, List, Optional
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".ogg")
+# 需要 ffmpeg 才能分段的格式
+FFMPEG_EXTENSIONS = (".m4a", ".ogg")
+
+_MANIFEST = "manifest.json"
+_COPY_CHUNK_SECONDS = 1
+
+# MPEG audio bitrate 表（kbps），索引為 header 中的 bitrate index
+_MP3_BITRATES = {
+    # (MPEG-1, Layer III)
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    # (MPEG-1, Layer II)
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    # (MPEG-2/2.5, Layer II & III)
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+
+def is_audio(path: str) -> bool:
+    return path.lower().endswith(AUDIO_EXTENSIONS)
+
+
+def upload_extensions() -> tuple:
+    """目前環境可以處理的錄音格式（.m4a / .ogg 需要 ffmpeg）"""
+    if shutil.which("ffmpeg"):
+        return AUDIO_EXTENSIONS
+    return tuple(ext for ext in AUDIO_EXTENSIONS if ext not in FFMPEG_EXTENSIONS)
+
+
+def segments_dir(path: str) -> str:
+    """分段檔案所在的目錄"""
+    return f"{os.path.splitext(path)[0]}_segments"
+
+
+def cleanup_segments(path: str) -> None:
+    """刪除錄音的分段目錄"""
+    shutil.rmtree(segments_dir(path), ignore_errors=True)
+
+
+def segment_audio(path: str, segment_seconds: int) -> List[Dict[str, Any]]:
+    """
+    將錄音切成約 segment_seconds 秒的片段
+
+    Args:
+        path: 錄音檔路徑
+        segment_seconds: 每段長度（秒）
+
+    Returns:
+        [{"path": 片段路徑, "start": 開始秒數, "end": 結束秒數}, ...]，依時間排序
+
+    Raises:
+        ValueError: 格式不支援或檔案無法解析
+    """
+    out_dir = segments_dir(path)
+    manifest_path = os.path.join(out_dir, _MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("segment_seconds") == segment_seconds:
+            return manifest["segments"]
+        cleanup_segments(path)
+
+    os.makedirs(out_dir, exist_ok=True)
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == ".wav":
+            segments = _segment_wav(path, out_dir, segment_seconds)
+        elif ext == ".mp3":
+            segments = _segment_mp3(path, out_dir, segment_seconds)
+        elif ext in (".m4a", ".ogg"):
+            segments = _segment_ffmpeg(path, out_dir, segment_seconds, ext)
+        else:
+            raise ValueError("不支援的錄音格式")
+    except Exception:
+        cleanup_segments(path)
+        raise
+
+    if not segments:
+        cleanup_segments(path)
+        raise ValueError("無法從錄音中讀取任何音訊")
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"segment_seconds": segment_seconds, "segments": segments}, f)
+
+    print(f"[AUDIO] Split {os.path.basename(path)} into {len(segments)} segment(s).")
+    return segments
+
+
+def _segment_path(out_dir: str, index: int, ext: str) -> str:
+    return os.path.join(out_dir, f"segment_{index:03d}{ext}")
+
+
+def _segment_wav(path: str, out_dir: str, segment_seconds: int) -> List[Dict[str, Any]]:
+    try:
+        source = wave.open(path, "rb")
+    except wave.Error as e:
+        raise ValueError(f"無法解析 WAV 檔案: {e}")
+
+    segments = []
+    with source:
+        params = source.getparams()
+        rate = params.framerate
+        frames_per_segment = rate * segment_seconds
+        chunk_frames = rate * _COPY_CHUNK_SECONDS
+        position = 0
+
+        while position < params.nframes:
+            seg_path = _segment_path(out_dir, len(segments), ".wav")
+            written = 0
+            with wave.open(seg_path, "wb") as target:
+                target.setnchannels(params.nchannels)
+                target.setsampwidth(params.sampwidth)
+                target.setframerate(rate)
+                while written < frames_per_segment:
+                    frames = source.readframes(min(chunk_frames, frames_per_segment - written))
+                    if not frames:
+                        break
+                    target.writeframes(frames)
+                    written += len(frames) // (params.nchannels * params.sampwidth)
+
+            if written == 0:
+                os.remove(seg_path)
+                break
+            segments.append({
+                "path": seg_path,
+                "start": position / rate,
+                "end": (position + written) / rate,
+            })
+            position += written
+
+    return segments
+
+
+def _parse_mp3_header(header: bytes) -> Optional[Dict[str, int]]:
+    """解析 4 bytes 的 MPEG audio frame header；不是合法 header 時返回 None"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (header[1] >> 3) & 0x03   # 3: MPEG-1, 2: MPEG-2, 0: MPEG-2.5
+    layer_bits = (header[1] >> 1) & 0x03     # 1: Layer III, 2: Layer II
+    bitrate_index = (header[2] >> 4) & 0x0F
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+
+    if version_bits == 1 or layer_bits not in (1, 2) or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    layer = 3 if layer_bits == 1 else 2
+    mpeg1 = version_bits == 3
+    bitrate = _MP3_BITRATES[(1 if mpeg1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version_bits][sample_rate_index]
+
+    if layer == 3 and not mpeg1:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+    else:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+
+    return {"length": length, "samples": samples, "sample_rate": sample_rate}
+
+
+def _skip_id3(f) -> None:
+    """跳過檔案開頭的 ID3v2 標籤"""
+    header = f.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        size = ((header[6] & 0x7F) << 21) | ((header[7] & 0x7F) << 14) | ((header[8] & 0x7F) << 7) | (header[9] & 0x7F)
+        f.seek(10 + size)
+    else:
+        f.seek(0)
+
+
+def _segment_mp3(path: str, out_dir: str, segment_seconds: int) -> List[Dict[str, Any]]:
+    segments = []
+    elapsed = 0.0
+    seg_start = 0.0
+    target = None
+
+    def close_segment() -> None:
+        nonlocal target
+        if target is not None:
+            target.close()
+            segments.append({"path": target.name, "start": seg_start, "end": elapsed})
+            target = None
+
+    with open(path, "rb") as f:
+        _skip_id3(f)
+        while True:
+            header = f.read(4)
+            if len(header) < 4:
+                break
+
+            frame = _parse_mp3_header(header)
+            if frame is None:
+                # 失去同步（例如結尾的 ID3v1 標籤或損毀資料）：往後一個 byte 重新尋找
+                f.seek(-3, os.SEEK_CUR)
+                continue
+
+            body = f.read(frame["length"] - 4)
+            if len(body) < frame["length"] - 4:
+                break
+
+            if target is None:
+                target = open(_segment_path(out_dir, len(segments), ".mp3"), "wb")
+                seg_start = elapsed
+            target.write(header)
+            target.write(body)
+            elapsed += frame["samples"] / frame["sample_rate"]
+
+            if elapsed - seg_start >= segment_seconds:
+                close_segment()
+
+    close_segment()
+    return segments
+
+
+def _segment_ffmpeg(path: str, out_dir: str, segment_seconds: int, ext: str) -> List[Dict[str, Any]]:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise ValueError(f"分段 {ext} 錄音需要安裝 ffmpeg")
+
+    list_path = os.path.join(out_dir, "segments.csv")
+    pattern = os.path.join(out_dir, f"segment_%03d{ext}")
+    result = subprocess.run(
+        [
+            ffmpeg, "-nostdin", "-loglevel", "error", "-y",
+            "-i", path,
+            "-map", "0:a", "-c", "copy",
+            "-f", "segment",
+            "-segment_time", str(segment_seconds),
+            "-segment_list", list_path,
+            "-segment_list_type", "csv",
+            "-reset_timestamps", "1",
+            pattern,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise ValueError(f"無法分段錄音: {result.stderr.strip()}")
+
+    segments = []
+    with open(list_path, "r", encoding="utf-8", newline="") as f:
+        for name, start, end in csv.reader(f):
+            segments.append({
+                "path": os.path.join(out_dir, name),
+                "start": float(start),
+                "end": float(end),
+            })
+    return segments
@@ -0,0 +1,321 @@
+"""
+筆記 block 的精簡內部表示
+
+Notion 格式的 block 是多層巢狀 dict（block → 類型欄位 → rich_text → text / annotations），
+每個文字片段就要 3~4 個 dict。內部處理改用 __slots__ 物件：
+
+- Span：文字與以位元旗標表示的 annotations（顏色字串經 intern 共用）
+- Block：類型、Span 列表、子 block 與少數類型專屬欄位（code 的語言、callout 的圖示）
+
+PDF 生成、Notion 寫入與 prompt 組合都使用同一份 IR，只在邊界與 Notion 格式互轉；
+送出前以 normalize_spans 合併相鄰同樣式的片段，並切分超過 Notion 上限的內容
+"""
+import hashlib
+import sys
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+BOLD = 1
+ITALIC = 2
+STRIKETHROUGH = 4
+UNDERLINE = 8
+CODE = 16
+
+_FLAG_NAMES: Tuple[Tuple[str, int], ...] = (
+    ("bold", BOLD),
+    ("italic", ITALIC),
+    ("strikethrough", STRIKETHROUGH),
+    ("underline", UNDERLINE),
+    ("code", CODE),
+)
+_DEFAULT_COLOR = "default"
+
+# Notion API 的上限：單一 rich_text 的 content 長度（UTF-16 單位）與每個 rich_text 陣列的元素數
+NOTION_MAX_TEXT_LENGTH = 2000
+NOTION_MAX_SPANS = 100
+
+# 切分過長文字時優先選擇的斷點（依序嘗試）；只在後半段尋找，避免切出過短的片段
+_BREAK_CHARACTERS = ("\n", "。！？.!?", "；;，,、：: \t")
+# 不可與前一個字元分開的字元（零寬連接、變體選擇符）
+_JOINERS = frozenset("\u200d\ufe0e\ufe0f")
+
+
+class Span:
+    """一段套用相同 annotations 的文字"""
+
+    __slots__ = ("text", "flags", "color", "link")
+
+    def __init__(self, text: str, flags: int = 0, color: str = _DEFAULT_COLOR, link: Optional[str] = None):
+        self.text = text
+        self.flags = flags
+        self.color = color
+        self.link = link
+
+    @property
+    def bold(self) -> bool:
+        return bool(self.flags & BOLD)
+
+    @property
+    def italic(self) -> bool:
+        return bool(self.flags & ITALIC)
+
+    @property
+    def code(self) -> bool:
+        return bool(self.flags & CODE)
+
+    def same_style(self, other: "Span") -> bool:
+        return self.flags == other.flags and self.color == other.color and self.link == other.link
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Span) and self.text == other.text and self.same_style(other)
+
+    def __repr__(self) -> str:
+        return f"Span({self.text!r}, flags={self.flags})"
+
+
+class Block:
+    """一個 block；extra 保存類型專屬欄位（code: language、callout: icon）"""
+
+    __slots__ = ("kind", "spans", "children", "extra")
+
+    def __init__(
+        self,
+        kind: str,
+        spans: List[Span],
+        children: Optional[List["Block"]] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ):
+        self.kind = kind
+        self.spans = spans
+        self.children = children or []
+        self.extra = extra
+
+    @property
+    def plain_text(self) -> str:
+        return "".join(span.text for span in self.spans)
+
+    def fingerprint(self) -> bytes:
+        """內容的 16 bytes 雜湊（含子 block），內容相同的 block 結果相同"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.kind.encode("utf-8"))
+        for span in self.spans:
+            digest.update(b"\x00")
+            digest.update(span.text.encode("utf-8"))
+            digest.update(f"\x01{span.flags}\x01{span.color}\x01{span.link or ''}".encode("utf-8"))
+        if self.extra:
+            digest.update(b"\x02")
+            digest.update(repr(sorted(self.extra.items())).encode("utf-8"))
+        for child in self.children:
+            digest.update(b"\x03")
+            digest.update(child.fingerprint())
+        return digest.digest()
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, Block)
+            and self.kind == other.kind
+            and self.spans == other.spans
+            and self.children == other.children
+            and self.extra == other.extra
+        )
+
+    def __repr__(self) -> str:
+        return f"Block({self.kind!r}, {self.plain_text[:30]!r}, children={len(self.children)})"
+
+
+# ---------- Notion 格式 → IR ----------
+
+def _span_from_notion(item: Dict[str, Any]) -> Optional[Span]:
+    text = item.get("text")
+    if isinstance(text, dict):
+        content = text.get("content")
+        link = text.get("link")
+        link = link.get("url") if isinstance(link, dict) else None
+    else:
+        content = item.get("plain_text")
+        link = None
+    if not isinstance(content, str):
+        return None
+
+    flags = 0
+    color = _DEFAULT_COLOR
+    annotations = item.get("annotations")
+    if annotations:
+        for name, flag in _FLAG_NAMES:
+            if annotations.get(name):
+                flags |= flag
+        color = sys.intern(annotations.get("color") or _DEFAULT_COLOR)
+    return Span(content, flags, color, link)
+
+
+def block_from_notion(block: Dict[str, Any]) -> Block:
+    """將單一 Notion block 轉為 IR（未知類型保留類型名稱，內容欄位中的文字照常讀取）"""
+    kind = sys.intern(block.get("type", ""))
+    body = block.get(kind)
+    if not isinstance(body, dict):
+        body = {}
+
+    spans = []
+    for item in body.get("rich_text") or ():
+        if isinstance(item, dict):
+            span = _span_from_notion(item)
+            if span is not None:
+                spans.append(span)
+
+    extra = None
+    if kind == "code":
+        extra = {"language": body.get("language", "plain text")}
+    elif kind == "callout" and body.get("icon"):
+        extra = {"icon": body["icon"]}
+
+    children = [block_from_notion(child) for child in body.get("children") or () if isinstance(child, dict)]
+    return Block(kind, spans, children, extra)
+
+
+def from_notion(blocks: Iterable[Any]) -> List[Block]:
+    """Notion blocks（或已是 IR 的 Block）→ IR 列表"""
+    return [b if isinstance(b, Block) else block_from_notion(b) for b in blocks if isinstance(b, (Block, dict))]
+
+
+# ---------- IR → Notion 格式 ----------
+
+def _span_to_notion(span: Span, compact: bool) -> Dict[str, Any]:
+    text: Dict[str, Any] = {"content": span.text}
+    if span.link:
+        text["link"] = {"url": span.link}
+    item: Dict[str, Any] = {"type": "text", "text": text}
+
+    if span.flags or span.color != _DEFAULT_COLOR:
+        if compact:
+            annotations = {name: True for name, flag in _FLAG_NAMES if span.flags & flag}
+            if span.color != _DEFAULT_COLOR:
+                annotations["color"] = span.color
+        else:
+            annotations = {name: bool(span.flags & flag) for name, flag in _FLAG_NAMES}
+            annotations["color"] = span.color
+        item["annotations"] = annotations
+    return item
+
+
+def block_to_notion(block: Block, compact: bool = False) -> Dict[str, Any]:
+    """
+    IR → Notion block
+
+    Args:
+        compact: 省略 "object" 與值為預設的 annotations（用於 prompt，節省 token）
+    """
+    body: Dict[str, Any] = {"rich_text": [_span_to_notion(span, compact) for span in block.spans]}
+    if block.extra:
+        body.update(block.extra)
+    if block.children or block.kind == "toggle":
+        body["children"] = [block_to_notion(child, compact) for child in block.children]
+
+    if compact:
+        return {"type": block.kind, block.kind: body}
+    return {"object": "block", "type": block.kind, block.kind: body}
+
+
+def to_notion(blocks: Iterable[Block], compact: bool = False) -> List[Dict[str, Any]]:
+    return [block_to_notion(block, compact) for block in blocks]
+
+
+# ---------- rich text 正規化 ----------
+
+def _utf16_length(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _max_prefix(text: str, limit: int) -> int:
+    """UTF-16 長度不超過 limit 的最長前綴（以字元數表示）"""
+    if len(text) <= limit and _utf16_length(text) <= limit:
+        return len(text)
+    used = 0
+    for index, char in enumerate(text):
+        used += 2 if ord(char) > 0xFFFF else 1
+        if used > limit:
+            return index
+    return len(text)
+
+
+def _safe_cut(text: str, limit: int) -> int:
+    """在 limit 內找切分位置：優先換行、句尾、標點與空白，否則硬切（不拆開組合字元）"""
+    end = _max_prefix(text, limit)
+    if end >= len(text):
+        return end
+    floor = end // 2
+    for characters in _BREAK_CHARACTERS:
+        cut = max(text.rfind(char, floor, end) for char in characters)
+        if cut >= floor:
+            return cut + 1
+    cut = end
+    while cut > floor and (text[cut] in _JOINERS or unicodedata.combining(text[cut])):
+        cut -= 1
+    return cut or end
+
+
+def split_text(text: str, limit: int = NOTION_MAX_TEXT_LENGTH) -> List[str]:
+    """將文字切成每段 UTF-16 長度不超過 limit 的片段"""
+    pieces = []
+    while text:
+        cut = _safe_cut(text, limit)
+        pieces.append(text[:cut])
+        text = text[cut:]
+    return pieces
+
+
+def _normalize_span_list(spans: List[Span], limits: bool) -> List[Span]:
+    merged: List[Span] = []
+    for span in spans:
+        if not span.text:
+            continue
+        if merged and merged[-1].same_style(span):
+            last = merged[-1]
+            merged[-1] = Span(last.text + span.text, last.flags, last.color, last.link)
+        else:
+            merged.append(span)
+    if not limits:
+        return merged
+
+    result: List[Span] = []
+    for span in merged:
+        if len(span.text) * 2 <= NOTION_MAX_TEXT_LENGTH or _utf16_length(span.text) <= NOTION_MAX_TEXT_LENGTH:
+            result.append(span)
+        else:
+            result.extend(Span(piece, span.flags, span.color, span.link) for piece in split_text(span.text))
+
+    if len(result) > NOTION_MAX_SPANS:
+        # 超過上限的部分改為無格式文字，內容不遺失；極端情況下仍過長時才截斷
+        head = result[:NOTION_MAX_SPANS - 1]
+        tail = split_text("".join(span.text for span in result[NOTION_MAX_SPANS - 1:]))
+        result = head + [Span(piece) for piece in tail]
+        if len(result) > NOTION_MAX_SPANS:
+            print(f"[BLOCK_IR] Block text too long for Notion, truncated {len(result) - NOTION_MAX_SPANS} span(s).")
+            result = result[:NOTION_MAX_SPANS]
+    return result
+
+
+def _normalize_block(block: Block, limits: bool) -> Block:
+    spans = _normalize_span_list(block.spans, limits)
+    children = [_normalize_block(child, limits) for child in block.children]
+    if spans == block.spans and all(new is old for new, old in zip(children, block.children)):
+        return block
+    return Block(block.kind, spans, children, block.extra)
+
+
+def normalize_spans(blocks: Iterable[Block], limits: bool = True) -> List[Block]:
+    """
+    合併相鄰且樣式相同的 Span、移除空白片段
+
+    Args:
+        limits: 同時套用 Notion 的上限：過長的 Span 在換行 / 句尾 / 標點處切分，
+            每個 block 最多 NOTION_MAX_SPANS 個 Span（PDF 與 prompt 不需要，傳 False）
+
+    未變動的 block 直接沿用原物件
+    """
+    return [_normalize_block(block, limits) for block in blocks]
+
+
+def title_to_notion(title: str) -> List[Dict[str, Any]]:
+    """頁面標題的 rich_text（過長時切分為多段）"""
+    pieces = split_text(title)[:NOTION_MAX_SPANS] or [""]
+    return [{"text": {"content": piece}} for piece in pieces]
@@ -0,0 +1,104 @@
+"""
+refine 的 patch 模式
+
+完整模式要求 Gemini 每一輪都輸出整份筆記（包含所有舊 block），輸出 token 隨輪數增加；
+patch 模式改為在 prompt 中為原始 block 編號，Gemini 只輸出 NOTION_PATCH_SCHEMA 的操作：
+
+- {"op": "insert_after", "index": n, "blocks": [...]}：插入到第 n 個 block 之後（-1 為最前面）
+- {"op": "replace", "index": n, "blocks": [...]}：以新 blocks 取代第 n 個 block
+- {"op": "delete", "index": n}：刪除第 n 個 block
+
+所有 index 都指向原始筆記的編號（不受先前操作影響），套用結果與操作順序無關
+"""
+from typing import Any, Dict, List, Optional
+
+from . import block_ir, block_validator, jsonio
+from .block_ir import Block
+
+OPERATIONS = ("insert_after", "replace", "delete")
+
+
+class PatchError(ValueError):
+    """patch 不合法（由呼叫端退回完整模式）"""
+
+
+def render_numbered(title: Optional[str], blocks: List[Block]) -> str:
+    """將筆記轉為帶編號的精簡文字，每個 block 一行：`[n] {精簡 JSON}`"""
+    lines = [f"標題：{title or ''}"]
+    lines.extend(
+        f"[{i}] {jsonio.dumps_str(block_ir.block_to_notion(block, compact=True))}"
+        for i, block in enumerate(blocks)
+    )
+    return "\n".join(lines)
+
+
+def _normalize_blocks(raw: Any, path: str) -> List[Dict[str, Any]]:
+    if not isinstance(raw, list):
+        raise PatchError(f"{path}: blocks must be an array")
+    return block_validator.normalize_notes({"blocks": raw})["blocks"]
+
+
+def apply_patch(blocks: List[Dict[str, Any]], patch: Any) -> Dict[str, Any]:
+    """
+    將 patch 套用到原始 blocks
+
+    Args:
+        blocks: 原始筆記的 Notion blocks（編號即列表索引）
+        patch: Gemini 回傳的 {"title"?, "operations": [...]}
+
+    Returns:
+        {"blocks": 新的 blocks, "title"?: 新標題, "stats": {"insert_after": n, "replace": n, "delete": n}}
+
+    Raises:
+        PatchError: 操作格式錯誤、編號超出範圍、同一個 block 被取代 / 刪除多次，或取代的內容全部不合法
+    """
+    if not isinstance(patch, dict) or not isinstance(patch.get("operations"), list):
+        raise PatchError("patch must contain an operations array")
+
+    count = len(blocks)
+    inserts: Dict[int, List[Dict[str, Any]]] = {}
+    replaced: Dict[int, List[Dict[str, Any]]] = {}
+    deleted = set()
+    stats = {op: 0 for op in OPERATIONS}
+
+    for i, operation in enumerate(patch["operations"]):
+        path = f"operations[{i}]"
+        if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+            raise PatchError(f"{path}: unknown operation")
+        op, index = operation["op"], operation.get("index")
+        if not isinstance(index, int) or isinstance(index, bool):
+            raise PatchError(f"{path}: index must be an integer")
+
+        if op == "insert_after":
+            if not -1 <= index < count:
+                raise PatchError(f"{path}: index {index} out of range")
+            new_blocks = _normalize_blocks(operation.get("blocks"), path)
+            if new_blocks:
+                inserts.setdefault(index, []).extend(new_blocks)
+        else:
+            if not 0 <= index < count:
+                raise PatchError(f"{path}: index {index} out of range")
+            if index in replaced or index in deleted:
+                raise PatchError(f"{path}: block {index} is modified more than once")
+            if op == "replace":
+                new_blocks = _normalize_blocks(operation.get("blocks"), path)
+                if not new_blocks:
+                    raise PatchError(f"{path}: no valid blocks to replace block {index}")
+                replaced[index] = new_blocks
+            else:
+                deleted.add(index)
+        stats[op] += 1
+
+    result: List[Dict[str, Any]] = list(inserts.get(-1, ()))
+    for index, block in enumerate(blocks):
+        if index in replaced:
+            result.extend(replaced[index])
+        elif index not in deleted:
+            result.append(block)
+        result.extend(inserts.get(index, ()))
+
+    applied: Dict[str, Any] = {"blocks": result, "stats": stats}
+    title = patch.get("title")
+    if isinstance(title, str) and title.strip():
+        applied["title"] = block_validator.normalize_notes({"title": title, "blocks": []})["title"]
+    return applied
@@ -0,0 +1,325 @@
+"""
+LLM 生成的 Notion blocks 驗證與修復
+
+- NOTION_BLOCKS_SCHEMA 在載入時編譯成巢狀的檢查節點，驗證時不再解讀 schema
+- normalize_notes 修復常見的輸出瑕疵：缺少 type、殘留的 Markdown `**`、
+  開頭的列表符號、內文中的 Emoji、不支援的程式語言等（code block 的內容不做文字修復）
+- schema 以外的類型（靜態選單與使用者編輯的 paragraph 等）保留，只修復 rich_text
+- 修復後仍不合法的 block 直接丟棄，不等到 Notion API 或 PDF 生成時才失敗
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.services import NOTION_BLOCKS_SCHEMA
+from .loader import lazy_import
+
+emoji = lazy_import("emoji")
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "integer": int,
+    "number": (int, float),
+}
+
+_BLOCK_SCHEMA = NOTION_BLOCKS_SCHEMA["properties"]["blocks"]["items"]
+# LLM 輸出允許的類型（依 schema 完整驗證與修復）
+SCHEMA_BLOCK_TYPES = tuple(_BLOCK_SCHEMA["properties"]["type"]["enum"])
+CODE_LANGUAGES = frozenset(_BLOCK_SCHEMA["properties"]["code"]["properties"]["language"]["enum"])
+# 缺少 type 時可依內容欄位推斷的類型
+_INFERABLE_TYPES = SCHEMA_BLOCK_TYPES + ("paragraph", "heading_1", "numbered_list_item", "to_do")
+
+_MARKDOWN_BOLD = re.compile(r"\*\*(.+?)\*\*", re.S)
+# 只移除後面接著空白的列表符號（"-5 degrees" 的負號不是列表符號）
+_LEADING_BULLET = re.compile(r"^\s*[•·▪●◦‣∙*\-–—]\s+")
+# 可能含有 Emoji 的字元範圍（快速判斷，命中時才交給 emoji 套件處理）
+_MAYBE_EMOJI = re.compile("[\u2190-\u2bff\u3030\u303d\u3297\u3299\ufe0f\u200d\U0001f000-\U0001faff]")
+
+
+class CompiledSchema:
+    """
+    編譯後的 schema 節點
+
+    check 只返回是否合法（不組合錯誤路徑，成功時最快）；
+    不合法時再以 explain 走一次收集錯誤訊息
+    """
+
+    __slots__ = ("type_name", "py_type", "enum", "required", "properties", "items")
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.type_name = schema.get("type")
+        self.py_type = _JSON_TYPES.get(self.type_name)
+        self.enum = frozenset(schema["enum"]) if "enum" in schema else None
+        self.required = tuple(schema.get("required", ()))
+        self.properties = tuple(
+            (name, CompiledSchema(sub)) for name, sub in schema.get("properties", {}).items()
+        )
+        self.items = CompiledSchema(schema["items"]) if "items" in schema else None
+
+    def _type_ok(self, value: Any) -> bool:
+        py_type = self.py_type
+        if py_type is None:
+            return True
+        if py_type is bool:
+            return isinstance(value, bool)
+        return isinstance(value, py_type) and not isinstance(value, bool)
+
+    def check(self, value: Any) -> bool:
+        if not self._type_ok(value):
+            return False
+        if self.enum is not None and value not in self.enum:
+            return False
+        for name in self.required:
+            if name not in value:
+                return False
+        for name, sub in self.properties:
+            if name in value and not sub.check(value[name]):
+                return False
+        if self.items is not None:
+            check_item = self.items.check
+            for item in value:
+                if not check_item(item):
+                    return False
+        return True
+
+    def explain(self, value: Any, path: str, errors: List[str]) -> None:
+        if not self._type_ok(value):
+            errors.append(f"{path}: expected {self.type_name}")
+            return
+        if self.enum is not None and value not in self.enum:
+            errors.append(f"{path}: {value!r} is not one of the allowed values")
+        for name in self.required:
+            if name not in value:
+                errors.append(f"{path}: missing '{name}'")
+        for name, sub in self.properties:
+            if name in value:
+                sub.explain(value[name], f"{path}.{name}", errors)
+        if self.items is not None:
+            for i, item in enumerate(value):
+                self.items.explain(item, f"{path}[{i}]", errors)
+
+
+# 外層只檢查 title 與 blocks 的型別，各個 block 由 is_valid_block 檢查
+_NOTES_SCHEMA = CompiledSchema({
+    **NOTION_BLOCKS_SCHEMA,
+    "properties": {**NOTION_BLOCKS_SCHEMA["properties"], "blocks": {"type": "array"}},
+})
+_COMPILED_BLOCK_SCHEMA = CompiledSchema(_BLOCK_SCHEMA)
+_RICH_TEXT_SCHEMA = CompiledSchema(_BLOCK_SCHEMA["properties"]["callout"]["properties"]["rich_text"])
+
+
+def _is_schema_type(block_type: Any) -> bool:
+    return isinstance(block_type, str) and block_type in SCHEMA_BLOCK_TYPES
+
+
+def is_valid_block(block: Any) -> bool:
+    """快速判斷單一 block 是否合法"""
+    if not isinstance(block, dict):
+        return False
+    block_type = block.get("type")
+    if _is_schema_type(block_type):
+        return _COMPILED_BLOCK_SCHEMA.check(block) and block_type in block
+    # 其他類型：需有同名的內容欄位，rich_text（若有）格式正確
+    body = block.get(block_type) if isinstance(block_type, str) else None
+    return isinstance(body, dict) and _RICH_TEXT_SCHEMA.check(body.get("rich_text", []))
+
+
+def validate_block(block: Any, path: str = "block") -> List[str]:
+    """驗證單一 block，返回錯誤訊息（合法時為空列表）"""
+    if is_valid_block(block):
+        return []
+    errors: List[str] = []
+    block_type = block.get("type") if isinstance(block, dict) else None
+    if not isinstance(block_type, str) or _is_schema_type(block_type):
+        _COMPILED_BLOCK_SCHEMA.explain(block, path, errors)
+    if isinstance(block_type, str) and not isinstance(block.get(block_type), dict):
+        errors.append(f"{path}: missing '{block_type}'")
+    elif isinstance(block_type, str) and not _is_schema_type(block_type):
+        _RICH_TEXT_SCHEMA.explain(block[block_type].get("rich_text", []), f"{path}.{block_type}.rich_text", errors)
+    return errors
+
+
+def validate_notes(notes: Any) -> List[str]:
+    """驗證完整的 {"title", "blocks"}，返回錯誤訊息（合法時為空列表）"""
+    if _NOTES_SCHEMA.check(notes) and all(is_valid_block(block) for block in notes["blocks"]):
+        return []
+    errors: List[str] = []
+    _NOTES_SCHEMA.explain(notes, "$", errors)
+    if isinstance(notes, dict) and isinstance(notes.get("blocks"), list):
+        for i, block in enumerate(notes["blocks"]):
+            errors.extend(validate_block(block, f"$.blocks[{i}]"))
+    return errors
+
+
+# ---------- 修復 ----------
+
+def _strip_emoji(text: str) -> str:
+    if _MAYBE_EMOJI.search(text) is None:
+        return text
+    return emoji.replace_emoji(text, replace="")
+
+
+def _normalize_rich_text(rich_text: Any, strip_bullet: bool, fix_markup: bool = True) -> List[Dict[str, Any]]:
+    """
+    修復 rich_text：補上 type；fix_markup 時拆解 Markdown 粗體、移除 Emoji；
+    strip_bullet 時移除開頭的列表符號（code block 兩者皆不處理，內容原樣保留）
+    """
+    if isinstance(rich_text, str):
+        rich_text = [{"type": "text", "text": {"content": rich_text}}]
+    if not isinstance(rich_text, list):
+        return []
+
+    spans: List[Dict[str, Any]] = []
+    for item in rich_text:
+        if isinstance(item, str):
+            item = {"text": {"content": item}}
+        if not isinstance(item, dict):
+            continue
+        text = item.get("text")
+        content = text.get("content") if isinstance(text, dict) else item.get("plain_text")
+        if not isinstance(content, str):
+            continue
+
+        annotations = item.get("annotations")
+        annotations = dict(annotations) if isinstance(annotations, dict) else {}
+        if fix_markup:
+            content = _strip_emoji(content)
+
+        if not fix_markup or "**" not in content:
+            pieces = [(content, annotations)]
+        else:
+            pieces = []
+            last = 0
+            for match in _MARKDOWN_BOLD.finditer(content):
+                pieces.append((content[last:match.start()], annotations))
+                pieces.append((match.group(1), {**annotations, "bold": True}))
+                last = match.end()
+            pieces.append((content[last:], annotations))
+            # 沒有成對的 `**` 直接移除
+            pieces = [(piece.replace("**", ""), ann) for piece, ann in pieces]
+
+        for piece, ann in pieces:
+            if not piece:
+                continue
+            span: Dict[str, Any] = {"type": "text", "text": {"content": piece}}
+            if ann:
+                span["annotations"] = ann
+            spans.append(span)
+
+    if strip_bullet and spans:
+        first = spans[0]["text"]
+        first["content"] = _LEADING_BULLET.sub("", first["content"], count=1)
+        if not first["content"]:
+            spans.pop(0)
+    return spans
+
+
+def _infer_type(block: Dict[str, Any]) -> Optional[str]:
+    block_type = block.get("type")
+    if isinstance(block_type, str) and (isinstance(block.get(block_type), dict) or _is_schema_type(block_type)):
+        return block_type
+    # 缺少 type（或 type 沒有對應的內容欄位）：以唯一出現的內容欄位推斷
+    present = [name for name in _INFERABLE_TYPES if isinstance(block.get(name), dict)]
+    return present[0] if len(present) == 1 else None
+
+
+def _normalize_other(block: Dict[str, Any], block_type: str) -> Tuple[Dict[str, Any], bool]:
+    """schema 以外的類型（paragraph、divider 等）：保留原本的內容，只修復 rich_text"""
+    body = block[block_type]
+    if "rich_text" in body:
+        body = {**body, "rich_text": _normalize_rich_text(body["rich_text"], strip_bullet=True)}
+    fixed = {**block, "object": "block", "type": block_type, block_type: body}
+    return fixed, fixed != {**block, "object": "block"}
+
+
+def normalize_block(block: Any) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    修復單一 block
+
+    Returns:
+        (修復後的 block，無法修復時為 None, 是否有修改)
+    """
+    if not isinstance(block, dict):
+        return None, True
+    block_type = _infer_type(block)
+    if block_type is None:
+        return None, True
+    if not _is_schema_type(block_type):
+        return _normalize_other(block, block_type)
+
+    body = block.get(block_type) if isinstance(block.get(block_type), dict) else {}
+    rich_text = _normalize_rich_text(
+        body.get("rich_text", []),
+        strip_bullet=block_type != "code",
+        fix_markup=block_type != "code",
+    )
+    if not rich_text and block_type != "code":
+        return None, True
+
+    fixed_body: Dict[str, Any] = {**body, "rich_text": rich_text}
+
+    if block_type == "callout":
+        icon = body.get("icon")
+        if not (isinstance(icon, dict) and isinstance(icon.get("emoji"), str) and icon["emoji"]):
+            fixed_body["icon"] = {"emoji": "💡"}
+    elif block_type == "code":
+        language = str(body.get("language", "")).lower()
+        fixed_body["language"] = language if language in CODE_LANGUAGES else "plain text"
+    elif block_type == "toggle":
+        children = []
+        for child in body.get("children") or []:
+            fixed_child, _ = normalize_block(child)
+            if fixed_child is None:
+                continue
+            # toggle 內只允許 bulleted_list_item，其他類型保留文字轉為列表項
+            child_type = fixed_child["type"]
+            if child_type != "bulleted_list_item":
+                child_text = fixed_child[child_type].get("rich_text")
+                if not child_text:
+                    continue
+                fixed_child = {
+                    "object": "block",
+                    "type": "bulleted_list_item",
+                    "bulleted_list_item": {"rich_text": child_text},
+                }
+            children.append(fixed_child)
+        fixed_body["children"] = children
+
+    fixed = {"object": "block", "type": block_type, block_type: fixed_body}
+    # 只補上 "object" 不算修改
+    return fixed, fixed != {**block, "object": "block"}
+
+
+def normalize_notes(notes: Any) -> Dict[str, Any]:
+    """
+    修復並驗證 LLM 回傳的 {"title", "blocks"}；仍不合法的 block 會被丟棄
+
+    Returns:
+        修復後的 {"title", "blocks"}（title 缺少時不補上，由呼叫端決定預設值）
+    """
+    if not isinstance(notes, dict):
+        notes = {"blocks": notes if isinstance(notes, list) else []}
+
+    blocks: List[Dict[str, Any]] = []
+    repaired = dropped = 0
+    raw_blocks = notes.get("blocks")
+    for block in raw_blocks if isinstance(raw_blocks, list) else []:
+        fixed, changed = normalize_block(block)
+        if fixed is None or not is_valid_block(fixed):
+            dropped += 1
+            continue
+        repaired += changed
+        blocks.append(fixed)
+
+    result = {**notes, "blocks": blocks}
+    title = notes.get("title")
+    if isinstance(title, str):
+        result["title"] = _strip_emoji(title).replace("**", "").strip()
+    elif "title" in result:
+        del result["title"]
+
+    if repaired or dropped:
+        print(f"[BLOCKS] Repaired {repaired} block(s), dropped {dropped} invalid block(s).")
+    return result
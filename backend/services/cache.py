@@ -0,0 +1,516 @@
+"""
+快取服務
+
+提供兩種後端，介面相同：
+1. MemoryLRUCache：單一行程內的 LRU（預設）
+2. SQLiteCache：SQLite WAL 模式的本機共享快取，多個 uvicorn worker 可同時讀寫
+
+兩者皆支援 TTL、容量上限（項目數與總 bytes），以及 get_or_compute：同一個 key 同時只會有一個呼叫者計算，
+其他呼叫者等待結果（SQLiteCache 跨行程也成立，計算期間持續續約）
+
+使用方式：
+    cache = get_cache("pdf", default_ttl=3600)
+    pdf_bytes = cache.get_or_compute(key, lambda: build_pdf())
+"""
+import abc
+import asyncio
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import settings
+
+# get 時若超過此秒數未更新存取時間才寫回，避免每次讀取都寫入
+_TOUCH_INTERVAL = 60.0
+# 等待其他行程計算時的輪詢間隔
+_POLL_INTERVAL = 0.05
+
+
+def _sizeof(value: Any) -> int:
+    """值的大小（bytes 類直接取長度，其他以 pickle 後的長度估計，與 SQLiteCache 的計算一致）"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def make_key(*parts: Any) -> str:
+    """將多個部分組成固定長度的快取 key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def key_fingerprint(api_key: str) -> str:
+    """API Key 的短雜湊，避免明文 Key 作為快取 key 或留在記憶體中的對照表"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+async def coalesce(
+    inflight: Dict[str, asyncio.Future],
+    key: str,
+    compute: Callable[[], Awaitable[Any]]
+) -> Any:
+    """
+    同一個 key 同時只計算一次：計算中再次呼叫時等待同一個結果（本身不保存結果）
+
+    Args:
+        inflight: 進行中的計算（key -> Future），由呼叫端持有
+    """
+    pending = inflight.get(key)
+    if pending is not None:
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            # 自己被取消時照常拋出；計算者被取消（例如推測性的 refine）時改由自己重新計算
+            if not pending.done():
+                raise
+        return await coalesce(inflight, key, compute)
+
+    future = asyncio.get_running_loop().create_future()
+    inflight[key] = future
+    try:
+        value = await compute()
+        future.set_result(value)
+        return value
+    except BaseException as e:
+        future.set_exception(e)
+        # 沒有其他等待者時避免 "exception was never retrieved" 警告
+        future.exception()
+        raise
+    finally:
+        inflight.pop(key, None)
+
+
+class CacheBackend(abc.ABC):
+    """快取後端的共同介面"""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        ...
+
+    @abc.abstractmethod
+    async def aget_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        ...
+
+
+class MemoryLRUCache(CacheBackend):
+    """行程內 LRU 快取（項目數或總 bytes 超過上限時淘汰最久未使用的項目）"""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        default_ttl: Optional[float] = None,
+        max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # key -> (expires_at, value, size)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        # key -> [lock, 等待/持有者數量]
+        self._key_locks: Dict[str, list] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.time() + ttl if ttl else None
+        size = _sizeof(value)
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (expires_at, value, size)
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[2]
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            holder = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            holder[1] += 1
+        try:
+            with holder[0]:
+                value = self.get(key)
+                if value is None:
+                    value = compute()
+                    self.set(key, value, ttl)
+                return value
+        finally:
+            with self._lock:
+                holder[1] -= 1
+                if holder[1] == 0:
+                    self._key_locks.pop(key, None)
+
+    async def aget_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        async def compute_and_store() -> Any:
+            value = await compute()
+            self.set(key, value, ttl)
+            return value
+
+        return await coalesce(self._inflight, key, compute_and_store)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    以 SQLite（WAL 模式）實作的跨行程共享快取
+
+    值以 pickle 序列化；容量上限以 namespace 內的總 bytes 計算，
+    超過時依最後存取時間淘汰最舊的項目
+
+    計算租約每 lease_seconds / 3 續約一次，計算時間超過 lease_seconds（例如 deep 等級的 refine）
+    也不會被其他行程接手重複計算；持有者的行程結束後租約在 lease_seconds 內過期
+    """
+
+    _schema_lock = threading.Lock()
+    _initialized_paths: set = set()
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        default_ttl: Optional[float] = None,
+        lease_seconds: float = 120.0
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._init_schema()
+
+    # ---------- 連線與 schema ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        with self._schema_lock:
+            if self.path in self._initialized_paths:
+                return
+            conn = self._connect()
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed
+                    ON cache_entries (namespace, accessed_at);
+                CREATE TABLE IF NOT EXISTS cache_leases (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                ) WITHOUT ROWID;
+                """
+            )
+            self._initialized_paths.add(self.path)
+
+    # ---------- 基本操作 ----------
+
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at, accessed_at = row
+        if expires_at is not None and expires_at <= now:
+            self.delete(key)
+            return None
+        if now - accessed_at > _TOUCH_INTERVAL:
+            conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+        return pickle.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        now = time.time()
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, sqlite3.Binary(data), len(data), now + ttl if ttl else None, now),
+            )
+            self._evict(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, key: str) -> None:
+        self._connect().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        )
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """刪除過期項目，並在超過容量時依存取時間淘汰"""
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+            (self.namespace, now),
+        )
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute(
+            "SELECT key, size FROM cache_entries WHERE namespace = ? ORDER BY accessed_at",
+            (self.namespace,),
+        )
+        victims = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            victims.append((self.namespace, key))
+            total -= size
+        conn.executemany("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", victims)
+
+    # ---------- 跨行程的計算租約 ----------
+
+    def _try_acquire(self, key: str) -> Optional[str]:
+        """
+        取得計算 key 的租約
+
+        Returns:
+            租約 token；已被其他呼叫者（同行程或其他行程）持有且未過期時返回 None
+        """
+        conn = self._connect()
+        now = time.time()
+        token = f"{os.getpid()}-{uuid.uuid4().hex}"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT owner, expires_at FROM cache_leases WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is not None and row[1] > now:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, token, now + self.lease_seconds),
+            )
+            conn.execute("COMMIT")
+            return token
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _renew(self, key: str, token: str) -> bool:
+        """延長仍由 token 持有的租約；租約已被接手時返回 False"""
+        cursor = self._connect().execute(
+            "UPDATE cache_leases SET expires_at = ? WHERE namespace = ? AND key = ? AND owner = ?",
+            (time.time() + self.lease_seconds, self.namespace, key, token),
+        )
+        return cursor.rowcount > 0
+
+    def _renew_in_thread(self, key: str, token: str) -> threading.Event:
+        """在背景 thread 中定期續約，直到返回的 Event 被 set"""
+        stop = threading.Event()
+
+        def renew() -> None:
+            while not stop.wait(self.lease_seconds / 3):
+                if not self._renew(key, token):
+                    return
+
+        threading.Thread(target=renew, name="cache-lease", daemon=True).start()
+        return stop
+
+    async def _renew_forever(self, key: str, token: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self._renew, key, token):
+                return
+
+    def _release(self, key: str, token: str) -> None:
+        self._connect().execute(
+            "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND owner = ?",
+            (self.namespace, key, token),
+        )
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+            token = self._try_acquire(key)
+            if token:
+                break
+            time.sleep(_POLL_INTERVAL)
+
+        stop_renewal = self._renew_in_thread(key, token)
+        try:
+            # 取得租約期間可能已有其他行程寫入
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                self.set(key, value, ttl)
+            return value
+        finally:
+            stop_renewal.set()
+            self._release(key, token)
+
+    async def aget_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        while True:
+            value = await asyncio.to_thread(self.get, key)
+            if value is not None:
+                return value
+            token = await asyncio.to_thread(self._try_acquire, key)
+            if token:
+                break
+            await asyncio.sleep(_POLL_INTERVAL)
+
+        renewal = asyncio.create_task(self._renew_forever(key, token))
+        try:
+            value = await asyncio.to_thread(self.get, key)
+            if value is None:
+                value = await compute()
+                await asyncio.to_thread(self.set, key, value, ttl)
+            return value
+        finally:
+            renewal.cancel()
+            await asyncio.to_thread(self._release, key, token)
+
+
+_caches: Dict[str, CacheBackend] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(
+    namespace: str,
+    default_ttl: Optional[float] = None,
+    max_entries: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> CacheBackend:
+    """
+    取得指定 namespace 的快取（同一 namespace 在行程內共用同一個實例）
+
+    後端由 CACHE_BACKEND 決定："memory"（預設）或 "sqlite"
+    """
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            if settings.CACHE_BACKEND == "sqlite":
+                cache = SQLiteCache(
+                    settings.CACHE_SQLITE_PATH,
+                    namespace,
+                    max_bytes=max_bytes or settings.CACHE_MAX_BYTES,
+                    default_ttl=default_ttl,
+                )
+            else:
+                cache = MemoryLRUCache(
+                    max_entries=max_entries or settings.CACHE_MAX_ENTRIES,
+                    default_ttl=default_ttl,
+                    max_bytes=max_bytes or settings.CACHE_MAX_BYTES,
+                )
+            _caches[namespace] = cache
+        return cache
@@ -0,0 +1,215 @@
+"""
+上傳文件的唯讀 handle
+
+uploads/temp 中的文件會被多個階段完整讀取（內容雜湊、格式檢查、頁數、上傳到 Gemini）。
+DocumentHandle 將文件 memory map 一次，各階段取得 memoryview 切片而不是各自讀成 bytes：
+
+- view() / chunks()：不複製的 memoryview（大型掃描 PDF 不會在一個請求中被讀進記憶體好幾次）
+- open_reader()：從 memory map 讀取的檔案物件，給只接受檔案物件的函式庫（pypdf、Gemini 上傳）
+- sha256：快取的內容雜湊（上傳時已在寫入過程中計算，可直接帶入）
+- pdf_metadata()：快取的頁數等資訊
+
+handle 依路徑在行程內共用（LRU，上限 DOCUMENT_HANDLE_CACHE），檔案大小或修改時間改變時重新 map；
+刪除臨時文件前以 release() 關閉
+"""
+import hashlib
+import io
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional
+
+from config import settings
+from services.loader import lazy_import
+
+pypdf = lazy_import("pypdf")
+
+PDF_MAGIC = b"%PDF-"
+
+# chunks() 預設的切片大小
+_CHUNK_SIZE = 1024 * 1024
+
+
+class DocumentHandle:
+    """單一文件的唯讀 memory map 與快取的雜湊 / metadata"""
+
+    def __init__(self, path: str, sha256: Optional[str] = None):
+        self.path = path
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self._sha256 = sha256
+        self._pdf_metadata: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._mmap: Optional[mmap.mmap] = None
+        if self.size:
+            with open(path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def matches(self, stat: os.stat_result) -> bool:
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def view(self) -> memoryview:
+        """整份文件的 memoryview（不複製）"""
+        if self._mmap is None:
+            if self.size:
+                raise ValueError(f"Document handle is closed: {os.path.basename(self.path)}")
+            return memoryview(b"")
+        return memoryview(self._mmap)
+
+    def chunks(self, size: int = _CHUNK_SIZE) -> Iterator[memoryview]:
+        """依序產出固定大小的 memoryview 切片"""
+        view = self.view()
+        for start in range(0, len(view), size):
+            yield view[start:start + size]
+
+    def open_reader(self) -> "_HandleReader":
+        """唯讀、可 seek 的檔案物件（每次 read 只複製要求的範圍）"""
+        return _HandleReader(self.view())
+
+    def startswith(self, prefix: bytes) -> bool:
+        return self.view()[:len(prefix)] == prefix
+
+    @property
+    def sha256(self) -> str:
+        """內容的 SHA-256（第一次存取時計算，hashlib 對大區塊會釋放 GIL）"""
+        if self._sha256 is None:
+            with self._lock:
+                if self._sha256 is None:
+                    digest = hashlib.sha256()
+                    digest.update(self.view())
+                    self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    def pdf_metadata(self) -> Dict[str, Any]:
+        """
+        PDF 的基本資訊（不做完整解析），結果快取在 handle 上
+
+        Returns:
+            {"pages": 頁數；無法讀取目錄（例如損毀或加密）時為 None}
+
+        Raises:
+            ValueError: 文件不是有效的 PDF（訊息不含檔名，由呼叫端附上原始檔名）
+        """
+        if self._pdf_metadata is None:
+            if not self.startswith(PDF_MAGIC):
+                raise ValueError("不是有效的 PDF 檔案")
+            self._pdf_metadata = {"pages": self._pdf_page_count()}
+        return self._pdf_metadata
+
+    def _pdf_page_count(self) -> Optional[int]:
+        """
+        根節點 /Pages 的 /Count
+
+        pypdf 只讀取 xref（包含 PDF 1.5 的 xref stream 與 object stream）與目錄，不解析頁面內容
+        """
+        try:
+            reader = pypdf.PdfReader(self.open_reader())
+            if reader.is_encrypted:
+                reader.decrypt("")
+            return int(reader.trailer["/Root"]["/Pages"]["/Count"])
+        except Exception:
+            return None
+
+    def close(self) -> None:
+        """關閉 memory map（只在文件即將刪除時呼叫）"""
+        if self._mmap is None:
+            return
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 仍有 memoryview 在使用中，最後一個參照釋放時由 GC 關閉
+            return
+        self._mmap = None
+
+
+class _HandleReader(io.RawIOBase):
+    """memoryview 上的唯讀檔案物件"""
+
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        data = self._view[self._pos:self._pos + len(buffer)]
+        size = len(data)
+        memoryview(buffer).cast("B")[:size] = data
+        self._pos += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        # 釋放 memoryview，handle.close() 才能 unmap
+        self._view.release()
+        super().close()
+
+
+_handles: "OrderedDict[str, DocumentHandle]" = OrderedDict()
+_handles_lock = threading.Lock()
+
+
+def open_document(path: str, sha256: Optional[str] = None) -> DocumentHandle:
+    """
+    取得文件的 handle（同一路徑共用；文件變動時重新 map）
+
+    Args:
+        path: 文件路徑
+        sha256: 已知的內容雜湊（例如上傳時計算的），避免重新計算
+
+    Raises:
+        OSError: 文件不存在或無法讀取
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    with _handles_lock:
+        handle = _handles.get(path)
+        if handle is not None and handle.matches(stat):
+            _handles.move_to_end(path)
+            if sha256 and handle._sha256 is None:
+                handle._sha256 = sha256
+            return handle
+
+        # 被取代或淘汰的 handle 可能仍在其他 thread 使用中，不主動關閉，最後一個參照釋放時自動 unmap
+        handle = DocumentHandle(path, sha256)
+        _handles[path] = handle
+        while len(_handles) > settings.DOCUMENT_HANDLE_CACHE:
+            _handles.popitem(last=False)
+        return handle
+
+
+def cached(path: str) -> Optional[DocumentHandle]:
+    """已在共用表中且仍有效的 handle；沒有時返回 None（不會建立新的 handle）"""
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _handles_lock:
+        handle = _handles.get(path)
+        if handle is None or not handle.matches(stat):
+            return None
+        _handles.move_to_end(path)
+        return handle
+
+
+def release(path: str) -> None:
+    """關閉並移除文件的 handle（刪除臨時文件前呼叫）"""
+    with _handles_lock:
+        handle = _handles.pop(os.path.abspath(path), None)
+    if handle is not None:
+        handle.close()
@@ -0,0 +1,488 @@
+"""
+Gemini API 客戶端
+
+llm 模組只透過 GeminiClient 介面呼叫 Gemini（上傳文件、建立 context cache、結構化生成），
+實作依 GEMINI_BACKEND 選擇：
+1. GoogleGeminiClient：google.generativeai（預設）
+2. RestGeminiClient：直接呼叫 Gemini REST API（httpx），可用 GEMINI_API_BASE 指向其他位址，
+   例如 benchmarks.fake_apis 的本機假伺服器
+3. StubGeminiClient：不連網的本機替身，回傳固定格式的筆記並記錄每次呼叫，
+   用於在沒有 API Key 的環境測試 refine 流程與 context cache 的建立 / 過期重建
+
+文件以 handle（{"name", "uri", "mime_type"}）表示，contents 為字串與 handle 組成的列表
+"""
+import abc
+import asyncio
+import contextlib
+import datetime
+import itertools
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Union
+
+from config import settings
+from services import document, jsonio
+from services.cache import key_fingerprint
+from services.loader import lazy_import
+
+genai = lazy_import("google.generativeai")
+genai_client = lazy_import("google.generativeai.client")
+genai_types = lazy_import("google.generativeai.types")
+genai_caching = lazy_import("google.generativeai.caching")
+google_exceptions = lazy_import("google.api_core.exceptions")
+httpx = lazy_import("httpx")
+
+Content = Union[str, Dict[str, str]]
+
+
+class CachedContentExpired(Exception):
+    """引用的 context cache 已過期或被刪除"""
+
+
+class GeminiAPIError(Exception):
+    """Gemini REST API 回傳錯誤（訊息包含 HTTP 狀態碼，供路由判斷 403 / 429）"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Gemini API error {status}: {message}")
+        self.status = status
+
+
+class GeminiClient(abc.ABC):
+    """
+    Gemini API 的共同介面
+
+    客戶端從 get_client 的登錄表淘汰後以 retire() 標記，最後一個進行中的呼叫結束時才釋放連線
+    """
+
+    _inflight = 0
+    _retired = False
+
+    @contextlib.asynccontextmanager
+    async def _in_use(self) -> AsyncIterator[None]:
+        self._inflight += 1
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+            if self._retired and not self._inflight:
+                await self.aclose()
+
+    async def retire(self) -> None:
+        """已從登錄表淘汰：沒有進行中的呼叫時立即關閉"""
+        self._retired = True
+        if not self._inflight:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        """釋放連線等資源（之後再使用時重新建立）"""
+
+    @abc.abstractmethod
+    async def upload_file(self, path: str) -> Dict[str, str]:
+        """上傳文件，返回 {"name", "uri", "mime_type"}"""
+
+    @abc.abstractmethod
+    async def create_cache(
+        self,
+        model: str,
+        system_instruction: str,
+        contents: List[Content],
+        ttl_seconds: int
+    ) -> Dict[str, Any]:
+        """
+        建立 context cache
+
+        Returns:
+            {"name": cache 名稱, "expire_time": 過期時間（epoch 秒）}
+        """
+
+    @abc.abstractmethod
+    async def generate_json(
+        self,
+        model: str,
+        contents: List[Content],
+        schema: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        cached_content: Optional[str] = None
+    ) -> str:
+        """
+        以結構化輸出生成 JSON 字串
+
+        使用 cached_content 時 system_instruction 與 cache 內的文件已包含在 cache 中，不需再傳
+
+        Raises:
+            CachedContentExpired: cached_content 已不存在
+        """
+
+
+class GoogleGeminiClient(GeminiClient):
+    """
+    google.generativeai 實作
+
+    genai.configure() 是行程全域的設定，不同使用者的 API Key 會互相覆蓋；
+    每個實例改用自己的 _ClientManager 建立各服務的客戶端
+    """
+
+    def __init__(self, api_key: str):
+        self._manager = genai_client._ClientManager()
+        self._manager.configure(api_key=api_key)
+
+    def _service(self, name: str) -> Any:
+        return self._manager.get_default_client(name)
+
+    @staticmethod
+    def _to_parts(contents: List[Content]) -> List[Any]:
+        return [
+            item if isinstance(item, str) else genai.protos.Part(
+                file_data=genai.protos.FileData(file_uri=item["uri"], mime_type=item["mime_type"])
+            )
+            for item in contents
+        ]
+
+    async def upload_file(self, path: str) -> Dict[str, str]:
+        mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        # 與 RestGeminiClient 相同，從 handle 的 memory map 讀取而不是重新開啟檔案
+        handle = document.cached(path) or await asyncio.to_thread(document.DocumentHandle, path)
+        async with self._in_use():
+            with handle.open_reader() as reader:
+                uploaded = await asyncio.to_thread(
+                    self._service("file").create_file,
+                    path=reader,
+                    mime_type=mime_type,
+                    display_name=os.path.basename(path),
+                )
+        return {"name": uploaded.name, "uri": uploaded.uri, "mime_type": uploaded.mime_type}
+
+    async def create_cache(
+        self,
+        model: str,
+        system_instruction: str,
+        contents: List[Content],
+        ttl_seconds: int
+    ) -> Dict[str, Any]:
+        request = genai_caching.CachedContent._prepare_create_request(
+            model=model,
+            system_instruction=system_instruction,
+            contents=self._to_parts(contents),
+            ttl=datetime.timedelta(seconds=ttl_seconds),
+        )
+        async with self._in_use():
+            cache = await asyncio.to_thread(self._service("cache").create_cached_content, request)
+        return {"name": cache.name, "expire_time": cache.expire_time.timestamp()}
+
+    async def generate_json(
+        self,
+        model: str,
+        contents: List[Content],
+        schema: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        cached_content: Optional[str] = None
+    ) -> str:
+        generation_config = genai_types.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=schema
+        )
+        async with self._in_use():
+            try:
+                if cached_content:
+                    # 與 GenerativeModel.from_cached_content 相同，但以這個實例的客戶端讀取 cache 的模型
+                    cache = await asyncio.to_thread(self._service("cache").get_cached_content, name=cached_content)
+                    generative_model = genai.GenerativeModel(
+                        model_name=cache.model,
+                        generation_config=generation_config,
+                    )
+                    generative_model._cached_content = cache.name
+                else:
+                    generative_model = genai.GenerativeModel(
+                        model_name=model,
+                        generation_config=generation_config,
+                        system_instruction=system_instruction,
+                    )
+                # 不使用 genai.configure() 設定的全域客戶端
+                generative_model._async_client = self._service("generative_async")
+                response = await generative_model.generate_content_async(self._to_parts(contents))
+            except (google_exceptions.NotFound, google_exceptions.PermissionDenied) as e:
+                if cached_content:
+                    raise CachedContentExpired(str(e)) from e
+                raise
+        return response.text
+
+    async def aclose(self) -> None:
+        clients, self._manager.clients = self._manager.clients, {}
+        for client in clients.values():
+            closed = client.transport.close()
+            if asyncio.iscoroutine(closed):
+                await closed
+
+
+def _rest_schema(schema: Any) -> Any:
+    """REST API 的 Schema.type 為列舉名稱（OBJECT、STRING...）"""
+    if isinstance(schema, dict):
+        return {
+            key: value.upper() if key == "type" and isinstance(value, str) else _rest_schema(value)
+            for key, value in schema.items()
+        }
+    if isinstance(schema, list):
+        return [_rest_schema(item) for item in schema]
+    return schema
+
+
+class RestGeminiClient(GeminiClient):
+    """Gemini REST API 實作（429 / 503 依 Retry-After 重試）"""
+
+    _MAX_RETRIES = 4
+
+    def __init__(self, api_key: str, base_url: str):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self._client = None
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"x-goog-api-key": self.api_key},
+                timeout=httpx.Timeout(300, connect=10),
+            )
+        return self._client
+
+    async def _request(self, method: str, url: str, **kwargs) -> Any:
+        async with self._in_use():
+            return await self._request_with_retries(method, url, **kwargs)
+
+    async def _request_with_retries(self, method: str, url: str, **kwargs) -> Any:
+        for attempt in range(self._MAX_RETRIES):
+            response = await self.client.request(method, url, **kwargs)
+            if response.status_code in (429, 503) and attempt < self._MAX_RETRIES - 1:
+                delay = float(response.headers.get("retry-after", 2 ** attempt))
+                print(f"[GEMINI API] {response.status_code} from {url}, retrying in {delay}s")
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code >= 400:
+                try:
+                    message = response.json()["error"]["message"]
+                except Exception:
+                    message = response.text[:200]
+                raise GeminiAPIError(response.status_code, message)
+            return response
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    @staticmethod
+    def _to_parts(contents: List[Content]) -> List[Dict[str, Any]]:
+        return [
+            {"text": item} if isinstance(item, str)
+            else {"fileData": {"fileUri": item["uri"], "mimeType": item["mime_type"]}}
+            for item in contents
+        ]
+
+    @staticmethod
+    def _model_name(model: str) -> str:
+        return model if model.startswith("models/") else f"models/{model}"
+
+    async def upload_file(self, path: str) -> Dict[str, str]:
+        mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        # 上傳的文件沿用共用的 memory map；其他文件（例如錄音分段）使用只在這次上傳中有效的 handle
+        handle = document.cached(path) or await asyncio.to_thread(document.DocumentHandle, path)
+
+        # resumable upload：先取得上傳網址，再一次送出內容並結束
+        start = await self._request(
+            "POST",
+            "/upload/v1beta/files",
+            headers={
+                "X-Goog-Upload-Protocol": "resumable",
+                "X-Goog-Upload-Command": "start",
+                "X-Goog-Upload-Header-Content-Length": str(handle.size),
+                "X-Goog-Upload-Header-Content-Type": mime_type,
+            },
+            json={"file": {"display_name": os.path.basename(path)}},
+        )
+        response = await self._request(
+            "POST",
+            start.headers["x-goog-upload-url"],
+            headers={
+                "X-Goog-Upload-Offset": "0",
+                "X-Goog-Upload-Command": "upload, finalize",
+                "Content-Length": str(handle.size),
+            },
+            content=_HandleStream(handle),
+        )
+        uploaded = response.json()["file"]
+        return {"name": uploaded["name"], "uri": uploaded["uri"], "mime_type": uploaded.get("mimeType", mime_type)}
+
+    async def create_cache(
+        self,
+        model: str,
+        system_instruction: str,
+        contents: List[Content],
+        ttl_seconds: int
+    ) -> Dict[str, Any]:
+        response = await self._request("POST", "/v1beta/cachedContents", json={
+            "model": self._model_name(model),
+            "systemInstruction": {"parts": [{"text": system_instruction}]},
+            "contents": [{"role": "user", "parts": self._to_parts(contents)}],
+            "ttl": f"{ttl_seconds}s",
+        })
+        # 以本地時間估計過期時間（不晚於 Gemini 端）
+        return {"name": response.json()["name"], "expire_time": time.time() + ttl_seconds}
+
+    async def generate_json(
+        self,
+        model: str,
+        contents: List[Content],
+        schema: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        cached_content: Optional[str] = None
+    ) -> str:
+        body: Dict[str, Any] = {
+            "contents": [{"role": "user", "parts": self._to_parts(contents)}],
+            "generationConfig": {
+                "responseMimeType": "application/json",
+                "responseSchema": _rest_schema(schema),
+            },
+        }
+        if cached_content:
+            body["cachedContent"] = cached_content
+        elif system_instruction:
+            body["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+
+        try:
+            response = await self._request(
+                "POST", f"/v1beta/{self._model_name(model)}:generateContent", json=body
+            )
+        except GeminiAPIError as e:
+            if cached_content and e.status in (403, 404):
+                raise CachedContentExpired(str(e)) from e
+            raise
+        parts = response.json()["candidates"][0]["content"]["parts"]
+        return "".join(part.get("text", "") for part in parts)
+
+
+class _HandleStream:
+    """
+    以 memoryview 切片串流文件內容的 request body（不把文件讀成 bytes）
+
+    每次迭代都從頭開始，重試時可以重新送出
+    """
+
+    def __init__(self, handle: document.DocumentHandle):
+        self.handle = handle
+
+    async def __aiter__(self):
+        for chunk in self.handle.chunks():
+            yield chunk
+
+
+class StubGeminiClient(GeminiClient):
+    """
+    本機替身：不連網，cache 依 ttl 在記憶體中過期
+
+    generate_json 返回包含反饋前段文字的筆記（patch schema 時為一個插入操作）；calls 依序記錄
+    ("upload" | "create_cache" | "generate", 細節)
+    """
+
+    def __init__(self):
+        self.calls: List[tuple] = []
+        self._caches: Dict[str, float] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    async def upload_file(self, path: str) -> Dict[str, str]:
+        file_id = next(self._ids)
+        self.calls.append(("upload", os.path.basename(path)))
+        return {"name": f"files/stub-{file_id}", "uri": f"stub://files/{file_id}", "mime_type": "application/pdf"}
+
+    async def create_cache(
+        self,
+        model: str,
+        system_instruction: str,
+        contents: List[Content],
+        ttl_seconds: int
+    ) -> Dict[str, Any]:
+        name = f"cachedContents/stub-{next(self._ids)}"
+        expire_time = time.time() + ttl_seconds
+        with self._lock:
+            self._caches[name] = expire_time
+        self.calls.append(("create_cache", name))
+        return {"name": name, "expire_time": expire_time}
+
+    def expire_caches(self) -> None:
+        """讓所有 cache 立即過期（模擬 Gemini 端的 TTL 到期）"""
+        with self._lock:
+            self._caches.clear()
+
+    async def generate_json(
+        self,
+        model: str,
+        contents: List[Content],
+        schema: Dict[str, Any],
+        system_instruction: Optional[str] = None,
+        cached_content: Optional[str] = None
+    ) -> str:
+        if cached_content:
+            with self._lock:
+                expire_time = self._caches.get(cached_content)
+            if expire_time is None or expire_time < time.time():
+                raise CachedContentExpired(f"{cached_content} not found")
+        self.calls.append(("generate", cached_content))
+
+        text = next((item for item in contents if isinstance(item, str)), "")
+        block = {
+            "object": "block",
+            "type": "bulleted_list_item",
+            "bulleted_list_item": {"rich_text": [{"type": "text", "text": {"content": text[:200] or "stub"}}]},
+        }
+        # patch 模式的 schema：在第一個 block 之後插入
+        if "operations" in schema.get("properties", {}):
+            return jsonio.dumps_str({"operations": [{"op": "insert_after", "index": 0, "blocks": [block]}]})
+        return jsonio.dumps_str({"title": "Stub Notes", "blocks": [block]})
+
+
+# API Key 指紋 -> 客戶端（LRU，上限 GEMINI_CLIENT_CACHE_SIZE）
+_clients: "OrderedDict[str, GeminiClient]" = OrderedDict()
+_clients_lock = threading.Lock()
+# 關閉被淘汰客戶端的背景工作（保留參照避免被 GC 回收）
+_closing: Set[asyncio.Task] = set()
+
+
+def _retire(client: GeminiClient) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(client.retire())
+        return
+    task = loop.create_task(client.retire())
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+def get_client(api_key: str) -> GeminiClient:
+    """依 GEMINI_BACKEND 取得客戶端（同一個 API Key 共用同一個實例）"""
+    backend = settings.GEMINI_BACKEND
+    evicted: List[GeminiClient] = []
+    with _clients_lock:
+        key = "stub" if backend == "stub" else key_fingerprint(api_key)
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+        else:
+            if backend == "stub":
+                client = StubGeminiClient()
+            elif backend == "google":
+                client = GoogleGeminiClient(api_key)
+            elif backend == "rest":
+                client = RestGeminiClient(api_key, settings.GEMINI_API_BASE)
+            else:
+                raise ValueError(f"Unknown GEMINI_BACKEND: {backend}")
+            _clients[key] = client
+            while len(_clients) > settings.GEMINI_CLIENT_CACHE_SIZE:
+                evicted.append(_clients.popitem(last=False)[1])
+    for old in evicted:
+        _retire(old)
+    return client
@@ -0,0 +1,71 @@
+"""
+JSON 編解碼
+
+安裝 orjson 時使用 orjson（以 C 實作，直接輸出 UTF-8 bytes），
+否則退回標準庫 json；兩者輸出相同格式：不轉義非 ASCII 字元、無多餘空白
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+
+def _default(obj: Any) -> Any:
+    """序列化 JSON 原生型別以外的物件（pydantic model、set 等）"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "dict"):
+        return obj.dict()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    序列化為 UTF-8 bytes
+
+    Args:
+        indent: 以 2 個空白縮排
+        sort_keys: 依 key 排序（用於計算穩定的雜湊）
+    """
+    if orjson is not None:
+        option = 0
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option)
+
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=(",", ": ") if indent else (",", ":"),
+        sort_keys=sort_keys,
+        default=_default,
+    ).encode("utf-8")
+
+
+def dumps_str(obj: Any, indent: bool = False, sort_keys: bool = False) -> str:
+    """序列化為 str（用於 prompt、SSE 等文字內容）"""
+    return dumps(obj, indent=indent, sort_keys=sort_keys).decode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """
+    解析 JSON
+
+    Raises:
+        ValueError: 不是合法的 JSON（orjson 與標準庫的例外都是 ValueError 的子類別）
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
@@ -1,13 +1,15 @@
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig
-import json
+import asyncio
+import math
 import re
 import os
 import platform
-from typing import List
+import time
+from typing import List, Dict, Tuple, Any, Optional
 
 from config import settings
-from models.services import NOTION_BLOCKS_SCHEMA
+from models.services import NOTION_BLOCKS_SCHEMA, NOTION_PATCH_SCHEMA
+from services import audio, block_ir, block_patch, block_validator, document, gemini, jsonio, model_router, slides
+from services.cache import coalesce, get_cache, key_fingerprint, make_key
 
 # 初始化 Gemini
 # Removed global init
@@ -15,6 +17,69 @@ from models.services import NOTION_BLOCKS_SCHEMA
 # 定義 Notion Blocks 的 JSON Schema
 # Moved to models.services.schemas.NOTION_BLOCKS_SCHEMA
 
+# 已上傳到 Gemini 的文件 handle，key 為 (API Key 指紋, 文件內容雜湊)
+# Gemini 會在 48 小時後刪除上傳的文件，快取時間略短於此
+_uploaded_files = get_cache("gemini_files", default_ttl=46 * 3600)
+
+# 進行中的 refine：相同筆記 + 相同反饋同時送出（例如重複點擊）時等待同一個生成。
+# 完成後不保留結果，使用者再次送出相同的反饋時會重新生成
+_refine_inflight: Dict[str, asyncio.Future] = {}
+
+# refine 的 Gemini context cache，key 為 (API Key 指紋, 模型, 固定指示, 文件內容)
+# 本地紀錄比 Gemini 端提早到期，避免引用即將過期的 cache
+_CONTEXT_CACHE_MARGIN = 120
+_context_caches = get_cache(
+    "gemini_context",
+    default_ttl=max(settings.GEMINI_CONTEXT_CACHE_TTL - _CONTEXT_CACHE_MARGIN, 60)
+)
+
+# 快速指令「選項 A」~「選項 E」
+_OPTION_PATTERN = re.compile(r"選項\s*([A-Ea-e])")
+
+# 所有 prompt 共用的輸出格式規範
+_FORMAT_RULES = (
+    "   - Text content 中絕對不要使用 Markdown 語法（如 `**`），必須使用 annotations。\n"
+    "   - Text content 開頭絕對不要包含 `•`、`-` 等列表符號。\n"
+    "   - **嚴格禁止使用任何 Emoji 符號**（如 💡、📊、✅ 等），請用純文字替代。\n\n"
+)
+
+# refine 的固定指示（作為 system instruction，使用 context cache 時與文件一起快取）
+_REFINE_INSTRUCTIONS = (
+    "# Role Definition\n"
+    "你是一位論文理解專家。學生之前上傳了論文，現在提出了新的需求或修改建議。\n"
+    "你的任務是：**參考原始論文 PDF** 以及 **舊的筆記**，根據學生的反饋來處理。\n\n"
+
+    "# Instructions\n"
+    "**0. 關於「原始筆記」的處理原則（最重要！）**：\n"
+    "   - **絕對保留**：除非學生明確要求「刪除」某部分，否則 **必須保留原始筆記中的所有內容**。\n"
+    "   - **新增模式**：對於補充說明、深入解析等需求，請將新生成的內容 **附加** 到原始筆記的相關段落之後，或者是新增一個標題區塊來放置。\n"
+    "   - **禁止覆蓋**：不要因為生成了新內容就丟棄了舊內容。\n\n"
+
+    "**1. 選項執行優先**：\n"
+    "   - 如果學生反饋包含「選項 A」~「選項 E」，這視為全新的分析請求。此時（也只有此時）可以忽略原始筆記，重新生成全新的完整結構。\n\n"
+
+    "**2. 一般調整（非選項指令）**：\n"
+    "   - 務必閱讀附帶的 PDF 文件（或附帶的投影片文字）來獲取正確資訊。\n"
+    "   - 將新資訊整合進現有結構，保持筆記的完整性。\n\n"
+
+    "**3. 格式規範**：\n"
+    f"{_FORMAT_RULES}"
+)
+
+# refine 的輸出方式（放在每次請求的 prompt 中，兩種模式共用同一個 context cache）
+_FULL_OUTPUT = (
+    "# Output Context\n"
+    "請直接輸出修改後的 **完整** JSON，必須包含「舊的完整內容」+「新的補充內容」。"
+)
+_PATCH_OUTPUT = (
+    "# Output Context（只輸出修改操作）\n"
+    "原始筆記中每個 block 前的 [n] 是它的編號。**不要輸出完整筆記**，只輸出 operations：\n"
+    "   - insert_after：在編號 n 的 block 之後插入 blocks（n = -1 表示插入到最前面）。\n"
+    "   - replace：以 blocks 取代編號 n 的 block。\n"
+    "   - delete：刪除編號 n 的 block（只在學生明確要求刪除時使用）。\n"
+    "所有編號都是原始筆記中的編號；沒有被操作的 block 會原樣保留。標題需要修改時才輸出 title。"
+)
+
 
 def normalize_path(path: str) -> str:
     """
@@ -58,6 +123,64 @@ def normalize_path(path: str) -> str:
     return path
 
 
+def parse_option(user_feedback: str) -> str:
+    """取出反饋中的快速指令選項（A~E），沒有時返回 None"""
+    match = _OPTION_PATTERN.search(user_feedback or "")
+    return match.group(1).upper() if match else None
+
+
+def _format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+def file_sha256(path: str) -> str:
+    """文件內容的 SHA-256（由共用的 DocumentHandle 計算並快取）"""
+    return document.open_document(path).sha256
+
+
+async def preupload_file(path: str, api_key: str = None, sha256: str = None) -> Dict[str, str]:
+    """
+    將文件上傳到 Gemini 並記住 handle，同一份內容之後不會重複上傳
+    （使用共享快取時，其他 worker 也會重用同一個 handle）
+
+    Args:
+        path: 本地文件路徑
+        api_key: Gemini API Key
+        sha256: 已知的內容雜湊（未提供時自行計算）
+
+    Returns:
+        文件 handle {"name", "uri", "mime_type"}
+    """
+    if not api_key:
+        raise ValueError("Gemini API Key is required")
+
+    if not sha256:
+        sha256 = await asyncio.to_thread(file_sha256, path)
+
+    async def upload() -> Dict[str, str]:
+        handle = await gemini.get_client(api_key).upload_file(path)
+        print(f"[GEMINI API] Pre-uploaded {os.path.basename(path)}.")
+        return handle
+
+    return await _uploaded_files.aget_or_compute(make_key(key_fingerprint(api_key), sha256), upload)
+
+
+async def prewarm_files(files: List[Tuple[str, str]], api_key: str) -> int:
+    """
+    預先上傳 refine 會用到的文件：錄音上傳其分段，投影片只以抽取的文字送出不需上傳
+
+    Args:
+        files: [(文件路徑, 內容雜湊), ...]
+
+    Returns:
+        預先上傳（或已上傳過而重用）的文件數
+    """
+    uploads = [(path, sha256) for path, sha256 in await _expand_recordings(files) if not slides.is_slide_deck(path)]
+    await asyncio.gather(*[preupload_file(path, api_key, sha256=sha256) for path, sha256 in uploads])
+    return len(uploads)
 
 
 async def get_static_options_menu(
@@ -147,26 +270,28 @@ async def refine_summary(
     try:
         if not api_key:
             raise ValueError("Gemini API Key is required")
-            
-        genai.configure(api_key=api_key)
-            
+
         print(f"[GEMINI API] Refining summary with feedback: {user_feedback}")
 
-        # 1. 嘗試從原始摘要中獲取文件路徑
+        # 1. 嘗試從原始摘要中獲取文件路徑（以及上傳時計算的內容雜湊）
         temp_paths = original_summary.get("temp_paths", [])
-        uploaded_files = []
+        file_hashes = original_summary.get("file_hashes") or []
+        if len(file_hashes) != len(temp_paths):
+            file_hashes = [None] * len(temp_paths)
 
-        if temp_paths:
-            # 規範化路徑（處理 Windows/Unix 格式差異）
-            normalized_paths = [normalize_path(path) for path in temp_paths]
+        valid_files = []
+        source_names = {}
 
-            # 過濾存在的文件並上傳
-            valid_paths = [path for path in normalized_paths if os.path.exists(path)]
+        if temp_paths:
+            # 規範化路徑（處理 Windows/Unix 格式差異），過濾存在的文件
+            filenames = original_summary.get("files") or []
+            for i, (path, sha256) in enumerate(zip(temp_paths, file_hashes)):
+                path = normalize_path(path)
+                if os.path.exists(path):
+                    valid_files.append((path, sha256 or await asyncio.to_thread(file_sha256, path)))
+                    source_names[path] = filenames[i] if i < len(filenames) else os.path.basename(path)
 
-            if valid_paths:
-                uploaded_files = [genai.upload_file(path=path) for path in valid_paths]
-                print(f"[GEMINI API] Uploaded {len(uploaded_files)} file(s) to Gemini.")
-            else:
+            if not valid_files:
                 print(f"[GEMINI API] Warning: No valid files found from {len(temp_paths)} path(s).")
         else:
             print("[GEMINI API] Warning: No temp_paths in original_summary.")
@@ -174,69 +299,62 @@ async def refine_summary(
         # 將原始 blocks 轉為 JSON 字串以便放入 Prompt
         # 為了節省 token，我們過濾掉技術性的欄位 (如 temp_paths, pdf_urls)，
         # 但保留 title, blocks (筆記本體) 和 files (檔名)，讓 LLM 知道內容與來源。
+        # blocks 經由 IR 輸出精簡格式（省略 "object" 與預設值的 annotations，合併零碎的片段）
+        ir_blocks = block_ir.normalize_spans(block_ir.from_notion(original_summary.get("blocks") or []), limits=False)
         context_summary = {
             "title": original_summary.get("title"),
-            "blocks": original_summary.get("blocks"),
+            "blocks": block_ir.to_notion(ir_blocks, compact=True),
             "files": original_summary.get("files", [])
         }
-        original_json = json.dumps(context_summary, ensure_ascii=False, indent=2)
-        
-        prompt = (
-            "# Role Definition\n"
-            "你是一位論文理解專家。學生之前上傳了論文，現在提出了新的需求或修改建議。\n"
-            "你的任務是：**參考原始論文 PDF** 以及 **舊的筆記**，根據學生的反饋來處理。\n\n"
-
-            "# User Feedback (學生反饋)\n"
-            f"{user_feedback}\n\n"
+        original_json = jsonio.dumps_str(context_summary, indent=True)
 
-            "# Original Summary (原始筆記)\n"
-            f"{original_json}\n\n"
+        option = parse_option(user_feedback)
+        is_initial = bool(original_summary.get("is_initial_menu"))
 
-            "# Instructions\n"
-            "**0. 關於「原始筆記」的處理原則（最重要！）**：\n"
-            "   - **絕對保留**：除非學生明確要求「刪除」某部分，否則 **必須保留原始筆記中的所有內容**。\n"
-            "   - **新增模式**：對於補充說明、深入解析等需求，請將新生成的內容 **附加** 到原始筆記的相關段落之後，或者是新增一個標題區塊來放置。\n"
-            "   - **禁止覆蓋**：不要因為生成了新內容就丟棄了舊內容。你的輸出必須包含「舊的完整內容」+「新的補充內容」。\n\n"
+        # 已有一定長度的筆記做一般調整時，只讓 Gemini 輸出修改操作（選項指令會重寫整份筆記，不適用）
+        use_patch = (
+            settings.REFINE_PATCH_MODE
+            and not is_initial
+            and not option
+            and len(ir_blocks) >= settings.REFINE_PATCH_MIN_BLOCKS
+        )
 
-            "**1. 選項執行優先**：\n"
-            "   - 如果學生反饋包含「選項 A」~「選項 E」，這視為全新的分析請求。此時（也只有此時）可以忽略原始筆記，重新生成全新的完整結構。\n\n"
+        # 依反饋、筆記與附件大小選擇模型等級
+        decision = model_router.route(
+            user_feedback,
+            option,
+            is_initial,
+            len(ir_blocks),
+            sum(os.path.getsize(path) for path, _ in valid_files)
+        )
+        print(f"[GEMINI API] Routing to {decision.tier} tier ({decision.model}, {decision.reason}).")
 
-            "**2. 一般調整（非選項指令）**：\n"
-            "   - 務必閱讀附帶的 PDF 文件來獲取正確資訊。\n"
-            "   - 將新資訊整合進現有結構，保持筆記的完整性。\n\n"
+        # 長錄音的第一次分析（或重新選擇選項）逐段並行摘要，避免單一請求處理整段錄音；
+        # 逐段摘要的總時間隨段數增加，等級的逾時依批次數放大
+        has_audio = any(audio.is_audio(path) for path, _ in valid_files)
+        use_recordings = has_audio and (is_initial or option)
+        timeout_scale = await _recording_rounds(valid_files) if use_recordings else 1
 
-            "**3. 格式規範**：\n"
-            "   - Text content 中絕對不要使用 Markdown 語法（如 `**`），必須使用 annotations。\n"
-            "   - Text content 開頭絕對不要包含 `•`、`-` 等列表符號。\n"
-            "   - **嚴格禁止使用任何 Emoji 符號**（如 💡、📊、✅ 等），請用純文字替代。\n\n"
+        async def generate(model: str) -> dict:
+            if use_recordings:
+                return await _generate_from_recordings(
+                    original_json, user_feedback, valid_files, source_names, api_key, model
+                )
+            return await _generate_refinement(
+                original_json, user_feedback, await _expand_recordings(valid_files), api_key, source_names,
+                patch_base=(original_summary.get("title"), ir_blocks) if use_patch else None,
+                model=model
+            )
 
-            "# Output Context\n"
-            "請直接輸出修改後的 **完整** JSON（包含所有保留的舊區塊和新生成的區塊）。"
+        inflight_key = make_key(
+            key_fingerprint(api_key),
+            decision.model,
+            user_feedback,
+            original_json,
+            *[sha256 for _, sha256 in valid_files]
         )
-        
-        # 配置結構化輸出
-        generation_config = GenerationConfig(
-            response_mime_type="application/json",
-            response_schema=NOTION_BLOCKS_SCHEMA
-        )
-        
-        model = genai.GenerativeModel(
-            model_name=settings.GEMINI_MODEL_NAME,
-            generation_config=generation_config
-        )
-        
-        # 將 prompt 和 上傳的文件一起傳給 Gemini
-        # request_content 順序: [Prompt, File1, File2, ...]
-        request_content = [prompt]
-        if uploaded_files:
-            request_content.extend(uploaded_files)
-
-        # 使用 generate_content
-        response = await model.generate_content_async(request_content)
-        
-        # 解析結果
-        result = json.loads(response.text)
-        
+        result = await coalesce(_refine_inflight, inflight_key, lambda: model_router.run(decision, generate, timeout_scale))
+
         print(f"[GEMINI API] Success: Refined summary based on feedback.")
         return {
             "title": result.get("title", original_summary.get("title")),
@@ -249,3 +367,327 @@ async def refine_summary(
     except Exception as e:
         print(f"[GEMINI API] Failed to refine summary: {e}")
         raise RuntimeError(f"Failed to refine summary: {e}")
+
+
+async def _generate_refinement(
+    original_json: str,
+    user_feedback: str,
+    valid_files: List[Tuple[str, str]],
+    api_key: str,
+    source_names: Dict[str, str] = None,
+    patch_base: Optional[Tuple[Optional[str], List[block_ir.Block]]] = None,
+    model: str = None
+) -> dict:
+    """
+    組合 prompt 並呼叫 Gemini 生成調整後的筆記
+
+    投影片不上傳原檔，改以抽取出的文字附上；固定指示與文件在多輪 refine 間透過 context cache 重用，
+    每次只送出反饋與目前的筆記
+
+    Args:
+        original_json: 原始筆記（已過濾技術欄位）的 JSON 字串
+        user_feedback: 用戶的調整需求
+        valid_files: [(文件路徑, 內容雜湊), ...]
+        api_key: Gemini API Key
+        source_names: {文件路徑: 原始檔名}
+        patch_base: (標題, 原始 blocks)；提供時使用 patch 模式，Gemini 只輸出修改操作，
+            在本地套用到原始 blocks（patch 不合法時退回完整模式）
+        model: 使用的模型（預設 GEMINI_MODEL_NAME）
+
+    Returns:
+        Gemini 回傳的 {"title", "blocks"}
+    """
+    source_names = source_names or {}
+    decks = [(path, sha256) for path, sha256 in valid_files if slides.is_slide_deck(path)]
+    attachments = [(path, sha256) for path, sha256 in valid_files if not slides.is_slide_deck(path)]
+    deck_texts = await asyncio.gather(*[slides.extract_slides(path, sha256) for path, sha256 in decks])
+
+    slides_section = "".join(
+        f"# Slides: {source_names.get(path, os.path.basename(path))} (投影片文字)\n"
+        f"{slides.render_text(deck)}\n\n"
+        for (path, _), deck in zip(decks, deck_texts)
+    )
+
+    options = {
+        "model": model,
+        "system_instruction": _REFINE_INSTRUCTIONS,
+        "documents_text": slides_section,
+        "context_cache": settings.GEMINI_CONTEXT_CACHE,
+    }
+
+    if patch_base is not None:
+        title, blocks = patch_base
+        prompt = (
+            "# User Feedback (學生反饋)\n"
+            f"{user_feedback}\n\n"
+
+            "# Original Summary (原始筆記)\n"
+            f"{block_patch.render_numbered(title, blocks)}\n\n"
+
+            f"{_PATCH_OUTPUT}"
+        )
+        try:
+            patch = await _generate_json(prompt, attachments, api_key, NOTION_PATCH_SCHEMA, **options)
+            applied = block_patch.apply_patch(block_ir.to_notion(blocks), patch)
+        except ValueError as e:
+            print(f"[GEMINI API] Invalid patch, falling back to full output: {e}")
+        else:
+            stats = applied.pop("stats")
+            print(
+                f"[GEMINI API] Applied patch: {stats['insert_after']} insert(s), "
+                f"{stats['replace']} replace(s), {stats['delete']} delete(s)."
+            )
+            return applied
+
+    prompt = (
+        "# User Feedback (學生反饋)\n"
+        f"{user_feedback}\n\n"
+
+        "# Original Summary (原始筆記)\n"
+        f"{original_json}\n\n"
+
+        f"{_FULL_OUTPUT}"
+    )
+
+    return await _generate_notes(prompt, attachments, api_key, **options)
+
+
+async def _generate_notes(
+    prompt: str,
+    files: List[Tuple[str, str]],
+    api_key: str,
+    **options: Any
+) -> dict:
+    """
+    以 NOTION_BLOCKS_SCHEMA 生成筆記，並在本地修復常見的格式問題
+
+    Returns:
+        Gemini 回傳的 {"title", "blocks"}
+    """
+    notes = await _generate_json(prompt, files, api_key, NOTION_BLOCKS_SCHEMA, **options)
+    return block_validator.normalize_notes(notes)
+
+
+async def _generate_json(
+    prompt: str,
+    files: List[Tuple[str, str]],
+    api_key: str,
+    schema: Dict[str, Any],
+    model: str = None,
+    system_instruction: str = None,
+    documents_text: str = "",
+    context_cache: bool = False
+) -> Any:
+    """
+    以結構化輸出呼叫 Gemini
+
+    Args:
+        prompt: 每次請求不同的 prompt（反饋、目前的筆記等）
+        files: 要附上的 [(文件路徑, 內容雜湊), ...]
+        api_key: Gemini API Key
+        schema: 回應的 JSON Schema
+        model: 使用的模型（預設 GEMINI_MODEL_NAME）
+        system_instruction: 固定的指示
+        documents_text: 以文字形式附上的文件內容（例如投影片文字）
+        context_cache: 將 system_instruction 與文件放入 Gemini context cache，
+            之後相同文件的請求只送出 prompt
+
+    Returns:
+        解析後的 JSON
+
+    Raises:
+        ValueError: 回應不是合法的 JSON
+    """
+    client = gemini.get_client(api_key)
+    model = model or settings.GEMINI_MODEL_NAME
+
+    # 已預先上傳的文件會直接重用
+    handles = list(await asyncio.gather(
+        *[preupload_file(path, api_key, sha256=sha256) for path, sha256 in files]
+    ))
+    if handles:
+        print(f"[GEMINI API] Using {len(handles)} uploaded file(s).")
+    documents: List[gemini.Content] = ([documents_text] if documents_text else []) + handles
+
+    text = None
+    if context_cache and system_instruction and documents:
+        key = make_key(
+            key_fingerprint(api_key),
+            model,
+            system_instruction,
+            documents_text,
+            *[sha256 for _, sha256 in files]
+        )
+        text = await _generate_with_context_cache(client, model, key, prompt, schema, system_instruction, documents)
+
+    if text is None:
+        # request_content 順序: [Prompt, 文件文字, File1, File2, ...]
+        text = await client.generate_json(
+            model,
+            [prompt, *documents],
+            schema,
+            system_instruction=system_instruction,
+        )
+    return jsonio.loads(text)
+
+
+async def _generate_with_context_cache(
+    client: gemini.GeminiClient,
+    model: str,
+    key: str,
+    prompt: str,
+    schema: Dict[str, Any],
+    system_instruction: str,
+    documents: List[gemini.Content]
+) -> Optional[str]:
+    """
+    透過 context cache 生成：第一次建立 cache，之後只送出 prompt；
+    cache 在 Gemini 端過期時重新建立一次
+
+    Returns:
+        生成的 JSON 字串；無法使用 cache（例如文件低於 Gemini 的最小 token 數）時返回 None，由呼叫端直接送出文件
+    """
+    ttl = settings.GEMINI_CONTEXT_CACHE_TTL
+
+    async def create() -> Dict[str, Any]:
+        try:
+            entry = await client.create_cache(model, system_instruction, documents, ttl)
+        except Exception as e:
+            # 記住失敗，同一組文件在本地紀錄到期前不再嘗試
+            print(f"[GEMINI API] Context cache unavailable, sending documents inline: {e}")
+            return {"name": None, "expire_time": time.time() + ttl}
+        print(f"[GEMINI API] Created context cache {entry['name']}.")
+        return entry
+
+    for _ in range(2):
+        entry = await _context_caches.aget_or_compute(key, create)
+        if not entry["name"]:
+            return None
+        if entry["expire_time"] - time.time() < _CONTEXT_CACHE_MARGIN:
+            _context_caches.delete(key)
+            continue
+        try:
+            text = await client.generate_json(
+                model,
+                [prompt],
+                schema,
+                cached_content=entry["name"],
+            )
+        except gemini.CachedContentExpired:
+            print(f"[GEMINI API] Context cache {entry['name']} expired, re-creating.")
+            _context_caches.delete(key)
+            continue
+        print(f"[GEMINI API] Used context cache {entry['name']}.")
+        return text
+    return None
+
+
+async def _recording_segments(path: str, sha256: str) -> List[Dict[str, Any]]:
+    """
+    取得錄音的分段（上傳時已分段則直接重用），每段附上可作為上傳快取 key 的識別
+    """
+    segments = await asyncio.to_thread(audio.segment_audio, path, settings.AUDIO_SEGMENT_SECONDS)
+    return [
+        {**segment, "key": make_key(sha256, settings.AUDIO_SEGMENT_SECONDS, i)}
+        for i, segment in enumerate(segments)
+    ]
+
+
+async def _expand_recordings(files: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """將錄音替換為其分段（分段已上傳過時會直接重用 handle）"""
+    expanded = []
+    for path, sha256 in files:
+        if audio.is_audio(path):
+            expanded.extend((seg["path"], seg["key"]) for seg in await _recording_segments(path, sha256))
+        else:
+            expanded.append((path, sha256))
+    return expanded
+
+
+async def _recording_rounds(valid_files: List[Tuple[str, str]]) -> int:
+    """
+    _generate_from_recordings 依序進行的模型呼叫批次數
+
+    每個錄音的分段以 AUDIO_SUMMARY_CONCURRENCY 為一批，錄音之間依序處理；其他文件另計一次
+    """
+    recordings = [(path, sha256) for path, sha256 in valid_files if audio.is_audio(path)]
+    rounds = 1 if len(recordings) < len(valid_files) else 0
+    for path, sha256 in recordings:
+        segments = await _recording_segments(path, sha256)
+        rounds += math.ceil(len(segments) / settings.AUDIO_SUMMARY_CONCURRENCY)
+    return max(rounds, 1)
+
+
+async def _generate_from_recordings(
+    original_json: str,
+    user_feedback: str,
+    valid_files: List[Tuple[str, str]],
+    source_names: Dict[str, str],
+    api_key: str,
+    model: str = None
+) -> dict:
+    """
+    錄音逐段並行摘要（同時進行的段數受 AUDIO_SUMMARY_CONCURRENCY 限制），再依時間順序合併
+
+    其他文件（例如講義 PDF）照一般流程生成，放在錄音筆記之前
+
+    Returns:
+        合併後的 {"title", "blocks"}
+    """
+    documents = [(path, sha256) for path, sha256 in valid_files if not audio.is_audio(path)]
+    recordings = [(path, sha256) for path, sha256 in valid_files if audio.is_audio(path)]
+
+    title = None
+    blocks: List[Any] = []
+    if documents:
+        doc_result = await _generate_refinement(
+            original_json, user_feedback, documents, api_key, source_names, model=model
+        )
+        title = doc_result.get("title")
+        blocks.extend(doc_result.get("blocks", []))
+
+    semaphore = asyncio.Semaphore(settings.AUDIO_SUMMARY_CONCURRENCY)
+
+    async def summarize(name: str, segment: Dict[str, Any], index: int, total: int) -> dict:
+        span = f"{_format_timestamp(segment['start'])} – {_format_timestamp(segment['end'])}"
+        prompt = (
+            "# Role Definition\n"
+            "你是一位課堂筆記專家。附帶的是一場講座錄音中的一段，"
+            f"錄音檔「{name}」的第 {index + 1}/{total} 段（{span}）。\n\n"
+
+            "# User Feedback (學生反饋)\n"
+            f"{user_feedback}\n\n"
+
+            "# Instructions\n"
+            "**1. 範圍**：只整理這一段錄音中的內容，不要推測前後段，也不要加入開場白或總結。\n\n"
+            "**2. 格式規範**：\n"
+            f"{_FORMAT_RULES}"
+
+            "# Output Context\n"
+            "請直接輸出這一段的筆記 JSON，title 為整場講座的暫定標題。"
+        )
+        async with semaphore:
+            print(f"[GEMINI API] Summarizing {name} segment {index + 1}/{total}.")
+            return await _generate_notes(prompt, [(segment["path"], segment["key"])], api_key, model=model)
+
+    for path, sha256 in recordings:
+        name = source_names.get(path, os.path.basename(path))
+        segments = await _recording_segments(path, sha256)
+        results = await asyncio.gather(*[
+            summarize(name, segment, i, len(segments)) for i, segment in enumerate(segments)
+        ])
+
+        for segment, result in zip(segments, results):
+            title = title or result.get("title")
+            span = f"{_format_timestamp(segment['start'])} – {_format_timestamp(segment['end'])}"
+            blocks.append({
+                "object": "block",
+                "type": "heading_2",
+                "heading_2": {"rich_text": [{"type": "text", "text": {"content": f"{name}（{span}）"}}]}
+            })
+            blocks.extend(result.get("blocks", []))
+
+    merged = {"blocks": blocks}
+    if title:
+        merged["title"] = title
+    return merged
@@ -0,0 +1,101 @@
+"""
+延遲載入大型相依套件
+
+google.generativeai、reportlab、notion_client、emoji 合計需要數百毫秒才能 import 完成，
+但大部分請求（預覽、筆記查詢、靜態檔案）用不到它們。這裡以代理物件延後到第一次存取屬性時才 import，
+並可在啟動後於背景預先載入，讓冷啟動先開始服務、第一個需要它們的請求也不必等待。
+
+使用方式：
+    genai = lazy_import("google.generativeai")
+    genai.configure(api_key=...)   # 第一次存取時才真正 import
+"""
+import importlib
+import threading
+import time
+from types import ModuleType
+from typing import Dict, Iterable, List, Optional
+
+_registry: Dict[str, "LazyModule"] = {}
+_registry_lock = threading.Lock()
+
+
+class LazyModule:
+    """模組代理：第一次存取屬性時才 import"""
+
+    __slots__ = ("_name", "_module", "_lock")
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """取得模組的延遲載入代理（同名模組共用同一個代理）"""
+    with _registry_lock:
+        module = _registry.get(name)
+        if module is None:
+            module = _registry[name] = LazyModule(name)
+        return module
+
+
+def registered() -> List[str]:
+    with _registry_lock:
+        return list(_registry)
+
+
+def prewarm(names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """
+    依序載入模組（預設為所有已註冊的延遲模組）
+
+    Returns:
+        {模組名稱: 載入耗時（秒）}；載入失敗的模組不列入（第一次使用時會再拋出錯誤）
+    """
+    timings = {}
+    for name in names if names is not None else registered():
+        module = lazy_import(name)
+        if module.loaded:
+            continue
+        start = time.perf_counter()
+        try:
+            module.load()
+        except Exception as e:
+            print(f"[LOADER] Failed to prewarm {name}: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def prewarm_in_background(names: Optional[Iterable[str]] = None) -> threading.Thread:
+    """在 daemon thread 中執行 prewarm，不延遲啟動"""
+    names = list(names) if names is not None else None
+
+    def run() -> None:
+        timings = prewarm(names)
+        if timings:
+            detail = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings.items())
+            print(f"[LOADER] Prewarmed {detail}")
+
+    thread = threading.Thread(target=run, name="module-prewarm", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,148 @@
+"""
+refine 的模型分級路由
+
+依請求特徵選擇 settings.MODEL_TIERS 中的等級：
+- deep：重度分析的選項指令（ROUTING_DEEP_OPTIONS，預設選項 C / D）
+- fast：已有筆記上的小幅修改（反饋短、非選項指令、筆記與附件都不大）
+- standard：其他情況
+
+每個等級有延遲預算（超過時只記錄）與逾時（逾時後改用 fallback 等級重試一次；
+包含多次依序呼叫的工作，例如長錄音的逐段摘要，由呼叫端以 timeout_scale 放大），
+路由決策與各等級的延遲統計可由 stats() 取得
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import settings
+
+
+class RouteDecision:
+    """一次路由的結果"""
+
+    __slots__ = ("tier", "model", "reason")
+
+    def __init__(self, tier: str, reason: str):
+        self.tier = tier
+        self.model = settings.MODEL_TIERS[tier]["model"]
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f"RouteDecision({self.tier!r}, {self.model!r}, {self.reason!r})"
+
+
+_lock = threading.Lock()
+_decisions: Dict[str, Dict[str, int]] = {}
+_latency: Dict[str, Dict[str, float]] = {}
+
+
+def _record_decision(decision: RouteDecision) -> None:
+    with _lock:
+        reasons = _decisions.setdefault(decision.tier, {})
+        reasons[decision.reason] = reasons.get(decision.reason, 0) + 1
+
+
+def _record_call(tier: str, seconds: float, outcome: str) -> None:
+    with _lock:
+        entry = _latency.setdefault(tier, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "over_budget": 0, "timeouts": 0, "errors": 0})
+        entry["calls"] += 1
+        entry["total_seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        if seconds > settings.MODEL_TIERS[tier]["latency_budget"]:
+            entry["over_budget"] += 1
+        if outcome == "timeout":
+            entry["timeouts"] += 1
+        elif outcome == "error":
+            entry["errors"] += 1
+
+
+def route(
+    feedback: str,
+    option: Optional[str],
+    is_initial: bool,
+    block_count: int,
+    attachment_bytes: int
+) -> RouteDecision:
+    """
+    依請求特徵選擇模型等級
+
+    Args:
+        feedback: 用戶反饋
+        option: 反饋中的選項指令（A~E），沒有時為 None
+        is_initial: 是否為上傳後的第一次分析
+        block_count: 目前筆記的 block 數
+        attachment_bytes: 附件總大小
+    """
+    if not settings.MODEL_ROUTING:
+        decision = RouteDecision("standard", "routing_disabled")
+    elif option and option in settings.ROUTING_DEEP_OPTIONS:
+        decision = RouteDecision("deep", f"option_{option}")
+    elif option or is_initial:
+        decision = RouteDecision("standard", "full_analysis")
+    elif len(feedback) > settings.ROUTING_FAST_MAX_FEEDBACK_CHARS:
+        decision = RouteDecision("standard", "long_feedback")
+    elif block_count > settings.ROUTING_FAST_MAX_BLOCKS:
+        decision = RouteDecision("standard", "large_note")
+    elif attachment_bytes > settings.ROUTING_FAST_MAX_ATTACHMENT_MB * 1024 * 1024:
+        decision = RouteDecision("standard", "large_attachments")
+    else:
+        decision = RouteDecision("fast", "small_edit")
+    _record_decision(decision)
+    return decision
+
+
+async def run(
+    decision: RouteDecision,
+    call: Callable[[str], Awaitable[Any]],
+    timeout_scale: float = 1.0
+) -> Any:
+    """
+    以選定的模型執行 call(model)，套用該等級的逾時（乘以 timeout_scale）
+
+    逾時時若該等級設定了 fallback，改用 fallback 等級重試一次
+
+    Args:
+        timeout_scale: call 內依序進行的模型呼叫次數（逾時以此倍數放大）
+
+    Raises:
+        TimeoutError: 逾時且沒有 fallback（或 fallback 也逾時）
+    """
+    tier = decision.tier
+    while True:
+        config = settings.MODEL_TIERS[tier]
+        timeout = config["timeout"] * timeout_scale
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(call(config["model"]), timeout=timeout)
+        except asyncio.TimeoutError:
+            _record_call(tier, time.perf_counter() - start, "timeout")
+            fallback = config.get("fallback")
+            if not fallback:
+                raise TimeoutError(f"{config['model']} did not respond within {timeout:g}s")
+            print(f"[ROUTER] {tier} tier timed out after {timeout:g}s, retrying on {fallback}.")
+            tier = fallback
+            continue
+        except Exception:
+            _record_call(tier, time.perf_counter() - start, "error")
+            raise
+        _record_call(tier, time.perf_counter() - start, "ok")
+        return result
+
+
+def stats() -> Dict[str, Any]:
+    """路由決策次數（依等級與原因）與各等級的呼叫延遲"""
+    with _lock:
+        latency = {
+            tier: {
+                **entry,
+                "avg_seconds": entry["total_seconds"] / entry["calls"] if entry["calls"] else 0.0,
+                "latency_budget": settings.MODEL_TIERS[tier]["latency_budget"],
+            }
+            for tier, entry in _latency.items()
+        }
+        return {
+            "tiers": {tier: dict(config) for tier, config in settings.MODEL_TIERS.items()},
+            "decisions": {tier: dict(reasons) for tier, reasons in _decisions.items()},
+            "latency": latency,
+        }
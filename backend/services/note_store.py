@@ -0,0 +1,411 @@
+"""
+筆記版本庫
+
+以 SQLite 保存每次 refine 的結果，每次保存都是一個新版本：
+- notes：每份筆記一列，記錄最新版本號，索引最近更新時間與來源文件雜湊
+- note_files：筆記與每個來源文件雜湊的對應（依單一文件查詢筆記）
+- note_versions：每個版本引用的 block 列表（20 bytes 的 SHA-1 依序串接）
+- note_blocks：內容定址的 block（zlib 壓縮的 JSON），版本之間未改變的 block 只存一份
+- note_search：最新版本的全文索引（見 services.search）
+- notion_sync：筆記同步到 Notion 的頁面與 block id（增量同步用）
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from . import jsonio, search
+
+_DIGEST_SIZE = 20
+# 單次 IN 查詢的最大參數數量
+_QUERY_BATCH = 500
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_initialized_paths: set = set()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    source_hash TEXT,
+    files TEXT NOT NULL DEFAULT '[]',
+    file_hashes TEXT NOT NULL DEFAULT '[]',
+    current_version INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_notes_updated ON notes (updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_notes_source ON notes (source_hash, updated_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS note_files (
+    sha256 TEXT NOT NULL,
+    note_id TEXT NOT NULL,
+    PRIMARY KEY (sha256, note_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS note_versions (
+    note_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    block_refs BLOB NOT NULL,
+    block_count INTEGER NOT NULL,
+    feedback TEXT,
+    restored_from INTEGER,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (note_id, version)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS note_blocks (
+    hash BLOB PRIMARY KEY,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS notion_sync (
+    note_id TEXT NOT NULL,
+    database_id TEXT NOT NULL,
+    page_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    blocks TEXT,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (note_id, database_id)
+) WITHOUT ROWID;
+"""
+
+
+class NoteNotFound(Exception):
+    """筆記或版本不存在"""
+
+
+def _connect() -> sqlite3.Connection:
+    """每個 thread 一個連線（WAL 模式，讀寫可同時進行）"""
+    path = settings.NOTE_STORE_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        conns[path] = conn
+
+    with _schema_lock:
+        if path not in _initialized_paths:
+            has_note_files = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'note_files'"
+            ).fetchone() is not None
+            conn.executescript(_SCHEMA)
+            conn.executescript(search.SEARCH_SCHEMA)
+            if not has_note_files:
+                _backfill_note_files(conn)
+            _initialized_paths.add(path)
+    return conn
+
+
+def _backfill_note_files(conn: sqlite3.Connection) -> None:
+    """舊版資料庫沒有 note_files：由 notes.file_hashes 建立對應"""
+    rows = conn.execute("SELECT id, file_hashes FROM notes").fetchall()
+    conn.executemany(
+        "INSERT OR IGNORE INTO note_files (sha256, note_id) VALUES (?, ?)",
+        [(sha256, row["id"]) for row in rows for sha256 in json.loads(row["file_hashes"])],
+    )
+
+
+def source_hash(file_hashes: List[str]) -> Optional[str]:
+    """由來源文件的雜湊組成筆記的來源識別（與文件順序無關）"""
+    if not file_hashes:
+        return None
+    return hashlib.sha256("\n".join(sorted(file_hashes)).encode("utf-8")).hexdigest()
+
+
+def _encode_block(block: Any) -> tuple:
+    data = jsonio.dumps(block, sort_keys=True)
+    return hashlib.sha1(data).digest(), zlib.compress(data)
+
+
+def _write_blocks(conn: sqlite3.Connection, blocks: List[Any]) -> bytes:
+    """寫入尚未存在的 block，返回依序串接的 block 雜湊"""
+    encoded = [_encode_block(block) for block in blocks]
+    conn.executemany(
+        "INSERT OR IGNORE INTO note_blocks (hash, data) VALUES (?, ?)",
+        encoded,
+    )
+    return b"".join(digest for digest, _ in encoded)
+
+
+def _read_blocks(conn: sqlite3.Connection, block_refs: bytes) -> List[Any]:
+    digests = [block_refs[i:i + _DIGEST_SIZE] for i in range(0, len(block_refs), _DIGEST_SIZE)]
+    unique = list(dict.fromkeys(digests))
+
+    found: Dict[bytes, Any] = {}
+    for start in range(0, len(unique), _QUERY_BATCH):
+        batch = unique[start:start + _QUERY_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        rows = conn.execute(
+            f"SELECT hash, data FROM note_blocks WHERE hash IN ({placeholders})",
+            batch,
+        )
+        for row in rows:
+            found[bytes(row["hash"])] = jsonio.loads(zlib.decompress(row["data"]))
+
+    return [found[digest] for digest in digests]
+
+
+def _note_summary(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "note_id": row["id"],
+        "title": row["title"],
+        "source_hash": row["source_hash"],
+        "files": json.loads(row["files"]),
+        "version": row["current_version"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def save_version(
+    note_id: Optional[str],
+    title: str,
+    blocks: List[Any],
+    files: Optional[List[str]] = None,
+    file_hashes: Optional[List[str]] = None,
+    feedback: Optional[str] = None,
+    restored_from: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    將筆記內容保存為新版本；note_id 為空或不存在時建立新筆記
+
+    Returns:
+        {"note_id": ..., "version": ...}
+    """
+    conn = _connect()
+    now = time.time()
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = None
+        if note_id:
+            row = conn.execute(
+                "SELECT current_version FROM notes WHERE id = ?", (note_id,)
+            ).fetchone()
+
+        block_refs = _write_blocks(conn, blocks)
+
+        if row is None:
+            note_id = note_id or uuid.uuid4().hex
+            version = 1
+            conn.execute(
+                "INSERT INTO notes (id, title, source_hash, files, file_hashes, current_version, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    note_id,
+                    title,
+                    source_hash(file_hashes or []),
+                    json.dumps(files or [], ensure_ascii=False),
+                    json.dumps(file_hashes or []),
+                    version,
+                    now,
+                    now,
+                ),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO note_files (sha256, note_id) VALUES (?, ?)",
+                [(sha256, note_id) for sha256 in file_hashes or []],
+            )
+        else:
+            version = row["current_version"] + 1
+            conn.execute(
+                "UPDATE notes SET title = ?, current_version = ?, updated_at = ? WHERE id = ?",
+                (title, version, now, note_id),
+            )
+
+        conn.execute(
+            "INSERT INTO note_versions (note_id, version, title, block_refs, block_count, feedback, restored_from, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (note_id, version, title, block_refs, len(blocks), feedback, restored_from, now),
+        )
+        # 全文索引只保存最新版本
+        search.index_note(conn, note_id, title, blocks)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+    return {"note_id": note_id, "version": version}
+
+
+def list_notes(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    source: Optional[str] = None,
+    file_hash: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    依最近更新時間列出筆記（keyset 分頁，不因資料量增加而變慢）
+
+    Args:
+        limit: 每頁筆數
+        cursor: 上一頁返回的 next_cursor
+        source: 只列出指定來源雜湊（所有來源文件的組合，見 source_hash）的筆記
+        file_hash: 只列出來源文件包含此文件（上傳回應 file_hashes 中的 SHA-256）的筆記
+
+    Returns:
+        {"notes": [...], "next_cursor": 下一頁的 cursor 或 None}
+    """
+    limit = max(1, min(limit, 200))
+    conditions, params = [], []
+
+    if source:
+        conditions.append("source_hash = ?")
+        params.append(source)
+    if file_hash:
+        conditions.append("id IN (SELECT note_id FROM note_files WHERE sha256 = ?)")
+        params.append(file_hash)
+    if cursor:
+        updated_at, _, last_id = cursor.partition(":")
+        conditions.append("(updated_at < ? OR (updated_at = ? AND id < ?))")
+        params.extend([float(updated_at), float(updated_at), last_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = _connect().execute(
+        f"SELECT * FROM notes {where} ORDER BY updated_at DESC, id DESC LIMIT ?",
+        [*params, limit + 1],
+    ).fetchall()
+
+    notes = [_note_summary(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = f"{last['updated_at']!r}:{last['id']}"
+
+    return {"notes": notes, "next_cursor": next_cursor}
+
+
+def get_note(note_id: str, version: Optional[int] = None) -> Dict[str, Any]:
+    """
+    取得筆記的指定版本（預設最新版本）
+
+    Raises:
+        NoteNotFound: 筆記或版本不存在
+    """
+    conn = _connect()
+    note = conn.execute("SELECT * FROM notes WHERE id = ?", (note_id,)).fetchone()
+    if note is None:
+        raise NoteNotFound(f"Note not found: {note_id}")
+
+    version = version or note["current_version"]
+    row = conn.execute(
+        "SELECT * FROM note_versions WHERE note_id = ? AND version = ?",
+        (note_id, version),
+    ).fetchone()
+    if row is None:
+        raise NoteNotFound(f"Version {version} not found for note {note_id}")
+
+    return {
+        **_note_summary(note),
+        "version": version,
+        "current_version": note["current_version"],
+        "title": row["title"],
+        "blocks": _read_blocks(conn, row["block_refs"]),
+        "file_hashes": json.loads(note["file_hashes"]),
+        "feedback": row["feedback"],
+        "restored_from": row["restored_from"],
+        "version_created_at": row["created_at"],
+    }
+
+
+def list_versions(note_id: str) -> List[Dict[str, Any]]:
+    """
+    列出筆記的所有版本（不含 block 內容，新到舊）
+
+    Raises:
+        NoteNotFound: 筆記不存在
+    """
+    conn = _connect()
+    if conn.execute("SELECT 1 FROM notes WHERE id = ?", (note_id,)).fetchone() is None:
+        raise NoteNotFound(f"Note not found: {note_id}")
+
+    rows = conn.execute(
+        "SELECT version, title, block_count, feedback, restored_from, created_at "
+        "FROM note_versions WHERE note_id = ? ORDER BY version DESC",
+        (note_id,),
+    )
+    return [dict(row) for row in rows]
+
+
+def restore_version(note_id: str, version: int) -> Dict[str, Any]:
+    """
+    將舊版本複製為新的最新版本（保留完整歷史）
+
+    Returns:
+        {"note_id": ..., "version": 新版本號}
+
+    Raises:
+        NoteNotFound: 筆記或版本不存在
+    """
+    note = get_note(note_id, version)
+    return save_version(
+        note_id,
+        note["title"],
+        note["blocks"],
+        restored_from=version,
+    )
+
+
+def search_notes(query: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """全文檢索筆記的最新版本（見 services.search）"""
+    return search.search(_connect(), query, limit=max(1, min(limit, 100)))
+
+
+def get_notion_sync(note_id: str, database_id: str) -> Optional[Dict[str, Any]]:
+    """
+    取得筆記上次同步到 Notion 的紀錄
+
+    Returns:
+        {"page_id", "title", "blocks": [[block_id, 指紋, 類型], ...] 或 None（需要整頁重寫）}，沒有紀錄時為 None
+    """
+    row = _connect().execute(
+        "SELECT page_id, title, blocks, synced_at FROM notion_sync WHERE note_id = ? AND database_id = ?",
+        (note_id, database_id),
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "page_id": row["page_id"],
+        "title": row["title"],
+        "blocks": jsonio.loads(row["blocks"]) if row["blocks"] is not None else None,
+        "synced_at": row["synced_at"],
+    }
+
+
+def save_notion_sync(
+    note_id: str,
+    database_id: str,
+    page_id: str,
+    title: str,
+    blocks: Optional[List[List[str]]]
+) -> None:
+    """保存同步紀錄；blocks 為 None 表示 Notion 頁面內容未知，下次同步時整頁重寫"""
+    _connect().execute(
+        "INSERT OR REPLACE INTO notion_sync (note_id, database_id, page_id, title, blocks, synced_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            note_id,
+            database_id,
+            page_id,
+            title,
+            jsonio.dumps_str(blocks) if blocks is not None else None,
+            time.time(),
+        ),
+    )
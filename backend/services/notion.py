@@ -1,14 +1,294 @@
+import difflib
 import logging
-from notion_client import Client
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
 from config import settings
+from services import block_ir
+from services.block_ir import Block
+from services.cache import key_fingerprint
+from services.loader import lazy_import
+
+# notion_client 只在同步到 Notion 時才 import
+notion_client = lazy_import("notion_client")
+notion_errors = lazy_import("notion_client.errors")
 
 # Initialize Notion Client
 # Global init removed, dynamic init in function
 
+# Notion API 單次 append 的 children 上限
+NOTION_BATCH_SIZE = 100
+# Notion API 平均每秒 3 個請求（NOTION_REQUESTS_PER_SECOND）
+_MIN_INTERVAL = 1 / settings.NOTION_REQUESTS_PER_SECOND
+_MAX_RETRIES = 4
+
+# Notion 的速率限制以 integration（API Key）計算：每個 Key 各自排隊
+_rate_lock = threading.Lock()
+_next_slots: Dict[str, float] = {}
+_MAX_TRACKED_KEYS = 256
+
+
+def _throttle(key: str) -> None:
+    """同一個 API Key 的 Notion 請求共用的速率限制"""
+    with _rate_lock:
+        now = time.monotonic()
+        if len(_next_slots) >= _MAX_TRACKED_KEYS:
+            # 已經過了排定時間的 Key 不需要再保留
+            for stale in [k for k, slot in _next_slots.items() if slot <= now]:
+                del _next_slots[stale]
+        next_slot = _next_slots.get(key, 0.0)
+        wait = next_slot - now
+        _next_slots[key] = max(now, next_slot) + _MIN_INTERVAL
+    if wait > 0:
+        time.sleep(wait)
+
+
+def _is_error(error: Exception, code: str) -> bool:
+    return isinstance(error, notion_errors.APIResponseError) and getattr(error.code, "value", error.code) == code
+
+
+class _SyncSession:
+    """一次同步過程中的 API 呼叫（限速、429 重試與統計）"""
+
+    def __init__(self, client: Any, api_key: str):
+        self.client = client
+        self.key = key_fingerprint(api_key)
+        self.stats = {"calls": 0, "appended": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+
+    def call(self, fn, **kwargs) -> Any:
+        for attempt in range(_MAX_RETRIES):
+            _throttle(self.key)
+            self.stats["calls"] += 1
+            try:
+                return fn(**kwargs)
+            except notion_errors.APIResponseError as e:
+                if not _is_error(e, "rate_limited") or attempt == _MAX_RETRIES - 1:
+                    raise
+                headers = getattr(e, "headers", None) or {}
+                delay = float(headers.get("retry-after", 2 ** attempt))
+                logging.warning(f"Notion rate limited, retrying in {delay}s")
+                time.sleep(delay)
+
+    def append(self, parent_id: str, blocks: List[Block], after: Optional[str]) -> List[str]:
+        """依序 append blocks（每次最多 NOTION_BATCH_SIZE 個），返回新 block 的 id"""
+        ids: List[str] = []
+        for start in range(0, len(blocks), NOTION_BATCH_SIZE):
+            kwargs: Dict[str, Any] = {
+                "block_id": parent_id,
+                "children": block_ir.to_notion(blocks[start:start + NOTION_BATCH_SIZE]),
+            }
+            if after:
+                kwargs["after"] = after
+            response = self.call(self.client.blocks.children.append, **kwargs)
+            # 指定 after 時回傳的 results 可能包含其後既有的 block，只取新建立的部分
+            created = [r["id"] for r in response["results"]][:len(kwargs["children"])]
+            ids.extend(created)
+            after = created[-1] if created else after
+        self.stats["appended"] += len(blocks)
+        return ids
+
+    def update(self, block_id: str, block: Block) -> None:
+        payload = block_ir.block_to_notion(block)[block.kind]
+        payload.pop("children", None)
+        self.call(self.client.blocks.update, block_id=block_id, **{block.kind: payload})
+        self.stats["updated"] += 1
+
+    def delete(self, block_id: str) -> None:
+        try:
+            self.call(self.client.blocks.delete, block_id=block_id)
+        except notion_errors.APIResponseError as e:
+            # 已被使用者在 Notion 中刪除
+            if not _is_error(e, "object_not_found"):
+                raise
+        self.stats["deleted"] += 1
+
+    def page_alive(self, page_id: str) -> bool:
+        """頁面仍存在且不在垃圾桶中"""
+        try:
+            page = self.call(self.client.pages.retrieve, page_id=page_id)
+        except notion_errors.APIResponseError as e:
+            if not _is_error(e, "object_not_found"):
+                raise
+            return False
+        return not (page.get("archived") or page.get("in_trash"))
+
+    def archive_page(self, page_id: str) -> None:
+        """整頁重寫後把舊頁面移到垃圾桶（失敗時只記錄，不影響新頁面）"""
+        try:
+            self.call(self.client.pages.update, page_id=page_id, archived=True)
+        except notion_errors.APIResponseError as e:
+            logging.warning(f"Failed to archive old Notion page {page_id}: {e}")
+
+
+def _diff_sync(
+    session: _SyncSession,
+    page_id: str,
+    previous: List[List[str]],
+    blocks: List[Block],
+    fingerprints: List[str]
+) -> Optional[List[str]]:
+    """
+    依 block 指紋計算差異，只送出需要的 append / update / delete
+
+    Args:
+        previous: 上次同步的 [[block_id, 指紋, 類型], ...]
+
+    Returns:
+        新的 block id 列表；無法在頁面最前面插入（Notion 只支援 after）時返回 None，由呼叫端整頁重寫
+    """
+    old_ids = [block_id for block_id, _, _ in previous]
+    old_kinds = [kind for _, _, kind in previous]
+    matcher = difflib.SequenceMatcher(
+        None, [fp for _, fp, _ in previous], fingerprints, autojunk=False
+    )
+
+    # 每個新位置的動作：("keep" | "update", 既有 id) 或 ("insert", None)
+    actions: List[Tuple[str, Optional[str]]] = []
+    to_delete: List[str] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            actions.extend(("keep", old_ids[i]) for i in range(i1, i2))
+            continue
+        paired = min(i2 - i1, j2 - j1) if tag == "replace" else 0
+        for k in range(paired):
+            i, j = i1 + k, j1 + k
+            # 類型相同時直接更新內容（toggle 的 children 無法透過 update 修改）
+            if old_kinds[i] == blocks[j].kind and blocks[j].kind != "toggle":
+                actions.append(("update", old_ids[i]))
+            else:
+                to_delete.append(old_ids[i])
+                actions.append(("insert", None))
+        to_delete.extend(old_ids[i1 + paired:i2])
+        actions.extend(("insert", None) for _ in range(j1 + paired, j2))
+
+    # Notion 只能插入在某個 block 之後：最前面有新 block 時，把第一個保留的 block
+    # 改寫成新的第一個 block，原本的內容再插入到它後面
+    first_kept = next((j for j, (action, _) in enumerate(actions) if action != "insert"), None)
+    if actions and actions[0][0] == "insert" and first_kept is not None:
+        kept_id = actions[first_kept][1]
+        if old_kinds[old_ids.index(kept_id)] != blocks[0].kind or blocks[0].kind == "toggle":
+            return None
+        actions[first_kept] = ("insert", None)
+        actions[0] = ("update", kept_id)
+
+    new_ids: List[str] = []
+    pending: List[Block] = []
+
+    def flush() -> None:
+        if pending:
+            new_ids.extend(session.append(page_id, pending, new_ids[-1] if new_ids else None))
+            pending.clear()
+
+    for j, (action, block_id) in enumerate(actions):
+        if action == "insert":
+            pending.append(blocks[j])
+            continue
+        flush()
+        if action == "update":
+            session.update(block_id, blocks[j])
+        else:
+            session.stats["unchanged"] += 1
+        new_ids.append(block_id)
+    flush()
+
+    for block_id in to_delete:
+        session.delete(block_id)
+    return new_ids
+
+
+def sync_notion_page(
+    title: str,
+    blocks: List[Any],
+    api_key: str = None,
+    database_id: str = None,
+    state: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    將筆記同步到 Notion 頁面
+
+    沒有同步紀錄時建立新頁面；有紀錄時以 block 指紋與上次同步的內容比較，
+    只送出變動的部分。頁面已被刪除或移到垃圾桶時重新建立；無法就地插入到最前面、
+    或既有的 block 已被刪除時整頁重寫：建立新頁面後把舊頁面移到垃圾桶，
+    不逐一刪除舊 block。
+
+    Args:
+        title: 頁面標題
+        blocks: IR 或 Notion 格式的 blocks
+        api_key: Notion API Key
+        database_id: Notion Database ID
+        state: 上次同步的紀錄 {"page_id", "title", "blocks": [[block_id, 指紋, 類型], ...] 或 None}
+
+    Returns:
+        {"page_id", "title", "blocks": [[block_id, 指紋, 類型], ...], "stats": {...}}
+
+    Raises:
+        ValueError: 缺少 API Key 或 Database ID
+        APIResponseError: Notion API 錯誤
+    """
+    if not api_key or not database_id:
+        raise ValueError("Notion API Key and Database ID are required.")
+
+    # 合併零碎的 rich_text 並切分超過 Notion 上限的內容，避免整個請求被拒絕
+    ir_blocks = block_ir.normalize_spans(block_ir.from_notion(blocks))
+    fingerprints = [block.fingerprint().hex() for block in ir_blocks]
+    session = _SyncSession(notion_client.Client(auth=api_key, base_url=settings.NOTION_API_BASE), api_key)
+
+    page_id = state.get("page_id") if state else None
+    block_ids: Optional[List[str]] = None
+    # 整頁重寫時要移到垃圾桶的舊頁面
+    replaced: Optional[str] = None
+
+    if page_id and not session.page_alive(page_id):
+        logging.warning(f"Notion page {page_id} was deleted, creating a new one")
+        page_id = None
+
+    if page_id:
+        try:
+            if state.get("title") != title:
+                session.call(
+                    session.client.pages.update,
+                    page_id=page_id,
+                    properties={"Name": {"title": block_ir.title_to_notion(title)}},
+                )
+            previous = state.get("blocks")
+            if previous is not None:
+                block_ids = _diff_sync(session, page_id, previous, ir_blocks, fingerprints)
+        except notion_errors.APIResponseError as e:
+            # 上次同步的 block 已被刪除（404）或封存（400 validation_error）
+            if not (_is_error(e, "object_not_found") or _is_error(e, "validation_error")):
+                raise
+            logging.warning(f"Notion page {page_id} changed outside of sync, rewriting it: {e}")
+            block_ids = None
+        if block_ids is None:
+            # 沒有可信的同步紀錄或無法就地更新：改寫到新頁面
+            replaced, page_id = page_id, None
+
+    if not page_id:
+        page = session.call(
+            session.client.pages.create,
+            parent={"database_id": database_id},
+            properties={
+                "Name": {"title": block_ir.title_to_notion(title)},
+            },
+        )
+        page_id = page["id"]
+        block_ids = session.append(page_id, ir_blocks, None)
+        if replaced:
+            session.archive_page(replaced)
+
+    return {
+        "page_id": page_id,
+        "title": title,
+        "blocks": [[block_id, fp, block.kind] for block_id, fp, block in zip(block_ids, fingerprints, ir_blocks)],
+        "stats": session.stats,
+    }
+
+
 def create_notion_page(
-    title: str, 
-    blocks: list, 
-    api_key: str = None, 
+    title: str,
+    blocks: list,
+    api_key: str = None,
     database_id: str = None
 ):
     """
@@ -16,7 +296,7 @@ def create_notion_page(
 
     Args:
         title: Page title
-        blocks: List of Notion block objects (generated by Gemini)
+        blocks: Blocks in IR or Notion format (generated by Gemini)
         api_key: Notion API Key
         database_id: Notion Database ID
     """
@@ -24,15 +304,7 @@ def create_notion_page(
         return "Error: Notion API Key and Database ID are required."
 
     try:
-        notion = Client(auth=api_key)
-        # Create the page with Gemini-generated blocks
-        notion.pages.create(
-            parent={"database_id": database_id},
-            properties={
-                "Name": {"title": [{"text": {"content": title}}]},
-            },
-            children=blocks  # 直接使用 Gemini 生成的 Notion blocks
-        )
+        sync_notion_page(title, blocks, api_key=api_key, database_id=database_id)
         return "Success: Page created in Notion!"
     except Exception as e:
         logging.error(f"Notion Error: {e}")
@@ -1,7 +1,25 @@
+import asyncio
+import hashlib
 import os
 import tempfile
+import uuid
+from typing import Callable, Dict, Any, Optional
 from fastapi import UploadFile
 
+from config import settings
+from . import audio, document
+
+
+def _new_temp_path(filename: str) -> str:
+    """在 uploads/temp 下產生唯一的檔案路徑"""
+    suffix = os.path.splitext(filename)[1]
+    # save to backend/uploads/temp
+    upload_dir = os.path.join(os.getcwd(), "uploads", "temp")
+    os.makedirs(upload_dir, exist_ok=True)
+
+    # Generate unique filename
+    return os.path.join(upload_dir, f"{uuid.uuid4()}{suffix}")
+
 
 def save_upload_to_temp(file: UploadFile) -> str:
     """
@@ -13,21 +31,67 @@ def save_upload_to_temp(file: UploadFile) -> str:
     Returns:
         臨時文件的絕對路徑
     """
-    suffix = os.path.splitext(file.filename)[1]
-    # save to backend/uploads/temp
-    upload_dir = os.path.join(os.getcwd(), "uploads", "temp")
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Generate unique filename
-    import uuid
-    filename = f"{uuid.uuid4()}{suffix}"
-    file_path = os.path.join(upload_dir, filename)
+    file_path = _new_temp_path(file.filename)
 
     with open(file_path, "wb") as f:
         f.write(file.file.read())
-    
+
     return file_path
 
+
+async def save_upload_streaming(
+    file: UploadFile,
+    on_progress: Optional[Callable[[int], None]] = None
+) -> Dict[str, Any]:
+    """
+    以固定大小的區塊串流保存 UploadFile，寫入的同時計算 SHA-256
+
+    Args:
+        file: FastAPI UploadFile 對象
+        on_progress: 每寫完一個區塊時以「已接收 bytes 數」回呼
+
+    Returns:
+        {"path": 臨時文件路徑, "sha256": 內容雜湊, "size": 檔案大小}
+    """
+    file_path = _new_temp_path(file.filename)
+    digest = hashlib.sha256()
+    received = 0
+
+    try:
+        with open(file_path, "wb") as f:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                # 磁碟寫入交給 thread，避免阻塞 event loop
+                await asyncio.to_thread(f.write, chunk)
+                received += len(chunk)
+                if on_progress:
+                    on_progress(received)
+    except BaseException:
+        cleanup_temp_file(file_path)
+        raise
+
+    return {"path": file_path, "sha256": digest.hexdigest(), "size": received}
+
+
+def extract_pdf_metadata(path: str) -> Dict[str, Any]:
+    """
+    讀取 PDF 的基本資訊（不做完整解析；透過共用的 DocumentHandle，結果會快取）
+
+    Args:
+        path: PDF 文件路徑
+
+    Returns:
+        {"pages": 頁數}
+
+    Raises:
+        ValueError: 文件不是有效的 PDF
+    """
+    return document.open_document(path).pdf_metadata()
+
+
 def cleanup_temp_file(path: str) -> None:
     """
     清理臨時文件
@@ -35,5 +99,9 @@ def cleanup_temp_file(path: str) -> None:
     Args:
         path: 文件路徑
     """
+    document.release(path)
     if os.path.exists(path):
         os.remove(path)
+    # 錄音的分段檔案
+    if audio.is_audio(path):
+        audio.cleanup_segments(path)
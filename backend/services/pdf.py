@@ -2,21 +2,42 @@
 PDF 生成服務
 使用 reportlab 將 Notion Blocks 轉換為 PDF
 """
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Preformatted
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_LEFT
 from io import BytesIO
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Union
 import os
-import emoji
+import threading
+
+from config import settings
+from . import block_ir
+from .block_ir import Block, Span
+from .cache import MemoryLRUCache, make_key
+from .loader import lazy_import
+
+# reportlab 與 emoji 載入較慢，第一次生成 PDF 時才 import
+pagesizes = lazy_import("reportlab.lib.pagesizes")
+rl_styles = lazy_import("reportlab.lib.styles")
+units = lazy_import("reportlab.lib.units")
+platypus = lazy_import("reportlab.platypus")
+pdfmetrics = lazy_import("reportlab.pdfbase.pdfmetrics")
+ttfonts = lazy_import("reportlab.pdfbase.ttfonts")
+emoji = lazy_import("emoji")
+pypdf = lazy_import("pypdf")
+
+
+_font_lock = threading.Lock()
+_registered_font = None
 
 
 def register_fonts():
-    """註冊中文字體"""
+    """註冊中文字體（只在第一次呼叫時載入字體檔，PDF 會在多個 thread 中同時生成）"""
+    global _registered_font
+    with _font_lock:
+        if _registered_font is None:
+            _registered_font = _load_chinese_font()
+        return _registered_font
+
+
+def _load_chinese_font():
     chinese_font = 'Helvetica'
     font_paths = [
         # Linux System Fonts (AR PL UMing - Docker 安裝的 TrueType 字體)
@@ -35,7 +56,7 @@ def register_fonts():
     for font_path in font_paths:
         if os.path.exists(font_path):
             try:
-                pdfmetrics.registerFont(TTFont('ChineseFont', font_path, subfontIndex=0))
+                pdfmetrics.registerFont(ttfonts.TTFont('ChineseFont', font_path, subfontIndex=0))
                 chinese_font = 'ChineseFont'
                 print(f"✅ 成功載入字體: {font_path}")
                 break
@@ -64,10 +85,10 @@ def remove_emojis(text: str) -> str:
 
 def get_styles(font_name: str):
     """取得帶有中文字體的樣式"""
-    styles = getSampleStyleSheet()
+    styles = rl_styles.getSampleStyleSheet()
     
     # 標題樣式
-    styles.add(ParagraphStyle(
+    styles.add(rl_styles.ParagraphStyle(
         name='ChineseTitle',
         fontName=font_name,
         fontSize=18,
@@ -76,7 +97,7 @@ def get_styles(font_name: str):
     ))
     
     # H2 樣式
-    styles.add(ParagraphStyle(
+    styles.add(rl_styles.ParagraphStyle(
         name='ChineseH2',
         fontName=font_name,
         fontSize=14,
@@ -86,7 +107,7 @@ def get_styles(font_name: str):
     ))
     
     # H3 樣式
-    styles.add(ParagraphStyle(
+    styles.add(rl_styles.ParagraphStyle(
         name='ChineseH3',
         fontName=font_name,
         fontSize=12,
@@ -96,7 +117,7 @@ def get_styles(font_name: str):
     ))
     
     # 正文樣式
-    styles.add(ParagraphStyle(
+    styles.add(rl_styles.ParagraphStyle(
         name='ChineseBody',
         fontName=font_name,
         fontSize=10,
@@ -105,7 +126,7 @@ def get_styles(font_name: str):
     ))
     
     # 引用樣式
-    styles.add(ParagraphStyle(
+    styles.add(rl_styles.ParagraphStyle(
         name='ChineseQuote',
         fontName=font_name,
         fontSize=10,
@@ -116,7 +137,7 @@ def get_styles(font_name: str):
     ))
     
     # 列表項樣式
-    styles.add(ParagraphStyle(
+    styles.add(rl_styles.ParagraphStyle(
         name='ChineseListItem',
         fontName=font_name,
         fontSize=10,
@@ -128,107 +149,164 @@ def get_styles(font_name: str):
     return styles
 
 
-def notion_blocks_to_elements(blocks: List[Dict[str, Any]], styles) -> list:
-    """將 Notion Blocks 轉換為 reportlab 元素"""
+def spans_to_markup(spans: List[Span]) -> str:
+    """將文字片段轉為 reportlab Paragraph 的 markup"""
+    result = ''
+    for span in spans:
+        # 移除 emoji（PDF 生成對 emoji 支援不穩定）
+        content = remove_emojis(span.text)
+
+        # 轉義 HTML 特殊字符
+        content = content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+        if span.bold:
+            content = f'<b>{content}</b>'
+        if span.italic:
+            content = f'<i>{content}</i>'
+        result += content
+    return result
+
+
+# 每個 block 編譯後的 flowable 參數：(flowable 種類, markup, 樣式名稱)
+# 只快取參數，每次匯出都建立新的 flowable（reportlab 排版時會修改 flowable 狀態）
+FlowableSpec = Tuple[str, str, str]
+
+_block_specs = MemoryLRUCache(max_entries=settings.PDF_BLOCK_CACHE_SIZE)
+_block_stats_lock = threading.Lock()
+_block_stats = {"hits": 0, "misses": 0}
+
+
+def _compile_block(block: Block) -> List[FlowableSpec]:
+    """將單一 block（含子 block）編譯為 flowable 參數"""
+    block_type = block.kind
+    # callout icon 通常是 emoji，只取文字以避免 PDF 生成錯誤
+    text = spans_to_markup(block.spans)
+
+    if block_type == 'callout':
+        return [('paragraph', text, 'ChineseQuote')]
+    if block_type == 'heading_2':
+        return [('paragraph', text, 'ChineseH2')]
+    if block_type == 'heading_3':
+        return [('paragraph', text, 'ChineseH3')]
+    if block_type == 'bulleted_list_item':
+        return [('paragraph', f'• {text}', 'ChineseListItem')]
+    if block_type == 'code':
+        # Code block 通常不處理 emoji or html, 用 Preformatted
+        # 但如果包含 unicode emoji, ReportLab 預設字體會掛掉。
+        # 這裡簡化處理，不 wrap code block 的 emoji（因為 Preformatted 不支援多字體混合）
+        return [('preformatted', text, 'ChineseBody'), ('spacer', '', '')]
+    if block_type == 'quote':
+        return [('paragraph', f'❝ {text}', 'ChineseQuote')]
+    if block_type == 'toggle':
+        specs = [('paragraph', f'<b>▸ {text}</b>', 'ChineseBody')]
+        # 處理 toggle 內的子元素
+        for child in block.children:
+            specs.extend(_compile_block(child))
+        return specs
+    return []
+
+
+def _build_flowable(spec: FlowableSpec, styles):
+    kind, text, style_name = spec
+    if kind == 'paragraph':
+        return platypus.Paragraph(text, styles[style_name])
+    if kind == 'preformatted':
+        return platypus.Preformatted(text, styles[style_name])
+    return platypus.Spacer(1, 6)
+
+
+def block_cache_stats() -> Dict[str, Any]:
+    """block 編譯快取的累計命中率"""
+    with _block_stats_lock:
+        hits, misses = _block_stats["hits"], _block_stats["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+        "entries": len(_block_specs),
+        "max_entries": _block_specs.max_entries,
+    }
+
+
+def notion_blocks_to_elements(blocks: List[Union[Block, Dict[str, Any]]], styles, font_name: str = '') -> list:
+    """
+    將 blocks（IR 或 Notion 格式）轉換為 reportlab 元素
+
+    每個 block 的編譯結果依「block 內容雜湊 + 字體」快取，
+    重新匯出稍作修改的長筆記時只重新處理有變動的 block
+    """
     elements = []
-    
-    def process_rich_text(rich_text: List[Dict]) -> str:
-        result = ''
-        for t in rich_text:
-            content = t.get('text', {}).get('content', '')
-            # 移除 emoji（PDF 生成對 emoji 支援不穩定）
-            content = remove_emojis(content)
-
-            # 轉義 HTML 特殊字符
-            content = content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-
-            annotations = t.get('annotations', {})
-            if annotations.get('bold'):
-                content = f'<b>{content}</b>'
-            if annotations.get('italic'):
-                content = f'<i>{content}</i>'
-            result += content
-        return result
-    
-    for block in blocks:
-        block_type = block.get('type', '')
-        
-        if block_type == 'callout':
-            callout = block.get('callout', {})
-            # callout icon 通常是 emoji，移除它以避免 PDF 生成錯誤
-            text = process_rich_text(callout.get('rich_text', []))
-            elements.append(Paragraph(text, styles['ChineseQuote']))
-            
-        elif block_type == 'heading_2':
-            text = process_rich_text(block.get('heading_2', {}).get('rich_text', []))
-            elements.append(Paragraph(text, styles['ChineseH2']))
-            
-        elif block_type == 'heading_3':
-            text = process_rich_text(block.get('heading_3', {}).get('rich_text', []))
-            elements.append(Paragraph(text, styles['ChineseH3']))
-            
-        elif block_type == 'bulleted_list_item':
-            text = process_rich_text(block.get('bulleted_list_item', {}).get('rich_text', []))
-            elements.append(Paragraph(f'• {text}', styles['ChineseListItem']))
-            
-        elif block_type == 'code':
-            code_block = block.get('code', {})
-            text = process_rich_text(code_block.get('rich_text', []))
-            # Code block 通常不處理 emoji or html, 用 Preformatted
-            # 但如果包含 unicode emoji, ReportLab 預設字體會掛掉。
-            # 這裡簡化處理，不 wrap code block 的 emoji（因為 Preformatted 不支援多字體混合）
-            elements.append(Preformatted(text, styles['ChineseBody']))
-            elements.append(Spacer(1, 6))
-            
-        elif block_type == 'quote':
-            text = process_rich_text(block.get('quote', {}).get('rich_text', []))
-            elements.append(Paragraph(f'❝ {text}', styles['ChineseQuote']))
-            
-        elif block_type == 'toggle':
-            toggle = block.get('toggle', {})
-            text = process_rich_text(toggle.get('rich_text', []))
-            elements.append(Paragraph(f'<b>▸ {text}</b>', styles['ChineseBody']))
-            # 處理 toggle 內的子元素
-            children = toggle.get('children', [])
-            if children:
-                child_elements = notion_blocks_to_elements(children, styles)
-                elements.extend(child_elements)
-    
+    hits = 0
+    # 合併相鄰同樣式的片段，減少 Paragraph markup 的標籤數量
+    ir_blocks = block_ir.normalize_spans(block_ir.from_notion(blocks), limits=False)
+
+    for block in ir_blocks:
+        key = make_key(font_name, block.fingerprint())
+        specs = _block_specs.get(key)
+        if specs is None:
+            specs = _compile_block(block)
+            _block_specs.set(key, specs)
+        else:
+            hits += 1
+        elements.extend(_build_flowable(spec, styles) for spec in specs)
+
+    with _block_stats_lock:
+        _block_stats["hits"] += hits
+        _block_stats["misses"] += len(ir_blocks) - hits
+    if ir_blocks:
+        print(f"[PDF] Block cache: {hits}/{len(ir_blocks)} hit(s) ({hits / len(ir_blocks):.0%}).")
+
     return elements
 
 
-def generate_pdf(title: str, blocks: List[Dict[str, Any]]) -> bytes:
+def _new_document(buffer: BytesIO):
+    return platypus.SimpleDocTemplate(
+        buffer,
+        pagesize=pagesizes.A4,
+        leftMargin=20*units.mm,
+        rightMargin=20*units.mm,
+        topMargin=20*units.mm,
+        bottomMargin=20*units.mm
+    )
+
+
+def _note_elements(title: str, blocks: List[Union[Block, Dict[str, Any]]], styles, font_name: str) -> list:
+    """單一筆記的標題與內容元素"""
+    elements = []
+
+    # 標題（移除 emoji 避免 PDF 生成錯誤）
+    elements.append(platypus.Paragraph(remove_emojis(title), styles['ChineseTitle']))
+    elements.append(platypus.Spacer(1, 12))
+
+    # 轉換 Notion Blocks
+    elements.extend(notion_blocks_to_elements(blocks, styles, font_name))
+    return elements
+
+
+def generate_pdf(title: str, blocks: List[Union[Block, Dict[str, Any]]]) -> bytes:
     """
     生成 PDF 檔案
     """
     # 註冊字體
     font_name = register_fonts()
     styles = get_styles(font_name)
-    
-    # 建立 PDF
+
     buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        leftMargin=20*mm,
-        rightMargin=20*mm,
-        topMargin=20*mm,
-        bottomMargin=20*mm
-    )
-    
-    # 建立元素列表
-    elements = []
-    
-    # 標題（移除 emoji 避免 PDF 生成錯誤）
-    elements.append(Paragraph(remove_emojis(title), styles['ChineseTitle']))
-    elements.append(Spacer(1, 12))
-    
-    # 轉換 Notion Blocks
-    content_elements = notion_blocks_to_elements(blocks, styles)
-    elements.extend(content_elements)
-    
-    # 建立 PDF
-    doc.build(elements)
-    
-    buffer.seek(0)
+    _new_document(buffer).build(_note_elements(title, blocks, styles, font_name))
+    return buffer.getvalue()
+
+
+def merge_pdfs(parts: List[Tuple[str, bytes]]) -> bytes:
+    """
+    將已生成的多份 PDF 依序串接為單一 PDF，每份各有一個書籤（不重新排版）
+
+    Args:
+        parts: [(title, pdf_bytes), ...]
+    """
+    writer = pypdf.PdfWriter()
+    for index, (title, data) in enumerate(parts):
+        writer.append(BytesIO(data), outline_item=remove_emojis(title).strip() or f"Note {index + 1}")
+    buffer = BytesIO()
+    writer.write(buffer)
     return buffer.getvalue()
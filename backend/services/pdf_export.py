@@ -0,0 +1,127 @@
+"""
+批次 PDF 匯出服務
+
+- 每份筆記在 process pool 中各自生成 PDF（reportlab 排版是純 CPU 工作，thread 會受 GIL 限制）
+- 以串流方式輸出 ZIP：每份 PDF 完成後立即寫入並送出，同時進行中的筆記數有上限，
+  不會把整個壓縮檔放在記憶體中
+- 可選擇另外產生一份合併的 PDF（每份筆記一個書籤）：直接串接各筆記已生成的 PDF，不重新排版
+- 個別筆記生成失敗時不中斷匯出，失敗清單寫入壓縮檔中的 errors.json
+"""
+import asyncio
+import multiprocessing
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from config import settings
+from . import jsonio, pdf
+
+MERGED_FILENAME = "all_notes.pdf"
+
+# 檔名中不允許的字元（Windows 與 ZIP 路徑分隔符號）
+_UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.PDF_EXPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def entry_name(index: int, title: str) -> str:
+    """ZIP 中的檔名：序號 + 標題（序號避免同名筆記互相覆蓋，也保留原本順序）"""
+    safe_title = _UNSAFE_FILENAME.sub("_", title).strip(" .")[:80] or "note"
+    return f"{index + 1:03d}_{safe_title}.pdf"
+
+
+class _ZipSink:
+    """ZipFile 的輸出目標：只累積尚未送出的 bytes（不可 seek，ZipFile 改用 data descriptor）"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_zip(notes: List[Dict[str, Any]], merged: bool = False) -> AsyncIterator[bytes]:
+    """
+    平行生成每份筆記的 PDF，依完成順序串流輸出 ZIP
+
+    Args:
+        notes: [{"title": ..., "blocks": [...]}, ...]
+        merged: 是否另外加入合併的 PDF（MERGED_FILENAME）
+
+    Yields:
+        ZIP 的內容片段
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    sink = _ZipSink()
+    # PDF 內容已壓縮，直接儲存
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+    window = max(settings.PDF_EXPORT_WORKERS * 2, 1)
+    errors: List[Dict[str, Any]] = []
+    # merged 時保留每份筆記的 PDF，全部完成後依原本順序串接
+    rendered: Dict[int, bytes] = {}
+
+    queued = iter(enumerate(notes))
+    running: Dict[asyncio.Future, int] = {}
+    try:
+        while True:
+            while len(running) < window:
+                item = next(queued, None)
+                if item is None:
+                    break
+                index, note = item
+                running[loop.run_in_executor(executor, pdf.generate_pdf, note["title"], note["blocks"])] = index
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                title = notes[index]["title"]
+                try:
+                    data = future.result()
+                    archive.writestr(entry_name(index, title), data)
+                except Exception as e:
+                    print(f"[PDF] Batch export failed for note {index + 1} ({title}): {e}")
+                    errors.append({"index": index, "title": title, "error": str(e)})
+                    continue
+                if merged:
+                    rendered[index] = data
+                yield sink.drain()
+
+        if rendered:
+            parts = [(notes[index]["title"], rendered[index]) for index in sorted(rendered)]
+            try:
+                archive.writestr(MERGED_FILENAME, await loop.run_in_executor(executor, pdf.merge_pdfs, parts))
+            except Exception as e:
+                print(f"[PDF] Merged export failed: {e}")
+                errors.append({"index": None, "title": MERGED_FILENAME, "error": str(e)})
+
+        if errors:
+            archive.writestr("errors.json", jsonio.dumps(errors))
+        archive.close()
+        yield sink.drain()
+    finally:
+        # 用戶端中途斷線時取消尚未開始的工作
+        for future in running:
+            future.cancel()
@@ -0,0 +1,102 @@
+"""
+上傳文件預覽服務
+
+uploads/temp 下的文件以 uuid 命名、寫入後不再改變，
+因此可以使用強 ETag 與 immutable 快取，並支援 Range 分段讀取
+"""
+import mimetypes
+import os
+from typing import Optional, Tuple
+
+# 瀏覽器可永久快取（uuid 檔名的內容不會改變）
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class RangeNotSatisfiable(Exception):
+    """Range 超出檔案範圍（對應 HTTP 416）"""
+
+
+def get_temp_dir() -> str:
+    """與 parser.save_upload_to_temp 一致的臨時目錄"""
+    return os.path.join(os.getcwd(), "uploads", "temp")
+
+
+def resolve_temp_file(filename: str) -> Optional[str]:
+    """
+    將檔名解析為 uploads/temp 下的路徑
+
+    Returns:
+        文件路徑；檔名不合法或文件不存在時返回 None
+    """
+    if not filename or ".." in filename or "/" in filename or "\\" in filename:
+        return None
+
+    path = os.path.join(get_temp_dir(), filename)
+    if not os.path.isfile(path):
+        return None
+    return path
+
+
+def build_etag(filename: str, stat: os.stat_result) -> str:
+    """由檔名、大小與修改時間組成強 ETag"""
+    stem = os.path.splitext(filename)[0]
+    return f'"{stem}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def guess_media_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """判斷 If-None-Match 是否命中（支援多個值與 *）"""
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    # If-None-Match 使用弱比較
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析單一區段的 Range header
+
+    Args:
+        header: Range header 的值，例如 "bytes=0-1023"、"bytes=1024-"、"bytes=-500"
+        size: 文件大小
+
+    Returns:
+        (start, end)，end 包含在內；沒有 Range、格式無法識別或為多區段時返回 None（回傳完整內容）
+
+    Raises:
+        RangeNotSatisfiable: 區段超出文件範圍
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+
+    try:
+        if not start_str:
+            # bytes=-N：最後 N 個 bytes
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start > end:
+        return None
+
+    return start, min(end, size - 1)
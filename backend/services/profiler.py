@@ -0,0 +1,250 @@
+"""
+單一請求的效能剖析（profiling）與剖析結果的保存
+
+兩種模式：
+- sample（預設）：背景執行緒定期讀取 sys._current_frames()，記錄所有執行緒的呼叫堆疊；
+  牆鐘時間取樣，可看到 asyncio.to_thread 中的 PDF 產生與等待網路的時間，
+  但同時間其他請求的堆疊也會被取樣到
+- cprofile：以 cProfile 對 event loop 執行緒做決定性剖析，呼叫次數精確，
+  但不包含在其他執行緒中執行的工作
+
+結果寫入 settings.PROFILE_DIR，每份剖析包含：
+- <id>.json：摘要（請求、耗時、最耗時的函式）
+- <id>.collapsed（sample）：collapsed stack 格式，可直接交給 flamegraph.pl / speedscope
+- <id>.prof（cprofile）：pstats 格式，可用 snakeviz 等工具開啟
+目錄中只保留最新的 PROFILE_MAX_COUNT 份
+"""
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from services import jsonio
+
+MODES = ("sample", "cprofile")
+
+# 摘要中列出的函式數量
+_TOP_N = 25
+
+# 葉節點為這些函式的堆疊視為閒置（event loop 等待 I/O、thread pool 等待工作、Event.wait）
+_IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("threading.py", "wait"),
+}
+
+_ID_PATTERN = re.compile(r"^[0-9]{8}-[0-9]{6}-[A-Za-z0-9_.-]+$")
+
+# cProfile 與取樣執行緒同一時間只能有一個剖析
+_active = threading.Lock()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """定期取樣所有執行緒的呼叫堆疊"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self) -> Dict[str, List[Dict[str, Any]]]:
+        """依自身（葉節點）與累計（出現在堆疊中）取樣數排序的函式"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+
+        def rows(counter: Counter) -> List[Dict[str, Any]]:
+            return [
+                {"function": label, "samples": count, "percent": round(count * 100 / max(self.samples, 1), 1)}
+                for label, count in counter.most_common(_TOP_N)
+            ]
+
+        return {"self": rows(own), "cumulative": rows(total)}
+
+
+class ProfileSession:
+    """一次請求的剖析；start() 取得全域剖析鎖失敗時返回 False（已有其他剖析進行中）"""
+
+    def __init__(self, mode: str, method: str, path: str, trigger: str):
+        self.mode = mode if mode in MODES else "sample"
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:40] or "root"
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{method.lower()}-{slug}-{uuid.uuid4().hex[:6]}"
+        self._sampler: Optional[StackSampler] = None
+        self._profile: Optional[cProfile.Profile] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def start(self) -> bool:
+        if not _active.acquire(blocking=False):
+            return False
+        try:
+            if self.mode == "cprofile":
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+            else:
+                self._sampler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL)
+                self._sampler.start()
+        except ValueError:
+            # 其他 profiler（例如除錯器）已在執行
+            _active.release()
+            return False
+        self._started = time.perf_counter()
+        return True
+
+    def stop(self) -> None:
+        """停止剖析（須在 start 的同一執行緒呼叫；cProfile 只能在該執行緒停用）"""
+        self._elapsed = time.perf_counter() - self._started
+        try:
+            if self._profile is not None:
+                self._profile.disable()
+            if self._sampler is not None:
+                self._sampler.stop()
+        finally:
+            _active.release()
+
+    def save(self, status_code: Optional[int]) -> Dict[str, Any]:
+        """寫入剖析檔與摘要並清理舊檔（會寫入磁碟，呼叫端應在執行緒中執行）"""
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        base = os.path.join(settings.PROFILE_DIR, self.id)
+
+        summary: Dict[str, Any] = {
+            "id": self.id,
+            "mode": self.mode,
+            "trigger": self.trigger,
+            "method": self.method,
+            "path": self.path,
+            "status_code": status_code,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "duration_ms": round(self._elapsed * 1000, 1),
+        }
+        if self._sampler is not None:
+            with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+                f.write(self._sampler.collapsed())
+            summary["samples"] = self._sampler.samples
+            summary["idle_samples"] = self._sampler.idle
+            summary["interval_ms"] = settings.PROFILE_SAMPLE_INTERVAL * 1000
+            summary["file"] = f"{self.id}.collapsed"
+            summary["top"] = self._sampler.top_functions()
+        elif self._profile is not None:
+            self._profile.dump_stats(f"{base}.prof")
+            summary["file"] = f"{self.id}.prof"
+            summary["top"] = _pstats_top(self._profile)
+
+        with open(f"{base}.json", "wb") as f:
+            f.write(jsonio.dumps(summary))
+        _prune()
+        return summary
+
+
+def _pstats_top(profile: cProfile.Profile) -> Dict[str, List[Dict[str, Any]]]:
+    """cProfile 結果中依自身時間與累計時間排序的函式"""
+    entries: List[Tuple[str, int, float, float]] = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in pstats.Stats(profile).stats.items():
+        label = f"{name} ({os.path.basename(filename)}:{line})"
+        entries.append((label, calls, own, cumulative))
+
+    def rows(index: int) -> List[Dict[str, Any]]:
+        ranked = sorted(entries, key=lambda entry: entry[index], reverse=True)[:_TOP_N]
+        return [
+            {"function": label, "calls": calls, "self_ms": round(own * 1000, 2), "cumulative_ms": round(cumulative * 1000, 2)}
+            for label, calls, own, cumulative in ranked
+        ]
+
+    return {"self": rows(2), "cumulative": rows(3)}
+
+
+def _prune() -> None:
+    """只保留最新的 PROFILE_MAX_COUNT 份剖析"""
+    ids = [name[:-5] for name in _summaries_newest_first()]
+    for profile_id in ids[max(settings.PROFILE_MAX_COUNT, 0):]:
+        for suffix in (".json", ".collapsed", ".prof"):
+            try:
+                os.remove(os.path.join(settings.PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def _summaries_newest_first() -> List[str]:
+    names = [name for name in os.listdir(settings.PROFILE_DIR) if name.endswith(".json")]
+    return sorted(names, key=lambda name: os.path.getmtime(os.path.join(settings.PROFILE_DIR, name)), reverse=True)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """已保存的剖析摘要（新到舊，不含函式列表）"""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    profiles = []
+    for name in _summaries_newest_first():
+        summary = get_profile(name[:-5])
+        if summary is not None:
+            summary.pop("top", None)
+            profiles.append(summary)
+    return profiles
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    """讀取單一剖析的摘要；不存在時返回 None"""
+    if not _ID_PATTERN.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(settings.PROFILE_DIR, f"{profile_id}.json"), "rb") as f:
+            return jsonio.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def profile_file_path(profile_id: str) -> Optional[str]:
+    """剖析原始檔（.collapsed 或 .prof）的路徑；不存在時返回 None"""
+    summary = get_profile(profile_id)
+    if summary is None or not summary.get("file"):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, summary["file"])
+    return path if os.path.isfile(path) else None
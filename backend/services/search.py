@@ -0,0 +1,161 @@
+"""
+筆記全文檢索
+
+使用 SQLite FTS5，索引與筆記版本庫位於同一個資料庫，並在保存版本的同一個交易中更新。
+FTS5 內建的 tokenizer 不會切分中文，因此在寫入前先自行斷詞：
+- 中日韓文字切成相鄰兩字（bigram），單獨一個字時保留單字
+- 其他文字依英數字切成小寫單字
+
+查詢時以相同方式斷詞，每個查詢詞組成一個 phrase（bigram 必須相鄰），詞與詞之間為 AND，
+以 bm25 排序（標題權重較高），摘要片段取自原始文字
+"""
+import re
+import sqlite3
+from typing import Any, Dict, List
+
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS note_search_docs (
+    rowid INTEGER PRIMARY KEY,
+    note_id TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS note_search USING fts5(
+    title,
+    body,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# 中日韓文字（CJK 統一表意文字、擴充 A、相容表意文字、假名、韓文）
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af"
+_TOKEN_PATTERN = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RUN = re.compile(rf"^[{_CJK}]+$")
+
+# bm25 欄位權重：title, body
+_TITLE_WEIGHT = 5.0
+_BODY_WEIGHT = 1.0
+
+_SNIPPET_RADIUS = 40
+
+
+def tokenize(text: str) -> List[str]:
+    """將文字切成索引用的 token"""
+    tokens: List[str] = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if _CJK_RUN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def flatten_blocks(blocks: List[Any]) -> str:
+    """將 Notion blocks 的 rich_text 內容（含 toggle 子 block）串成純文字，每個 block 一行"""
+    lines: List[str] = []
+
+    def walk(items: List[Any]) -> None:
+        for block in items:
+            if not isinstance(block, dict):
+                continue
+            content = block.get(block.get("type", ""), {})
+            if not isinstance(content, dict):
+                continue
+            text = "".join(
+                t.get("text", {}).get("content", "")
+                for t in content.get("rich_text", [])
+                if isinstance(t, dict)
+            )
+            if text:
+                lines.append(text)
+            walk(content.get("children", []))
+
+    walk(blocks)
+    return "\n".join(lines)
+
+
+def index_note(conn: sqlite3.Connection, note_id: str, title: str, blocks: List[Any]) -> None:
+    """更新單一筆記的索引（呼叫者負責交易）"""
+    body = flatten_blocks(blocks)
+    row = conn.execute("SELECT rowid FROM note_search_docs WHERE note_id = ?", (note_id,)).fetchone()
+
+    if row is None:
+        cursor = conn.execute(
+            "INSERT INTO note_search_docs (note_id, title, body) VALUES (?, ?, ?)",
+            (note_id, title, body),
+        )
+        rowid = cursor.lastrowid
+    else:
+        rowid = row[0]
+        conn.execute(
+            "UPDATE note_search_docs SET title = ?, body = ? WHERE rowid = ?",
+            (title, body, rowid),
+        )
+        conn.execute("DELETE FROM note_search WHERE rowid = ?", (rowid,))
+
+    conn.execute(
+        "INSERT INTO note_search (rowid, title, body) VALUES (?, ?, ?)",
+        (rowid, " ".join(tokenize(title)), " ".join(tokenize(body))),
+    )
+
+
+def build_match_query(query: str) -> str:
+    """將使用者查詢轉為 FTS5 MATCH 語法；沒有可查詢的 token 時返回空字串"""
+    phrases = []
+    for term in query.split():
+        tokens = tokenize(term)
+        if not tokens:
+            continue
+        phrase = '"' + " ".join(token.replace('"', '""') for token in tokens) + '"'
+        # 單一中文字在索引中只會出現在 bigram 裡，改用前綴查詢
+        if len(tokens) == 1 and len(tokens[0]) == 1 and _CJK_RUN.match(tokens[0]):
+            phrase += "*"
+        phrases.append(phrase)
+    return " AND ".join(phrases)
+
+
+def make_snippet(text: str, query: str) -> str:
+    """取出原始文字中第一個命中位置附近的片段"""
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in query.split()]
+    positions = [p for p in positions if p >= 0]
+    if not positions:
+        return text[:_SNIPPET_RADIUS * 2].replace("\n", " ")
+
+    start = max(min(positions) - _SNIPPET_RADIUS, 0)
+    end = min(min(positions) + _SNIPPET_RADIUS, len(text))
+    snippet = text[start:end].replace("\n", " ")
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+
+def search(conn: sqlite3.Connection, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    查詢筆記
+
+    Returns:
+        [{"note_id", "title", "snippet", "score"}, ...]，依相關度排序
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    rows = conn.execute(
+        "SELECT d.note_id, d.title, d.body, bm25(note_search, ?, ?) AS score "
+        "FROM note_search JOIN note_search_docs AS d ON d.rowid = note_search.rowid "
+        "WHERE note_search MATCH ? ORDER BY score LIMIT ?",
+        (_TITLE_WEIGHT, _BODY_WEIGHT, match, limit),
+    ).fetchall()
+
+    return [
+        {
+            "note_id": note_id,
+            "title": title,
+            "snippet": make_snippet(body, query),
+            # bm25 越小越相關，轉為越大越相關
+            "score": -score,
+        }
+        for note_id, title, body, score in rows
+    ]
@@ -0,0 +1,254 @@
+"""
+投影片文字抽取服務
+
+.pptx 是 zip 包裝的 XML，大部分體積是圖片；這裡只取出每張投影片的標題、
+條列文字（含層級）、表格與講者備註，組成精簡的純文字交給 refine，
+不把整份二進位檔上傳給 Gemini。
+
+- 解析在 process pool 中進行，不佔用 event loop 與 GIL
+- 結果依內容雜湊快取（使用共享快取時跨 worker 共用）
+- .ppt 需先以 LibreOffice 轉為 .pptx；未安裝 soffice 時不開放上傳 .ppt（見 upload_extensions）
+"""
+import asyncio
+import multiprocessing
+import os
+import posixpath
+import re
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+from xml.etree import ElementTree
+
+from config import settings
+from .cache import get_cache, make_key
+
+SLIDE_EXTENSIONS = (".ppt", ".pptx")
+
+_NS = {
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+_TITLE_PLACEHOLDERS = ("title", "ctrTitle")
+# 不屬於內容的 placeholder（頁碼、日期、頁尾、備註頁中的投影片縮圖）
+_SKIPPED_PLACEHOLDERS = ("sldNum", "dt", "ftr", "hdr", "sldImg")
+
+_extractions = get_cache("slides", default_ttl=24 * 3600)
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def is_slide_deck(path: str) -> bool:
+    return path.lower().endswith(SLIDE_EXTENSIONS)
+
+
+def _find_soffice() -> Optional[str]:
+    return shutil.which("soffice") or shutil.which("libreoffice")
+
+
+def upload_extensions() -> tuple:
+    """目前環境可以處理的投影片格式（.ppt 需要 LibreOffice）"""
+    return SLIDE_EXTENSIONS if _find_soffice() else (".pptx",)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.SLIDE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+# ---------- XML 解析（在 worker process 中執行） ----------
+
+def _read_xml(archive: zipfile.ZipFile, name: str) -> Optional[ElementTree.Element]:
+    try:
+        return ElementTree.fromstring(archive.read(name))
+    except KeyError:
+        return None
+    except ElementTree.ParseError as e:
+        raise ValueError(f"投影片內容無法解析（{name}）: {e}")
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> Dict[str, Dict[str, str]]:
+    """讀取 part 的 .rels，返回 {rId: {"type", "target"}}（target 為 zip 內的完整路徑）"""
+    folder, name = posixpath.split(part)
+    rels = _read_xml(archive, posixpath.join(folder, "_rels", f"{name}.rels"))
+    if rels is None:
+        return {}
+    return {
+        rel.get("Id"): {
+            "type": rel.get("Type", ""),
+            "target": posixpath.normpath(posixpath.join(folder, rel.get("Target", ""))),
+        }
+        for rel in rels.findall("rel:Relationship", _NS)
+    }
+
+
+def _slide_parts(archive: zipfile.ZipFile) -> List[str]:
+    """依簡報中的順序列出投影片 part"""
+    presentation = _read_xml(archive, "ppt/presentation.xml")
+    rels = _relationships(archive, "ppt/presentation.xml")
+    parts = []
+    if presentation is not None:
+        for slide_id in presentation.iterfind("p:sldIdLst/p:sldId", _NS):
+            rel = rels.get(slide_id.get(f"{{{_NS['r']}}}id"))
+            if rel:
+                parts.append(rel["target"])
+    if parts:
+        return parts
+
+    # 沒有 presentation.xml 時依檔名中的編號排序
+    names = [n for n in archive.namelist() if re.match(r"ppt/slides/slide\d+\.xml$", n)]
+    return sorted(names, key=lambda n: int(re.search(r"(\d+)\.xml$", n).group(1)))
+
+
+def _paragraph_text(paragraph: ElementTree.Element) -> str:
+    pieces = []
+    for node in paragraph.iter():
+        if node.tag == f"{{{_NS['a']}}}t" and node.text:
+            pieces.append(node.text)
+        elif node.tag == f"{{{_NS['a']}}}br":
+            pieces.append(" ")
+    return "".join(pieces).strip()
+
+
+def _shape_placeholder(shape: ElementTree.Element) -> Optional[str]:
+    ph = shape.find("p:nvSpPr/p:nvPr/p:ph", _NS)
+    if ph is None:
+        return None
+    return ph.get("type", "body")
+
+
+def _read_shapes(tree: ElementTree.Element) -> Dict[str, Any]:
+    """取出投影片（或備註頁）中的標題、條列文字與表格"""
+    title_parts: List[str] = []
+    bullets: List[List[Any]] = []
+
+    sp_tree = tree.find("p:cSld/p:spTree", _NS)
+    if sp_tree is None:
+        return {"title": "", "bullets": bullets}
+
+    for node in sp_tree.iter():
+        if node.tag == f"{{{_NS['p']}}}sp":
+            placeholder = _shape_placeholder(node)
+            if placeholder in _SKIPPED_PLACEHOLDERS:
+                continue
+            for paragraph in node.iterfind("p:txBody/a:p", _NS):
+                text = _paragraph_text(paragraph)
+                if not text:
+                    continue
+                if placeholder in _TITLE_PLACEHOLDERS:
+                    title_parts.append(text)
+                else:
+                    ppr = paragraph.find("a:pPr", _NS)
+                    level = int(ppr.get("lvl", "0")) if ppr is not None else 0
+                    bullets.append([level, text])
+
+        elif node.tag == f"{{{_NS['a']}}}tbl":
+            for row in node.iterfind("a:tr", _NS):
+                cells = [
+                    " ".join(filter(None, (_paragraph_text(p) for p in cell.iterfind(".//a:p", _NS))))
+                    for cell in row.iterfind("a:tc", _NS)
+                ]
+                if any(cells):
+                    bullets.append([0, " | ".join(cells)])
+
+    return {"title": " ".join(title_parts), "bullets": bullets}
+
+
+def _read_notes(archive: zipfile.ZipFile, slide_part: str) -> str:
+    for rel in _relationships(archive, slide_part).values():
+        if rel["type"].endswith("/notesSlide"):
+            tree = _read_xml(archive, rel["target"])
+            if tree is not None:
+                return "\n".join(text for _, text in _read_shapes(tree)["bullets"])
+    return ""
+
+
+def extract_pptx(path: str) -> List[Dict[str, Any]]:
+    """
+    解析 .pptx
+
+    Returns:
+        [{"title": 標題, "bullets": [[層級, 文字], ...], "notes": 講者備註}, ...]，依投影片順序
+
+    Raises:
+        ValueError: 檔案不是有效的 .pptx
+    """
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise ValueError("不是有效的 .pptx 檔案")
+
+    slides = []
+    with archive:
+        for part in _slide_parts(archive):
+            tree = _read_xml(archive, part)
+            if tree is None:
+                continue
+            content = _read_shapes(tree)
+            content["notes"] = _read_notes(archive, part)
+            slides.append(content)
+    return slides
+
+
+def _convert_ppt(path: str, out_dir: str) -> str:
+    """以 LibreOffice 將 .ppt 轉為 .pptx"""
+    soffice = _find_soffice()
+    if soffice is None:
+        raise ValueError("解析 .ppt 需要安裝 LibreOffice（soffice），或請先另存為 .pptx")
+
+    result = subprocess.run(
+        [soffice, "--headless", "--convert-to", "pptx", "--outdir", out_dir, path],
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    converted = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + ".pptx")
+    if result.returncode != 0 or not os.path.exists(converted):
+        raise ValueError(f"無法轉換 .ppt 檔案: {result.stderr.strip()}")
+    return converted
+
+
+def extract_deck(path: str) -> List[Dict[str, Any]]:
+    """解析 .ppt / .pptx（worker process 的進入點）"""
+    if path.lower().endswith(".ppt"):
+        with tempfile.TemporaryDirectory() as out_dir:
+            return extract_pptx(_convert_ppt(path, out_dir))
+    return extract_pptx(path)
+
+
+# ---------- 對外介面 ----------
+
+def render_text(slides: List[Dict[str, Any]]) -> str:
+    """將抽取結果排成精簡的純文字（給 prompt 使用）"""
+    lines = []
+    for index, slide in enumerate(slides, start=1):
+        lines.append(f"## Slide {index}: {slide['title']}".rstrip(": "))
+        for level, text in slide["bullets"]:
+            lines.append(f"{'  ' * level}- {text}")
+        if slide["notes"]:
+            lines.append(f"Notes: {slide['notes']}")
+    return "\n".join(lines)
+
+
+async def extract_slides(path: str, sha256: str) -> List[Dict[str, Any]]:
+    """
+    在 process pool 中抽取投影片文字，結果依內容雜湊快取
+
+    Raises:
+        ValueError: 檔案無法解析
+    """
+    async def extract() -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        slides = await loop.run_in_executor(_get_executor(), extract_deck, path)
+        print(f"[SLIDES] Extracted {len(slides)} slide(s) from {os.path.basename(path)}.")
+        return slides
+
+    return await _extractions.aget_or_compute(make_key("slides", sha256), extract)
@@ -0,0 +1,193 @@
+"""
+前端靜態檔案（Vite build 輸出）的記憶體快取
+
+啟動時一次性讀入 frontend/dist，並為可壓縮的檔案準備 gzip / brotli 版本：
+- 若 build 時已產生 `xxx.gz` / `xxx.br`，直接使用
+- 否則在載入時壓縮（brotli 需安裝 `brotli` 套件）
+
+也可以在 build 階段預先壓縮：
+    python -m services.static_bundle ../frontend/dist
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli 為選用套件
+    brotli = None
+
+# Vite 在 assets/ 下產生的帶 hash 檔名，例如 assets/index-BXk3a9Qe.js
+# （public/ 中的檔案如 apple-touch-icon.png 會原樣複製到根目錄，不可長期快取）
+_HASHED_ASSET = re.compile(r"^assets/(?:.+/)?[^/]+-[A-Za-z0-9_-]{8}\.[a-z0-9]+$")
+
+# 值得壓縮的類型與最小大小
+_COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+_MIN_COMPRESS_SIZE = 1024
+
+HASHED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 未帶 hash 的檔案（包含 index.html）每次都需要用 ETag 重新驗證
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# 協商時的優先順序
+_ENCODING_PREFERENCE = ("br", "gzip")
+
+
+class StaticAsset:
+    """單一靜態檔案及其壓縮版本"""
+
+    __slots__ = ("media_type", "etags", "cache_control", "variants")
+
+    def __init__(self, media_type: str, etag: str, cache_control: str, variants: Dict[str, bytes]):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        # encoding -> body，"identity" 為原始內容
+        self.variants = variants
+        # 每個版本的內容不同，各自使用自己的強 ETag
+        self.etags = {
+            encoding: etag if encoding == "identity" else f'{etag[:-1]}-{encoding}"'
+            for encoding in variants
+        }
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[str, bytes]:
+        """
+        依 Accept-Encoding 選擇要回傳的版本
+
+        Returns:
+            (encoding, body)，encoding 為 "identity" 時表示未壓縮
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in _ENCODING_PREFERENCE:
+            if encoding in self.variants and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding, self.variants[encoding]
+        return "identity", self.variants["identity"]
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 {encoding: q}"""
+    result: Dict[str, float] = {}
+    if not header:
+        return result
+
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        result[name] = q
+    return result
+
+
+def _is_compressible(media_type: str, size: int) -> bool:
+    return size >= _MIN_COMPRESS_SIZE and media_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+def _compress(data: bytes) -> Dict[str, bytes]:
+    """產生 gzip / brotli 版本（僅保留比原始內容小的版本）"""
+    variants = {}
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        variants["gzip"] = gz
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            variants["br"] = br
+    return variants
+
+
+def _read(path: str) -> Optional[bytes]:
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class StaticBundle:
+    """以相對路徑（使用 / 分隔）索引的前端檔案集合"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.assets: Dict[str, StaticAsset] = {}
+        if os.path.isdir(root):
+            self._load()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.assets)
+
+    def get(self, path: str) -> Optional[StaticAsset]:
+        return self.assets.get(path.lstrip("/"))
+
+    def _load(self) -> None:
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                # 預先壓縮的檔案會在讀取原始檔時一併載入
+                if name.endswith((".gz", ".br")):
+                    continue
+                full_path = os.path.join(dirpath, name)
+                rel_path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+                self.assets[rel_path] = self._load_asset(full_path, rel_path)
+
+        print(f"[STATIC] Loaded {len(self.assets)} frontend file(s) into memory.")
+
+    def _load_asset(self, full_path: str, rel_path: str) -> StaticAsset:
+        data = _read(full_path)
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+
+        variants = {"identity": data}
+        if _is_compressible(media_type, len(data)):
+            precompressed = {
+                "gzip": _read(full_path + ".gz"),
+                "br": _read(full_path + ".br"),
+            }
+            if all(v is None for v in precompressed.values()):
+                variants.update(_compress(data))
+            else:
+                variants.update({k: v for k, v in precompressed.items() if v is not None})
+
+        etag = f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+        cache_control = HASHED_CACHE_CONTROL if _HASHED_ASSET.match(rel_path) else REVALIDATE_CACHE_CONTROL
+        return StaticAsset(media_type, etag, cache_control, variants)
+
+
+def precompress_directory(root: str) -> int:
+    """
+    在 build 階段為 root 下的可壓縮檔案寫出 .gz / .br
+
+    Returns:
+        處理的檔案數
+    """
+    count = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith((".gz", ".br")):
+                continue
+            full_path = os.path.join(dirpath, name)
+            media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+            data = _read(full_path)
+            if not _is_compressible(media_type, len(data)):
+                continue
+            for encoding, body in _compress(data).items():
+                suffix = ".gz" if encoding == "gzip" else ".br"
+                with open(full_path + suffix, "wb") as f:
+                    f.write(body)
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join("..", "frontend", "dist")
+    print(f"[STATIC] Precompressed {precompress_directory(target)} file(s) in {target}.")
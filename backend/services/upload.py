@@ -1,34 +1,63 @@
-from typing import List
+import asyncio
+from typing import Dict, Any, Callable, Optional
 from fastapi import UploadFile
-from . import parser
+from . import audio, document, parser, slides
 
-# 支援的文件格式
-SUPPORTED_EXTENSIONS = (".pdf", ".ppt", ".pptx", ".mp3", ".wav", ".m4a", ".ogg")
+from config import settings
 
+# 目前開放上傳的格式（.ppt 只在安裝 LibreOffice、.m4a / .ogg 只在安裝 ffmpeg 時開放，避免保存後才轉換失敗）
+ALLOWED_UPLOAD_EXTENSIONS = (".pdf",) + slides.upload_extensions() + audio.upload_extensions()
 
-async def save_files_to_temp(files: List[UploadFile]) -> List[str]:
+
+def validate_upload(file: UploadFile) -> None:
     """
-    保存上傳的文件到臨時目錄（fail-fast 模式）
+    驗證單一文件的格式
 
-    流程：
-    1. 先驗證所有文件格式
-    2. 格式都有效才開始保存
-    3. 任何失敗都直接拋出異常
+    Raises:
+        ValueError: 不支援的檔案格式
+    """
+    if not file.filename.lower().endswith(ALLOWED_UPLOAD_EXTENSIONS):
+        allowed = "、".join(ALLOWED_UPLOAD_EXTENSIONS)
+        raise ValueError(f"不支援的檔案格式: {file.filename}。僅支援 {allowed} 檔案。")
 
-    Args:
-        files: 上傳的文件列表
+
+async def save_file(
+    file: UploadFile,
+    on_progress: Optional[Callable[[int], None]] = None
+) -> Dict[str, Any]:
+    """
+    驗證並串流保存單一文件
 
     Returns:
-        臨時文件路徑列表
+        {"path": ..., "sha256": ..., "size": ...}
 
     Raises:
         ValueError: 不支援的檔案格式
         IOError: 檔案保存失敗
     """
-    # 1. 先驗證所有文件格式
-    for file in files:
-        if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
-            raise ValueError(f"不支援的檔案格式: {file.filename}")
+    validate_upload(file)
+    saved = await parser.save_upload_streaming(file, on_progress=on_progress)
+    # 之後的抽取、雜湊與上傳共用同一個 memory map，並沿用寫入時計算的雜湊
+    document.open_document(saved["path"], sha256=saved["sha256"])
+    return saved
+
+
+async def extract_metadata(path: str, sha256: str) -> Dict[str, Any]:
+    """
+    依檔案類型抽取基本資訊
+
+    錄音會在此時切成固定長度的片段、投影片會在此時抽取文字（refine 時直接重用）
+
+    Raises:
+        ValueError: 文件無法解析
+    """
+    if path.lower().endswith(".pdf"):
+        return await asyncio.to_thread(parser.extract_pdf_metadata, path)
+    if slides.is_slide_deck(path):
+        deck = await slides.extract_slides(path, sha256)
+        return {"slides": len(deck)}
+    if audio.is_audio(path):
+        segments = await asyncio.to_thread(audio.segment_audio, path, settings.AUDIO_SEGMENT_SECONDS)
+        return {"segments": len(segments), "duration": segments[-1]["end"]}
+    return {}
 
-    # 2. 格式都有效，開始保存
-    return [parser.save_upload_to_temp(file) for file in files]
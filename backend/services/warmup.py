@@ -0,0 +1,167 @@
+"""
+上傳後的背景預熱與推測性生成
+
+上傳時已完成雜湊與抽取（投影片文字、錄音分段），這裡在回應送出後於背景：
+- 預先上傳文件到 Gemini（錄音上傳其分段），第一次 refine 直接重用 handle
+- （SPECULATIVE_REFINE）以最常用的選項推測性地執行 refine。使用者的第一次 refine 選擇相同選項時
+  由 claim() 取得推測的結果（仍在生成時等待同一個結果），只交付一次；選擇其他內容時取消推測
+
+推測受成本上限限制：附件總大小、同時進行的推測數，且不對錄音推測。
+推測紀錄只在目前的 worker 中，由其他 worker 處理的 refine 會重新生成
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import settings
+from . import audio, llm
+from .cache import make_key
+
+# 保留的推測紀錄數上限（完成後仍保留，用於統計重用次數）
+_MAX_TRACKED = 256
+
+_background: Set[asyncio.Task] = set()
+_speculations: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_stats = {
+    "warmups": 0,
+    "warmup_failed": 0,
+    "speculated": 0,
+    "skipped": 0,
+    "reused": 0,
+    "cancelled": 0,
+    "failed": 0,
+}
+
+
+def _spawn(coro) -> asyncio.Task:
+    # 保留背景工作的參照，避免執行中被回收
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+def _upload_key(api_key: str, file_hashes: List[str]) -> str:
+    return make_key("warmup", api_key, *file_hashes)
+
+
+def start(summary: Dict[str, Any], api_key: Optional[str], preuploaded: bool = False) -> None:
+    """
+    上傳完成後呼叫：在背景預熱文件，並視設定推測性生成
+
+    Args:
+        summary: 上傳回應（含 temp_paths、file_hashes 與初始選單）
+        api_key: Gemini API Key（未提供時不預熱）
+        preuploaded: 上傳流程中已預先上傳過文件（SSE 上傳）
+    """
+    temp_paths = summary.get("temp_paths") or []
+    file_hashes = summary.get("file_hashes") or []
+    if not settings.WARMUP_ON_UPLOAD or not api_key or not temp_paths or len(file_hashes) != len(temp_paths):
+        return
+
+    files = list(zip(temp_paths, file_hashes))
+    warm = None if preuploaded else _spawn(_warm(files, api_key))
+    if settings.SPECULATIVE_REFINE:
+        _maybe_speculate(summary, files, api_key, warm)
+
+
+async def _warm(files: List[Tuple[str, str]], api_key: str) -> None:
+    try:
+        count = await llm.prewarm_files(files, api_key)
+    except Exception as e:
+        # 預熱只是加速，失敗時 refine 會自行上傳
+        _stats["warmup_failed"] += 1
+        print(f"[WARMUP] Pre-upload failed: {e}")
+        return
+    _stats["warmups"] += 1
+    print(f"[WARMUP] Pre-uploaded {count} file(s) in the background.")
+
+
+def _running_speculations() -> int:
+    return sum(1 for entry in _speculations.values() if not entry["task"].done())
+
+
+def _maybe_speculate(
+    summary: Dict[str, Any],
+    files: List[Tuple[str, str]],
+    api_key: str,
+    warm: Optional[asyncio.Task]
+) -> None:
+    total_bytes = sum(os.path.getsize(path) for path, _ in files if os.path.exists(path))
+    reason = None
+    if any(audio.is_audio(path) for path, _ in files):
+        reason = "recording"
+    elif total_bytes > settings.SPECULATIVE_MAX_MB * 1024 * 1024:
+        reason = "too large"
+    elif _running_speculations() >= settings.SPECULATIVE_MAX_CONCURRENT:
+        reason = "too many running"
+    if reason:
+        _stats["skipped"] += 1
+        print(f"[WARMUP] Skipped speculative refine ({reason}).")
+        return
+
+    feedback = settings.SPECULATIVE_FEEDBACK
+    key = _upload_key(api_key, [sha256 for _, sha256 in files])
+    _speculations[key] = {"feedback": feedback, "task": _spawn(_speculate(summary, feedback, api_key, warm))}
+    while len(_speculations) > _MAX_TRACKED:
+        _speculations.popitem(last=False)
+    _stats["speculated"] += 1
+
+
+async def _speculate(
+    summary: Dict[str, Any],
+    feedback: str,
+    api_key: str,
+    warm: Optional[asyncio.Task]
+) -> Optional[Dict[str, Any]]:
+    """推測性的 refine；失敗時返回 None（由使用者的 refine 重新生成）"""
+    # 文件上傳由預熱工作負責，取消推測時不會中斷上傳
+    if warm is not None:
+        await asyncio.shield(warm)
+    try:
+        result = await llm.refine_summary(summary, feedback, api_key=api_key)
+    except Exception as e:
+        _stats["failed"] += 1
+        print(f"[WARMUP] Speculative refine failed: {e}")
+        return None
+    print("[WARMUP] Speculative refine is ready.")
+    return result
+
+
+def claim(
+    original_summary: Dict[str, Any],
+    user_feedback: str,
+    api_key: Optional[str]
+) -> Optional[asyncio.Task]:
+    """
+    refine 開始前呼叫：反饋與推測的內容相同時取走推測（每個推測只交付一次），
+    否則取消仍在進行的推測
+
+    Returns:
+        推測的工作（結果為 refine 的回傳值，失敗時為 None）；沒有可沿用的推測時返回 None
+    """
+    if not _speculations or not api_key:
+        return None
+    entry = _speculations.pop(_upload_key(api_key, original_summary.get("file_hashes") or []), None)
+    if entry is None:
+        return None
+    if entry["feedback"] == user_feedback:
+        _stats["reused"] += 1
+        print("[WARMUP] Refine matches the speculative option, reusing it.")
+        return entry["task"]
+    if not entry["task"].done():
+        entry["task"].cancel()
+        _stats["cancelled"] += 1
+        print("[WARMUP] Cancelled the speculative refine (different feedback).")
+    return None
+
+
+def stats() -> Dict[str, Any]:
+    """預熱與推測的累計次數，以及目前進行中的推測數"""
+    return {
+        **_stats,
+        "speculative_refine": settings.SPECULATIVE_REFINE,
+        "running_speculations": _running_speculations(),
+        "background_tasks": len(_background),
+    }
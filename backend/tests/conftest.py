@@ -0,0 +1,10 @@
+"""
+pytest 共用設定
+
+在 backend 目錄下執行：
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,172 @@
+"""
+refine 的 Gemini context cache 流程（以 StubGeminiClient 取代 Gemini API）
+"""
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from config import settings
+from services import gemini, llm
+from services.cache import MemoryLRUCache
+
+API_KEY = "test-key"
+
+
+class FailingCacheClient(gemini.StubGeminiClient):
+    """無法建立 context cache 的替身（例如文件低於最小 token 數）"""
+
+    async def create_cache(self, model, system_instruction, contents, ttl_seconds):
+        self.calls.append(("create_cache_failed", None))
+        raise RuntimeError("content is too small to cache")
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """每個測試使用新的替身與空的快取"""
+    client = gemini.StubGeminiClient()
+    monkeypatch.setattr(settings, "GEMINI_BACKEND", "stub")
+    monkeypatch.setattr(settings, "GEMINI_CONTEXT_CACHE", True)
+    monkeypatch.setattr(gemini, "_clients", OrderedDict(stub=client))
+    monkeypatch.setattr(llm, "_uploaded_files", MemoryLRUCache())
+    monkeypatch.setattr(llm, "_refine_inflight", {})
+    monkeypatch.setattr(llm, "_context_caches", MemoryLRUCache(default_ttl=3600))
+    return client
+
+
+@pytest.fixture
+def summary(tmp_path):
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(b"%PDF-1.4\n/Type /Page\n%%EOF\n")
+    return {
+        "title": "Paper",
+        "blocks": [],
+        "files": ["paper.pdf"],
+        "temp_paths": [str(path)],
+        "is_initial_menu": False,
+    }
+
+
+def refine(summary, feedback):
+    return asyncio.run(llm.refine_summary(summary, feedback, api_key=API_KEY))
+
+
+def calls_of(client, kind):
+    return [detail for name, detail in client.calls if name == kind]
+
+
+def test_first_refine_creates_context_cache(stub, summary):
+    result = refine(summary, "請加上結論")
+
+    created = calls_of(stub, "create_cache")
+    assert len(created) == 1
+    assert calls_of(stub, "generate") == [created[0]]
+    assert result["blocks"]
+
+
+def test_later_refines_reuse_context_cache(stub, summary):
+    refine(summary, "請加上結論")
+    refine(summary, "請縮短內容")
+    refine(summary, "請補充研究方法")
+
+    created = calls_of(stub, "create_cache")
+    assert len(created) == 1
+    assert calls_of(stub, "generate") == created * 3
+    # 文件只上傳一次
+    assert len(calls_of(stub, "upload")) == 1
+
+
+def test_resending_same_feedback_generates_again(stub, summary):
+    refine(summary, "請加上結論")
+    refine(summary, "請加上結論")
+
+    assert len(calls_of(stub, "generate")) == 2
+
+
+def test_concurrent_identical_refines_share_one_generation(stub, summary):
+    async def both():
+        return await asyncio.gather(
+            llm.refine_summary(summary, "請加上結論", api_key=API_KEY),
+            llm.refine_summary(summary, "請加上結論", api_key=API_KEY),
+        )
+
+    first, second = asyncio.run(both())
+    assert first == second
+    assert len(calls_of(stub, "generate")) == 1
+
+
+def test_expired_context_cache_is_recreated(stub, summary):
+    refine(summary, "請加上結論")
+    stub.expire_caches()
+    refine(summary, "請縮短內容")
+
+    first, second = calls_of(stub, "create_cache")
+    assert first != second
+    assert calls_of(stub, "generate") == [first, second]
+
+
+def test_falls_back_to_inline_documents_when_cache_unavailable(monkeypatch, stub, summary):
+    client = FailingCacheClient()
+    monkeypatch.setattr(gemini, "_clients", OrderedDict(stub=client))
+
+    refine(summary, "請加上結論")
+    refine(summary, "請縮短內容")
+
+    # 失敗只嘗試一次，之後直接送出文件
+    assert len(calls_of(client, "create_cache_failed")) == 1
+    assert calls_of(client, "generate") == [None, None]
+
+
+def test_context_cache_disabled_sends_documents_inline(monkeypatch, stub, summary):
+    monkeypatch.setattr(settings, "GEMINI_CONTEXT_CACHE", False)
+
+    refine(summary, "請加上結論")
+
+    assert calls_of(stub, "create_cache") == []
+    assert calls_of(stub, "generate") == [None]
+
+
+def test_gemini_client_is_abstract():
+    with pytest.raises(TypeError):
+        gemini.GeminiClient()
+
+
+class ClosingClient(gemini.StubGeminiClient):
+    """記錄 aclose 的替身"""
+
+    closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_client_registry_evicts_and_closes_least_recent(monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_BACKEND", "rest")
+    monkeypatch.setattr(settings, "GEMINI_CLIENT_CACHE_SIZE", 2)
+    monkeypatch.setattr(gemini, "_clients", OrderedDict())
+    monkeypatch.setattr(gemini, "RestGeminiClient", lambda api_key, base_url: ClosingClient())
+
+    async def scenario():
+        first = gemini.get_client("key-1")
+        second = gemini.get_client("key-2")
+        assert gemini.get_client("key-1") is first
+        gemini.get_client("key-3")
+        await asyncio.sleep(0)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert second.closed and not first.closed
+    # 登錄表不保存明文 API Key
+    assert all("key-" not in key for key in gemini._clients)
+
+
+def test_retired_client_closes_after_inflight_call():
+    client = ClosingClient()
+
+    async def scenario():
+        async with client._in_use():
+            await client.retire()
+            assert not client.closed
+        assert client.closed
+
+    asyncio.run(scenario())
@@ -0,0 +1,78 @@
+"""
+DocumentHandle 的 PDF 頁數與檔案物件
+"""
+import zlib
+
+import pytest
+
+from services import document
+
+
+def _object_stream_pdf(pages: int) -> bytes:
+    """PDF 1.5：目錄與頁面物件都放在壓縮的 object stream 中，以 xref stream 索引（沒有明文的 /Type /Page）"""
+    kids = " ".join(f"{3 + i} 0 R" for i in range(pages))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode(),
+    ] + [b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>"] * pages
+
+    header, body = [], b""
+    for i, obj in enumerate(objects):
+        header.append(f"{1 + i} {len(body)}")
+        body += obj + b"\n"
+    header_bytes = (" ".join(header) + "\n").encode()
+    stream_num = len(objects) + 1
+    xref_num = stream_num + 1
+
+    packed = zlib.compress(header_bytes + body)
+
+    out = b"%PDF-1.5\n"
+    stream_offset = len(out)
+    out += (
+        f"{stream_num} 0 obj\n<< /Type /ObjStm /N {len(objects)} /First {len(header_bytes)} "
+        f"/Filter /FlateDecode /Length {len(packed)} >>\nstream\n"
+    ).encode() + packed + b"\nendstream\nendobj\n"
+
+    xref_offset = len(out)
+    rows = b"\x00\x00\x00\x00\x00\xff\xff"
+    rows += b"".join(b"\x02" + stream_num.to_bytes(4, "big") + i.to_bytes(2, "big") for i in range(len(objects)))
+    rows += b"\x01" + stream_offset.to_bytes(4, "big") + b"\x00\x00"
+    rows += b"\x01" + xref_offset.to_bytes(4, "big") + b"\x00\x00"
+    out += (
+        f"{xref_num} 0 obj\n<< /Type /XRef /Size {xref_num + 1} /W [1 4 2] /Root 1 0 R "
+        f"/Length {len(rows)} >>\nstream\n"
+    ).encode() + rows + b"\nendstream\nendobj\n"
+    out += f"startxref\n{xref_offset}\n%%EOF\n".encode()
+    return out
+
+
+def handle_for(tmp_path, content: bytes) -> document.DocumentHandle:
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(content)
+    return document.DocumentHandle(str(path))
+
+
+def test_page_count_reads_object_streams(tmp_path):
+    content = _object_stream_pdf(3)
+    assert b"/Type /Page" not in content
+    assert handle_for(tmp_path, content).pdf_metadata() == {"pages": 3}
+
+
+def test_unreadable_pdf_reports_unknown_page_count(tmp_path):
+    assert handle_for(tmp_path, b"%PDF-1.4\ngarbage\n").pdf_metadata() == {"pages": None}
+
+
+def test_invalid_pdf_error_omits_temp_name(tmp_path):
+    with pytest.raises(ValueError) as excinfo:
+        handle_for(tmp_path, b"not a pdf").pdf_metadata()
+    assert "doc.pdf" not in str(excinfo.value)
+
+
+def test_reader_reads_and_seeks_without_the_file(tmp_path):
+    handle = handle_for(tmp_path, b"0123456789")
+    with handle.open_reader() as reader:
+        assert reader.read(4) == b"0123"
+        reader.seek(-3, 2)
+        assert reader.read() == b"789"
+        reader.seek(2)
+        assert reader.tell() == 2
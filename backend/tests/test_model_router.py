@@ -0,0 +1,35 @@
+"""
+模型分級路由的逾時與 fallback
+"""
+import asyncio
+
+import pytest
+
+from config import settings
+from services import model_router
+
+
+@pytest.fixture
+def tiers(monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_TIERS", {
+        "standard": {"model": "standard-model", "latency_budget": 1, "timeout": 0.05},
+    })
+
+
+def slow_call(seconds):
+    async def call(model):
+        await asyncio.sleep(seconds)
+        return model
+    return call
+
+
+def test_call_over_tier_timeout_fails(tiers):
+    decision = model_router.RouteDecision("standard", "test")
+    with pytest.raises(TimeoutError):
+        asyncio.run(model_router.run(decision, slow_call(0.1)))
+
+
+def test_timeout_scale_extends_tier_timeout(tiers):
+    # 例如 3 批逐段摘要：逾時放大為 3 倍
+    decision = model_router.RouteDecision("standard", "test")
+    assert asyncio.run(model_router.run(decision, slow_call(0.1), timeout_scale=3)) == "standard-model"
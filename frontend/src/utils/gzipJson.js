@@ -0,0 +1,17 @@
+// 較大的 JSON 請求（refine、儲存到 Notion 會帶整份筆記）以 gzip 壓縮後送出，
+// 後端的 CompressionMiddleware 會解壓；瀏覽器不支援 CompressionStream 時照常送出
+const MIN_GZIP_BYTES = 8 * 1024
+
+export async function gzipJson(payload, headers = {}) {
+    const json = JSON.stringify(payload)
+    if (json.length < MIN_GZIP_BYTES || typeof CompressionStream === 'undefined') {
+        return { data: payload, headers }
+    }
+
+    const stream = new Blob([json]).stream().pipeThrough(new CompressionStream('gzip'))
+    const body = await new Response(stream).arrayBuffer()
+    return {
+        data: body,
+        headers: { ...headers, 'Content-Type': 'application/json', 'Content-Encoding': 'gzip' }
+    }
+}
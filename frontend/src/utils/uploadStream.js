@@ -0,0 +1,42 @@
+// 透過 /api/upload/stream 上傳文件並讀取 SSE 進度事件
+// （EventSource 只支援 GET，因此以 fetch 讀取回應串流並自行解析 event / data 行）
+
+function parseEvent(raw) {
+    let event = 'message'
+    const data = []
+    for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim()
+        else if (line.startsWith('data:')) data.push(line.slice(5).trimStart())
+    }
+    return { event, data: data.length ? JSON.parse(data.join('\n')) : null }
+}
+
+// 每個進度事件呼叫 onEvent(event, data)；返回 done 事件的資料（與 /api/upload 的回應相同）
+// 失敗時拋出的 Error 帶有 status（HTTP 狀態碼，串流中的 error 事件為 undefined）
+export async function streamUpload(formData, headers, onEvent) {
+    const response = await fetch('/api/upload/stream', { method: 'POST', body: formData, headers })
+    if (!response.ok) {
+        const body = await response.json().catch(() => ({}))
+        const error = new Error(body.error || `HTTP ${response.status}`)
+        error.status = response.status
+        throw error
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+    let buffer = ''
+    while (true) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffer += value.replace(/\r\n/g, '\n')
+
+        let end
+        while ((end = buffer.indexOf('\n\n')) !== -1) {
+            const { event, data } = parseEvent(buffer.slice(0, end))
+            buffer = buffer.slice(end + 2)
+            if (event === 'done') return data
+            if (event === 'error') throw new Error(data?.error || '上傳發生錯誤')
+            onEvent(event, data)
+        }
+    }
+    throw new Error('上傳中斷：伺服器未回傳結果')
+}